@@ -0,0 +1,325 @@
+import sqlite3
+import time
+from typing import List, Dict, Any, Optional
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from db import get_db_connection
+    from dates import sql_week_start
+    from cube import rebuild_cube
+    from alerts import rebuild_weekly_state
+    from archive import LEDGER_CELLS, _SIGNED_TOTAL
+except ImportError:
+    import db
+    import dates
+    import cube
+    import alerts
+    import archive
+    get_db_connection = db.get_db_connection
+    sql_week_start = dates.sql_week_start
+    rebuild_cube = cube.rebuild_cube
+    rebuild_weekly_state = alerts.rebuild_weekly_state
+    LEDGER_CELLS = archive.LEDGER_CELLS
+    _SIGNED_TOTAL = archive._SIGNED_TOTAL
+
+# Triggers em transactions mantêm as tabelas agregadas exatas em QUALQUER caminho
+# de escrita (ledger, importador, SQL direto nos exemplos, DELETE em massa):
+#   account_balances   -> saldo e número de lançamentos por conta
+#   spending_cube      -> totais por conta/mês/semana/categoria/tipo/método (cube.py)
+#   weekly_spend_state -> gasto semanal (despesas) por conta; limiares ficam em alerts.py
+# Um UPDATE é tratado como a remoção da linha antiga seguida da inclusão da nova.
+
+AGGREGATE_TABLES = ('account_balances', 'spending_cube', 'weekly_spend_state')
+
+# Efeito de um lançamento no saldo (mesma regra de ledger.get_account_balance)
+_SIGNED_AMOUNT = """(CASE {row}.transaction_type
+    WHEN 'income' THEN {row}.amount
+    WHEN 'expense' THEN -{row}.amount
+    WHEN 'transfer' THEN -{row}.amount
+    ELSE 0 END)"""
+
+_TRIGGER_NAMES = ('trg_transactions_insert', 'trg_transactions_delete', 'trg_transactions_update')
+
+
+def _row_effects(row: str, sign: int) -> str:
+    """Comandos do corpo do trigger que aplicam a linha NEW/OLD com o sinal dado."""
+    week = sql_week_start(f"{row}.date")
+    statements = [
+        f"""
+        INSERT INTO account_balances (account_id, balance, tx_count)
+        VALUES ({row}.account_id, {sign} * {_SIGNED_AMOUNT.format(row=row)}, {sign})
+        ON CONFLICT(account_id) DO UPDATE SET
+            balance = balance + excluded.balance,
+            tx_count = tx_count + excluded.tx_count;
+        """,
+        f"""
+        INSERT INTO spending_cube (account_id, month, week_start, category, transaction_type, method, total, tx_count)
+        VALUES ({row}.account_id, substr({row}.date, 1, 7), {week}, COALESCE({row}.category, ''),
+                {row}.transaction_type, COALESCE({row}.method, ''), {sign} * {row}.amount, {sign})
+        ON CONFLICT(account_id, month, week_start, category, transaction_type, method) DO UPDATE SET
+            total = total + excluded.total,
+            tx_count = tx_count + excluded.tx_count;
+        """,
+        f"""
+        INSERT INTO weekly_spend_state (account_id, week_start, spent)
+        SELECT {row}.account_id, {week}, {sign} * {row}.amount
+        WHERE {row}.transaction_type = 'expense'
+        ON CONFLICT(account_id, week_start) DO UPDATE SET spent = spent + excluded.spent;
+        """,
+    ]
+    if sign < 0:
+        # Remove linhas que ficaram vazias
+        statements += [
+            f"DELETE FROM account_balances WHERE account_id = {row}.account_id AND tx_count <= 0;",
+            f"""
+            DELETE FROM spending_cube
+            WHERE account_id = {row}.account_id AND month = substr({row}.date, 1, 7)
+              AND week_start = {week} AND category = COALESCE({row}.category, '')
+              AND transaction_type = {row}.transaction_type AND method = COALESCE({row}.method, '')
+              AND tx_count <= 0;
+            """,
+        ]
+    return "\n".join(statements)
+
+
+def _trigger_definitions() -> Dict[str, str]:
+    return {
+        'trg_transactions_insert': f"""CREATE TRIGGER trg_transactions_insert AFTER INSERT ON transactions
+        BEGIN
+            {_row_effects('NEW', 1)}
+        END""",
+        'trg_transactions_delete': f"""CREATE TRIGGER trg_transactions_delete AFTER DELETE ON transactions
+        BEGIN
+            {_row_effects('OLD', -1)}
+        END""",
+        'trg_transactions_update': f"""CREATE TRIGGER trg_transactions_update
+        AFTER UPDATE OF date, amount, transaction_type, account_id, category, method ON transactions
+        BEGIN
+            {_row_effects('OLD', -1)}
+            {_row_effects('NEW', 1)}
+        END""",
+    }
+
+
+def install_triggers(cursor: sqlite3.Cursor) -> None:
+    """
+    Cria (ou recria) os triggers de manutenção dos agregados na transação do chamador.
+    Triggers já instalados com a mesma definição são mantidos: o esquema (e o arquivo
+    do banco) não muda a cada inicialização.
+    """
+    definitions = _trigger_definitions()
+    installed = dict(cursor.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'transactions'"
+    ).fetchall())
+    for name in _TRIGGER_NAMES:
+        if installed.get(name) != definitions[name]:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(definitions[name])
+
+
+def rebuild_account_balances(conn: sqlite3.Connection) -> int:
+    """
+    Recria account_balances a partir do ledger e do resumo do arquivo (um único GROUP BY).
+    Retorna o número de contas.
+    """
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM account_balances")
+    cursor.execute(f"""
+        INSERT INTO account_balances (account_id, balance, tx_count)
+        SELECT account_id, SUM({_SIGNED_TOTAL}), SUM(tx_count)
+        FROM ({LEDGER_CELLS})
+        GROUP BY account_id
+    """)
+    return cursor.rowcount
+
+
+def rebuild_aggregates(conn: Optional[sqlite3.Connection] = None) -> Dict[str, int]:
+    """
+    Recria todas as tabelas agregadas a partir do ledger.
+
+    Args:
+        conn: Conexão a usar (opcional). Se None, abre e fecha uma conexão própria.
+
+    Returns:
+        Número de linhas geradas por tabela.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        balances = rebuild_account_balances(conn)
+        conn.commit()
+        return {
+            'account_balances': balances,
+            'spending_cube': rebuild_cube(conn),
+            'weekly_spend_state': rebuild_weekly_state(conn),
+        }
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def rebuild_empty_aggregates(conn: sqlite3.Connection) -> List[str]:
+    """
+    Popula, a partir do ledger, as tabelas agregadas que estão vazias enquanto há
+    lançamentos (bancos criados antes delas). Chamado por db.initialize_db.
+
+    Returns:
+        Nomes das tabelas recriadas.
+    """
+    cursor = conn.cursor()
+    if not cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM transactions) OR EXISTS (SELECT 1 FROM archived_summary)"
+    ).fetchone()[0]:
+        return []
+    rebuilders = {
+        'account_balances': lambda: (rebuild_account_balances(conn), conn.commit()),
+        'spending_cube': lambda: rebuild_cube(conn),
+        'weekly_spend_state': lambda: rebuild_weekly_state(conn),
+    }
+    rebuilt = []
+    for table in AGGREGATE_TABLES:
+        if cursor.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {table})").fetchone()[0]:
+            rebuilders[table]()
+            rebuilt.append(table)
+    return rebuilt
+
+
+# Recomputação de referência de cada tabela: (colunas-chave, colunas de valor, SELECT a partir do ledger).
+# Os lançamentos arquivados entram pelo resumo (archived_summary), via LEDGER_CELLS.
+_REFERENCE = {
+    'account_balances': (
+        "account_id", "balance, tx_count",
+        f"""SELECT account_id, SUM({_SIGNED_TOTAL}) AS balance, SUM(tx_count) AS tx_count
+            FROM ({LEDGER_CELLS}) GROUP BY account_id"""
+    ),
+    'spending_cube': (
+        "account_id, month, week_start, category, transaction_type, method", "total, tx_count",
+        f"""SELECT account_id, month, week_start, category, transaction_type, method,
+                   SUM(total) AS total, SUM(tx_count) AS tx_count
+            FROM ({LEDGER_CELLS}) GROUP BY 1, 2, 3, 4, 5, 6"""
+    ),
+    'weekly_spend_state': (
+        "account_id, week_start", "spent",
+        f"""SELECT account_id, week_start, SUM(total) AS spent
+            FROM ({LEDGER_CELLS}) WHERE transaction_type = 'expense' GROUP BY 1, 2"""
+    ),
+}
+
+
+def verify_aggregates() -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Compara cada tabela agregada com a recomputação a partir do ledger.
+
+    Valores são comparados arredondados a centavos; uma linha presente só de um lado
+    (ou com valores diferentes) aparece como divergência. Linhas zeradas do gasto
+    semanal (semana cujas despesas foram todas removidas) não contam como divergência.
+
+    Returns:
+        Dicionário tabela -> lista de divergências; cada divergência traz as colunas
+        da linha e 'source' ('ledger' para o valor esperado, 'stored' para o gravado).
+        Listas vazias significam agregados exatos.
+    """
+    conn = get_db_connection()
+    try:
+        report = {}
+        for table, (keys, values, reference) in _REFERENCE.items():
+            rounded = ", ".join(
+                f"ROUND({column.strip()}, 2) AS {column.strip()}" for column in values.split(",")
+            )
+            stored = f"SELECT {keys}, {rounded} FROM {table}"
+            if table == 'weekly_spend_state':
+                stored += " WHERE ROUND(spent, 2) <> 0"
+            expected = f"SELECT {keys}, {rounded} FROM ({reference})"
+            rows = conn.execute(f"""
+                SELECT *, 'ledger' AS source FROM ({expected} EXCEPT {stored})
+                UNION ALL
+                SELECT *, 'stored' AS source FROM ({stored} EXCEPT {expected})
+            """).fetchall()
+            report[table] = [dict(row) for row in rows]
+        return report
+    finally:
+        conn.close()
+
+
+def benchmark_trigger_overhead(rows: int = 2000) -> Dict[str, float]:
+    """
+    Mede o custo que os triggers adicionam às escritas.
+
+    Insere 'rows' lançamentos sintéticos com e sem os triggers, cada rodada dentro
+    de uma transação desfeita ao final (o banco não é alterado).
+
+    Returns:
+        Dicionário com 'with_triggers_ms', 'without_triggers_ms' e 'overhead_us_per_row'.
+    """
+    conn = get_db_connection()
+    conn.isolation_level = None  # controle manual de BEGIN/ROLLBACK
+    account = conn.execute("SELECT MIN(id) FROM accounts").fetchone()[0] or 1
+    synthetic = [
+        (f"2026-{1 + i % 12:02d}-{1 + i % 28:02d}", 10.0 + i % 50, 'expense' if i % 3 else 'income',
+         account, f"Categoria {i % 8}", "Benchmark", "cartao")
+        for i in range(rows)
+    ]
+    insert = """
+        INSERT INTO transactions (date, amount, transaction_type, account_id, category, description, method)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+
+    def timed_run(drop_triggers: bool) -> float:
+        conn.execute("BEGIN")
+        try:
+            if drop_triggers:
+                for name in _TRIGGER_NAMES:
+                    conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+            start = time.perf_counter()
+            conn.executemany(insert, synthetic)
+            return (time.perf_counter() - start) * 1000
+        finally:
+            conn.execute("ROLLBACK")
+
+    try:
+        with_triggers = timed_run(drop_triggers=False)
+        without_triggers = timed_run(drop_triggers=True)
+    finally:
+        conn.close()
+    return {
+        'with_triggers_ms': with_triggers,
+        'without_triggers_ms': without_triggers,
+        'overhead_us_per_row': (with_triggers - without_triggers) * 1000 / rows if rows else 0.0,
+    }
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import db
+    db.initialize_db()
+
+    ACCOUNT_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Teste Triggers", "PF", "cofre", 1)
+    )
+
+    # Escritas fora do ledger: SQL direto, UPDATE e DELETE
+    db.execute_insert(
+        "INSERT INTO transactions (date, amount, transaction_type, account_id, category) VALUES (?, ?, ?, ?, ?)",
+        ("2026-01-20", 120.00, "expense", ACCOUNT_ID, "Alimentação")
+    )
+    tx_id = db.execute_insert(
+        "INSERT INTO transactions (date, amount, transaction_type, account_id, category) VALUES (?, ?, ?, ?, ?)",
+        ("2026-01-21", 80.00, "expense", ACCOUNT_ID, "Transporte")
+    )
+    db.execute_insert("UPDATE transactions SET amount = 90.00, date = '2026-01-27' WHERE id = ?", (tx_id,))
+    db.execute_insert("DELETE FROM transactions WHERE account_id = ? AND category = 'Alimentação'", (ACCOUNT_ID,))
+
+    balance = db.execute_query("SELECT balance FROM account_balances WHERE account_id = ?", (ACCOUNT_ID,))
+    print(f"Saldo mantido por trigger: R$ {balance[0]['balance']:.2f}")  # Esperado: -90.00
+
+    divergences = verify_aggregates()
+    print("Agregados exatos?", all(not rows for rows in divergences.values()))
+
+    result = benchmark_trigger_overhead(2000)
+    print(
+        f"2000 inserções: {result['with_triggers_ms']:.1f} ms com triggers, "
+        f"{result['without_triggers_ms']:.1f} ms sem ({result['overhead_us_per_row']:.1f} µs/linha)"
+    )
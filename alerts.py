@@ -0,0 +1,258 @@
+import logging
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Callable
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from db import get_db_connection, execute_query, execute_read_query
+    from dates import get_week_start
+    from archive import LEDGER_CELLS
+except ImportError:
+    import db
+    import dates
+    import archive
+    get_db_connection = db.get_db_connection
+    execute_query = db.execute_query
+    execute_read_query = db.execute_read_query
+    get_week_start = dates.get_week_start
+    LEDGER_CELLS = archive.LEDGER_CELLS
+
+# Limiares padrão (% do teto semanal) quando settings.weekly_cap_thresholds não existe.
+DEFAULT_THRESHOLDS = (80.0, 100.0)
+
+_hooks: List[Callable[[Dict[str, Any]], None]] = []
+_dispatch_lock = threading.Lock()
+_last_dispatched_id: Optional[int] = None
+
+logger = logging.getLogger(__name__)
+
+
+def parse_thresholds(value: Optional[str]) -> List[float]:
+    """Converte '80,100,120' em [80.0, 100.0, 120.0] (ordenado, sem repetições)."""
+    if not value:
+        return list(DEFAULT_THRESHOLDS)
+    return sorted({float(part) for part in value.split(",") if part.strip()})
+
+
+def _read_settings(cursor: sqlite3.Cursor) -> Dict[str, Any]:
+    """Lê conta operacional, teto e limiares na transação do chamador."""
+    rows = cursor.execute(
+        "SELECT key, value FROM settings WHERE key IN ('weekly_cap_amount', 'weekly_cap_thresholds')"
+    ).fetchall()
+    settings = {row[0]: row[1] for row in rows}
+    op_account = cursor.execute(
+        "SELECT id FROM accounts WHERE role = 'operacional' AND active = 1"
+    ).fetchone()
+    return {
+        'operational_account_id': op_account[0] if op_account else None,
+        'cap': float(settings.get('weekly_cap_amount') or 0.0),
+        'thresholds': parse_thresholds(settings.get('weekly_cap_thresholds')),
+    }
+
+
+def _level(spent: float, cap: float, thresholds: List[float]) -> float:
+    """Maior limiar atingido pelo gasto (0 se nenhum)."""
+    if cap <= 0:
+        return 0.0
+    percentage = spent / cap * 100
+    reached = [t for t in thresholds if percentage >= t]
+    return reached[-1] if reached else 0.0
+
+
+def evaluate_thresholds(cursor: sqlite3.Cursor, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Registra os limiares do teto semanal cruzados pelos lançamentos escritos.
+
+    Roda na transação de escrita do ledger, depois que os triggers de transactions
+    atualizaram o gasto semanal (weekly_spend_state.spent). Na conta operacional, cada
+    limiar (ex: 80%, 100%) cruzado para cima gera um registro em alert_events. Se o
+    gasto cair (lançamento removido ou alterado), o nível alertado é rebaixado, para
+    que um novo cruzamento volte a alertar.
+
+    Args:
+        cursor: Cursor da transação de escrita.
+        rows: Lançamentos escritos ('date', 'transaction_type', 'account_id').
+
+    Returns:
+        Os eventos de alerta registrados.
+    """
+    weeks = {
+        (row['account_id'], get_week_start(row['date']))
+        for row in rows if row['transaction_type'] == 'expense'
+    }
+    if not weeks:
+        return []
+
+    settings = _read_settings(cursor)
+    events = []
+    for account_id, week_start in sorted(weeks):
+        if account_id != settings['operational_account_id']:
+            continue
+
+        state = cursor.execute(
+            "SELECT spent, last_threshold FROM weekly_spend_state WHERE account_id = ? AND week_start = ?",
+            (account_id, week_start)
+        ).fetchone()
+        if state is None:
+            continue
+        spent, last_threshold = state[0], state[1]
+        level = _level(spent, settings['cap'], settings['thresholds'])
+        if level == last_threshold:
+            continue
+
+        for threshold in settings['thresholds']:
+            if last_threshold < threshold <= level:
+                event = {
+                    'account_id': account_id, 'week_start': week_start, 'threshold': threshold,
+                    'spent': spent, 'cap': settings['cap'],
+                }
+                cursor.execute(
+                    """
+                    INSERT INTO alert_events (account_id, week_start, threshold, spent, cap)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (account_id, week_start, threshold, spent, settings['cap'])
+                )
+                event['id'] = cursor.lastrowid
+                events.append(event)
+        cursor.execute(
+            "UPDATE weekly_spend_state SET last_threshold = ? WHERE account_id = ? AND week_start = ?",
+            (level, account_id, week_start)
+        )
+    return events
+
+
+def rebuild_weekly_state(conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Recria o gasto semanal corrente a partir do ledger e do resumo do arquivo (um único GROUP BY).
+    O nível alertado de cada semana é recalculado sem gerar novos eventos.
+
+    Returns:
+        Número de semanas (conta x semana) geradas.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM weekly_spend_state")
+        cursor.execute(f"""
+            INSERT INTO weekly_spend_state (account_id, week_start, spent)
+            SELECT account_id, week_start, SUM(total)
+            FROM ({LEDGER_CELLS})
+            WHERE transaction_type = 'expense'
+            GROUP BY 1, 2
+        """)
+        weeks = cursor.rowcount
+        settings = _read_settings(cursor)
+        if settings['operational_account_id'] is not None:
+            states = cursor.execute(
+                "SELECT week_start, spent FROM weekly_spend_state WHERE account_id = ?",
+                (settings['operational_account_id'],)
+            ).fetchall()
+            cursor.executemany(
+                "UPDATE weekly_spend_state SET last_threshold = ? WHERE account_id = ? AND week_start = ?",
+                [
+                    (_level(spent, settings['cap'], settings['thresholds']), settings['operational_account_id'], week_start)
+                    for week_start, spent in states
+                ]
+            )
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+    return weeks
+
+
+def get_weekly_spend(account_id: int, week_start: str) -> float:
+    """Gasto semanal pré-calculado de uma conta (sem reagregar a semana)."""
+    result = execute_read_query(
+        "SELECT spent FROM weekly_spend_state WHERE account_id = ? AND week_start = ?",
+        (account_id, week_start)
+    )
+    return result[0]['spent'] if result else 0.0
+
+
+def list_alert_events(account_id: Optional[int] = None, week_start: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Lista eventos de alerta (mais recentes primeiro), opcionalmente filtrados por conta/semana."""
+    query = "SELECT * FROM alert_events WHERE 1=1"
+    params = []
+    if account_id is not None:
+        query += " AND account_id = ?"
+        params.append(account_id)
+    if week_start is not None:
+        query += " AND week_start = ?"
+        params.append(week_start)
+    query += " ORDER BY id DESC"
+    return [dict(row) for row in execute_read_query(query, tuple(params))]
+
+
+def register_alert_hook(hook: Callable[[Dict[str, Any]], None]) -> None:
+    """
+    Registra uma função chamada (após o commit) para cada novo evento de alerta.
+    Útil para notificações (e-mail, push, etc.).
+    """
+    global _last_dispatched_id
+    with _dispatch_lock:
+        if _last_dispatched_id is None:
+            row = execute_query("SELECT COALESCE(MAX(id), 0) AS last_id FROM alert_events")
+            _last_dispatched_id = row[0]['last_id']
+        _hooks.append(hook)
+
+
+def dispatch_new_events() -> int:
+    """
+    Entrega aos hooks os eventos gravados desde a última entrega.
+    Chamado pelo ledger após cada commit; eventos de transações desfeitas
+    (rollback) nunca chegam aos hooks. Um hook que falha é registrado no log,
+    não impede os demais e o evento conta como entregue (não é reenviado).
+
+    Returns:
+        Número de eventos entregues.
+    """
+    global _last_dispatched_id
+    if not _hooks:
+        return 0
+    with _dispatch_lock:
+        # Banco em disco, não o snapshot de leitura: eventos recém-gravados precisam sair já
+        rows = execute_query(
+            "SELECT * FROM alert_events WHERE id > ? ORDER BY id", (_last_dispatched_id,)
+        )
+        for row in rows:
+            _last_dispatched_id = row['id']
+            for hook in _hooks:
+                try:
+                    hook(dict(row))
+                except Exception:
+                    logger.exception("Falha no hook de alerta %r para o evento %s", hook, row['id'])
+        return len(rows)
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import db
+    import ledger
+    import alerts  # mesmo módulo usado pelo ledger (hooks registrados nele)
+    db.initialize_db()
+
+    OP_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Operacional PF", "PF", "operacional", 1)
+    )
+    db.execute_insert("UPDATE accounts SET role = 'cofre' WHERE role = 'operacional' AND id <> ?", (OP_ID,))
+    db.execute_insert("UPDATE settings SET value = '450' WHERE key = 'weekly_cap_amount'")
+
+    def broken_hook(event):
+        raise ConnectionError("serviço de notificação fora do ar")
+    alerts.register_alert_hook(broken_hook)  # falha no log; os demais hooks recebem o evento
+    alerts.register_alert_hook(lambda event: print(
+        f"  ALERTA: {event['threshold']:.0f}% do teto atingido (R$ {event['spent']:.2f} de R$ {event['cap']:.2f})"
+    ))
+
+    for amount in (200.00, 170.00, 100.00):
+        print(f"Despesa de R$ {amount:.2f}")
+        ledger.add_transaction("2026-01-20", amount, "expense", OP_ID, "Alimentação", "Compra")
+
+    print(f"Gasto pré-calculado da semana: R$ {get_weekly_spend(OP_ID, '2026-01-19'):.2f}") # Esperado: 470.00
@@ -0,0 +1,239 @@
+from typing import Optional
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import depgraph
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from dates import get_week_start
+    from archive import query_ledger
+except ImportError:
+    import dates
+    import archive
+    query_ledger = archive.query_ledger
+    get_week_start = dates.get_week_start
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# Detecção de gastos fora do padrão na semana, com linhas de base robustas
+# calculadas sobre o histórico de despesas (transferências não entram):
+#   'transaction'  -> lançamento muito acima da mediana da categoria (mediana/MAD)
+#   'weekday'      -> total do dia muito acima do típico da categoria naquele dia
+#                     da semana (mediana/MAD por categoria x dia da semana)
+#   'weekly_total' -> total da semana na categoria muito acima da média móvel das
+#                     semanas anteriores (z-score móvel, semanas sem gasto contam como 0)
+# O score é um z-score (robusto nos dois primeiros); só desvios para CIMA são sinalizados.
+
+MAD_SCALE = 1.4826  # MAD * 1.4826 estima o desvio padrão em dados normais
+DEFAULT_Z_THRESHOLD = 3.5
+DEFAULT_LOOKBACK_WEEKS = 104
+DEFAULT_ROLLING_WEEKS = 8
+MIN_HISTORY = 5  # mínimo de observações para uma linha de base valer
+
+ANOMALY_COLUMNS = (
+    'kind', 'category', 'date', 'transaction_id', 'description', 'amount', 'baseline', 'score'
+)
+
+
+def _z_scores(values: np.ndarray, centers: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    """(valor - centro) / escala; com escala 0, qualquer valor acima do centro é infinito."""
+    deviations = values - centers
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(scales > 0, deviations / scales, np.where(deviations > 0, np.inf, 0.0))
+
+
+def _robust_baseline(history: pd.DataFrame, keys: list, value: str) -> pd.DataFrame:
+    """Mediana, MAD (escalado) e contagem de 'value' por grupo 'keys'."""
+    grouped = history.groupby(keys)[value]
+    medians = grouped.median()
+    deviations = (history[value] - history[keys].join(medians.rename('m'), on=keys)['m']).abs()
+    mads = deviations.groupby([history[k] for k in keys]).median() * MAD_SCALE
+    return pd.DataFrame({'median': medians, 'scale': mads, 'count': grouped.size()})
+
+
+def load_expense_history(start_date: str, end_date: str, account_id: Optional[int] = None) -> pd.DataFrame:
+    """
+    Carrega as despesas do período em uma única query (sem transferências).
+
+    Returns:
+        DataFrame com 'id', 'date' (datetime), 'amount', 'category', 'description' e 'account_id'.
+    """
+    query = """
+        SELECT id, date, amount, COALESCE(category, '') AS category, description, account_id
+        FROM {transactions}
+        WHERE transaction_type = 'expense'
+          AND transfer_group_id IS NULL
+          AND date BETWEEN ? AND ?
+    """
+    params = [start_date, end_date]
+    if account_id is not None:
+        query += " AND account_id = ?"
+        params.append(account_id)
+    rows = query_ledger(query, tuple(params), since=start_date)
+    frame = pd.DataFrame(
+        [tuple(row) for row in rows],
+        columns=['id', 'date', 'amount', 'category', 'description', 'account_id']
+    )
+    frame['date'] = pd.to_datetime(frame['date'], format=DATE_FORMAT)
+    frame['amount'] = frame['amount'].astype(float)
+    return frame
+
+
+def _transaction_anomalies(history: pd.DataFrame, week: pd.DataFrame, threshold: float) -> pd.DataFrame:
+    baseline = _robust_baseline(history, ['category'], 'amount')
+    baseline = baseline[baseline['count'] >= MIN_HISTORY]
+    current = week.join(baseline, on='category', how='inner')
+    current['score'] = _z_scores(current['amount'].to_numpy(), current['median'].to_numpy(), current['scale'].to_numpy())
+    flagged = current[current['score'] > threshold]
+    return pd.DataFrame({
+        'kind': 'transaction', 'category': flagged['category'], 'date': flagged['date'],
+        'transaction_id': flagged['id'], 'description': flagged['description'],
+        'amount': flagged['amount'], 'baseline': flagged['median'], 'score': flagged['score'],
+    })
+
+
+def _weekday_anomalies(history: pd.DataFrame, week: pd.DataFrame, threshold: float) -> pd.DataFrame:
+    def daily(frame):
+        totals = frame.groupby(['category', 'date'], as_index=False)['amount'].sum()
+        totals['weekday'] = totals['date'].dt.dayofweek
+        return totals
+
+    baseline = _robust_baseline(daily(history), ['category', 'weekday'], 'amount')
+    baseline = baseline[baseline['count'] >= MIN_HISTORY]
+    current = daily(week).join(baseline, on=['category', 'weekday'], how='inner')
+    current['score'] = _z_scores(current['amount'].to_numpy(), current['median'].to_numpy(), current['scale'].to_numpy())
+    flagged = current[current['score'] > threshold]
+    return pd.DataFrame({
+        'kind': 'weekday', 'category': flagged['category'], 'date': flagged['date'],
+        'transaction_id': None, 'description': None,
+        'amount': flagged['amount'], 'baseline': flagged['median'], 'score': flagged['score'],
+    })
+
+
+def _weekly_total_anomalies(
+    expenses: pd.DataFrame, week_start: pd.Timestamp, window: int, threshold: float
+) -> pd.DataFrame:
+    # Matriz densa semanas x categorias (semanas sem gasto = 0), só até a semana atual
+    weeks = expenses['date'] - pd.to_timedelta(expenses['date'].dt.dayofweek, unit='D')
+    totals = expenses.groupby([weeks.rename('week'), 'category'])['amount'].sum().unstack(fill_value=0.0)
+    index = pd.date_range(end=week_start, periods=window + 1, freq='7D')
+    totals = totals.reindex(index, fill_value=0.0)
+    previous = totals.iloc[:-1]
+    seen = (previous > 0).sum() >= min(MIN_HISTORY, window)
+    current = totals.iloc[-1]
+    means = previous.mean()
+    score = pd.Series(
+        _z_scores(current.to_numpy(), means.to_numpy(), previous.std().to_numpy()), index=totals.columns
+    )
+    flagged = score[(score > threshold) & seen & (current > 0)].index
+    return pd.DataFrame({
+        'kind': 'weekly_total', 'category': flagged, 'date': week_start,
+        'transaction_id': None, 'description': None,
+        'amount': current[flagged].to_numpy(), 'baseline': means[flagged].to_numpy(),
+        'score': score[flagged].to_numpy(),
+    })
+
+
+def detect_anomalies(
+    week_start: Optional[str] = None,
+    account_id: Optional[int] = None,
+    lookback_weeks: int = DEFAULT_LOOKBACK_WEEKS,
+    rolling_weeks: int = DEFAULT_ROLLING_WEEKS,
+    z_threshold: float = DEFAULT_Z_THRESHOLD
+) -> pd.DataFrame:
+    """
+    Sinaliza os gastos fora do padrão na semana (ver comentário no topo do módulo).
+
+    O histórico (as 'lookback_weeks' semanas anteriores) é lido em uma única query e
+    todas as linhas de base saem de operações agrupadas do pandas. O resultado fica em
+    cache (depgraph) até um novo lançamento: o Dashboard pode chamar a cada carga.
+
+    Args:
+        week_start: Qualquer data da semana analisada (YYYY-MM-DD). Se None, a semana atual.
+        account_id: Restringe a uma conta. Se None, considera todas.
+        lookback_weeks: Semanas de histórico para as linhas de base.
+        rolling_weeks: Janela (em semanas) do z-score móvel dos totais semanais.
+        z_threshold: Score mínimo para sinalizar.
+
+    Returns:
+        DataFrame com as colunas ANOMALY_COLUMNS, do maior score para o menor
+        (não altere: o valor é compartilhado pelo cache).
+    """
+    week_start = get_week_start(week_start or datetime.now().strftime(DATE_FORMAT))
+
+    def compute():
+        start = datetime.strptime(week_start, DATE_FORMAT)
+        history_start = (start - timedelta(weeks=lookback_weeks)).strftime(DATE_FORMAT)
+        week_end = (start + timedelta(days=6)).strftime(DATE_FORMAT)
+        expenses = load_expense_history(history_start, week_end, account_id)
+        in_week = expenses['date'] >= start
+        history, week = expenses[~in_week], expenses[in_week]
+        if week.empty or history.empty:
+            return pd.DataFrame(columns=list(ANOMALY_COLUMNS))
+        found = pd.concat([
+            frame for frame in (
+                _transaction_anomalies(history, week, z_threshold),
+                _weekday_anomalies(history, week, z_threshold),
+                _weekly_total_anomalies(expenses, pd.Timestamp(start), rolling_weeks, z_threshold),
+            ) if not frame.empty
+        ] or [pd.DataFrame(columns=list(ANOMALY_COLUMNS))], ignore_index=True)
+        return found.sort_values('score', ascending=False, ignore_index=True)[list(ANOMALY_COLUMNS)]
+
+    node = ('anomalies', week_start, account_id, lookback_weeks, rolling_weeks, z_threshold)
+    deps = [('transactions', account_id)] if account_id is not None else [('transactions',)]
+    return depgraph.cached(node, deps, compute)
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import time
+    import random
+    import db
+    db.initialize_db()
+
+    ACCOUNT_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Operacional PF", "PF", "operacional", 1)
+    )
+    # Três anos de histórico: mercado às terças e sábados, combustível às sextas, streaming mensal
+    random.seed(7)
+    start = datetime(2023, 2, 6)  # Segunda-feira
+    queries = []
+    for day in range(3 * 364):
+        date = start + timedelta(days=day)
+        spends = [("Alimentação", random.uniform(15, 45), "Almoço")]
+        if date.weekday() in (1, 5):
+            spends.append(("Mercado", random.uniform(90, 130), "Supermercado"))
+        if date.weekday() == 4:
+            spends.append(("Transporte", random.uniform(150, 190), "Combustível"))
+        if date.day == 10:
+            spends.append(("Assinaturas", 39.90, "Streaming"))
+        for category, amount, description in spends:
+            queries.append((
+                "INSERT INTO transactions (date, amount, transaction_type, account_id, category, description) "
+                "VALUES (?, ?, 'expense', ?, ?, ?)",
+                (date.strftime(DATE_FORMAT), round(amount, 2), ACCOUNT_ID, category, description)
+            ))
+    # Semana analisada: uma cobrança duplicada da assinatura e um mercado muito acima do normal
+    week = (start + timedelta(weeks=156)).strftime(DATE_FORMAT)
+    for category, amount, description, offset in (
+        ("Mercado", 480.00, "Supermercado", 1), ("Assinaturas", 399.00, "Streaming anual", 2),
+        ("Alimentação", 30.00, "Almoço", 3),
+    ):
+        date = (datetime.strptime(week, DATE_FORMAT) + timedelta(days=offset)).strftime(DATE_FORMAT)
+        queries.append((
+            "INSERT INTO transactions (date, amount, transaction_type, account_id, category, description) "
+            "VALUES (?, ?, 'expense', ?, ?, ?)",
+            (date, amount, ACCOUNT_ID, category, description)
+        ))
+    db.execute_many_atomic(queries)
+
+    started = time.perf_counter()
+    anomalies = detect_anomalies(week)
+    elapsed = time.perf_counter() - started
+    print(f"Semana de {week}: {len(anomalies)} sinal(is) em {elapsed * 1000:.0f} ms "
+          f"sobre {len(queries)} lançamentos")
+    print(anomalies[['kind', 'category', 'amount', 'baseline', 'score']].round(2).to_string())
+
+    started = time.perf_counter()
+    detect_anomalies(week)
+    print(f"Segunda chamada (cache): {(time.perf_counter() - started) * 1000:.2f} ms")
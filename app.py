@@ -1,4 +1,5 @@
 import streamlit as st
+import os
 import sys
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -11,6 +12,14 @@ import kpis
 import planned
 import reconciliation
 import forecast
+import cube
+import snapshot
+import alerts
+import config
+import anomalies
+import cashflow
+import backup
+import archive
 
 # Configuração da página
 st.set_page_config(
@@ -23,6 +32,13 @@ st.set_page_config(
 # Inicializar o banco de dados
 db.initialize_db()
 
+# Snapshot de leitura em memória (opcional): FINANCEOS_READ_SNAPSHOT=1.
+# As leituras toleram até FINANCEOS_SNAPSHOT_STALENESS segundos de atraso e uma
+# thread recopia o snapshot na metade desse intervalo, tirando a cópia das páginas.
+if os.getenv("FINANCEOS_READ_SNAPSHOT") == "1":
+    staleness = float(os.getenv("FINANCEOS_SNAPSHOT_STALENESS", "2.0"))
+    snapshot.enable_read_snapshot(max_staleness=staleness, refresh_every=staleness / 2 or None)
+
 # ============================================================================
 # UTILITÁRIOS DE FORMATAÇÃO
 # ============================================================================
@@ -86,19 +102,16 @@ st.sidebar.caption("MVP - Gestão Financeira com Human-in-the-Loop")
 if page == "Dashboard":
     st.title("📊 Dashboard")
     
-    # Obter conta operacional
-    query = "SELECT id FROM accounts WHERE role = 'operacional' AND active = 1"
-    op_account_result = db.execute_query(query)
+    # Todos os números da página em uma única consulta (ver kpis.get_dashboard_snapshot)
+    today = datetime.now().strftime("%Y-%m-%d")
+    dashboard = kpis.get_dashboard_snapshot(today)
     
-    if not op_account_result:
+    if dashboard['operational_account_id'] is None:
         st.warning("⚠️ Nenhuma conta operacional configurada. Acesse Configurações para configurar.")
     else:
-        operational_account_id = op_account_result[0]['id']
-        
         # Seção: Semana Atual
         st.subheader("📅 Semana Atual")
-        today = datetime.now().strftime("%Y-%m-%d")
-        week_start, week_end = dates.get_current_week_range(today)
+        week_start = dashboard['week_start']
         st.markdown(f"**{get_week_display(week_start)}**")
         
         # Seção: Despesas Variáveis da Semana
@@ -106,12 +119,8 @@ if page == "Dashboard":
         
         col1, col2, col3 = st.columns(3)
         
-        weekly_expenses = kpis.get_current_week_variable_expenses(operational_account_id, today)
-        
-        # Obter teto semanal
-        weekly_cap_query = "SELECT value FROM settings WHERE key = 'weekly_cap_amount'"
-        weekly_cap_result = db.execute_query(weekly_cap_query)
-        weekly_cap = float(weekly_cap_result[0]['value']) if weekly_cap_result else 0.0
+        weekly_expenses = dashboard['weekly_expenses']
+        weekly_cap = dashboard['weekly_cap']
         
         status_text, status_icon = get_expense_status(weekly_expenses, weekly_cap)
         
@@ -127,20 +136,29 @@ if page == "Dashboard":
         
         st.markdown(f"**Status:** {status_icon} {status_text}")
         
+        for alert in dashboard['alerts']:
+            st.warning(
+                f"🔔 {alert['threshold']:.0f}% do teto atingido em {alert['created_at']} "
+                f"({format_currency(alert['spent'])} de {format_currency(alert['cap'])})"
+            )
+        
+        # Gastos fora do padrão (em cache até o próximo lançamento)
+        week_anomalies = anomalies.detect_anomalies(week_start)
+        if not week_anomalies.empty:
+            st.info(
+                f"🔎 {len(week_anomalies)} gasto(s) fora do padrão nesta semana. "
+                "Revise na aba 'Reconciliação'."
+            )
+        
         # Seção: Total de Caixa
         st.subheader("🏦 Total de Caixa")
-        total_cash = kpis.get_total_cash()
-        st.metric("Saldo Total", format_currency(total_cash))
+        st.metric("Saldo Total", format_currency(dashboard['total_cash']))
         st.caption("Total computado com base nos lançamentos")
         
         # Seção: Aviso de Reconciliação
         st.subheader("🔄 Reconciliação")
         
-        # Verificar se há reconciliação da semana atual
-        query = "SELECT * FROM reconciliations WHERE week_start = ?"
-        recon_result = db.execute_query(query, (week_start,))
-        
-        if not recon_result:
+        if not dashboard['reconciled']:
             st.info("ℹ️ Reconciliação da semana ainda não realizada. Acesse a aba 'Reconciliação' para revisar.")
         else:
             st.success("✅ Reconciliação da semana realizada.")
@@ -152,7 +170,7 @@ if page == "Dashboard":
 elif page == "Lançamentos":
     st.title("📝 Lançamentos")
     
-    tab1, tab2 = st.tabs(["Novo Lançamento", "Histórico"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Novo Lançamento", "Histórico", "Resumo", "Calendário"])
     
     # TAB 1: Novo Lançamento
     with tab1:
@@ -167,8 +185,12 @@ elif page == "Lançamentos":
             st.error("❌ Nenhuma conta ativa configurada.")
         else:
             # Obter categorias
-            categories_query = "SELECT DISTINCT category FROM transactions WHERE category IS NOT NULL ORDER BY category"
-            categories_result = db.execute_query(categories_query)
+            categories_query = """
+                SELECT category FROM transactions WHERE category IS NOT NULL
+                UNION SELECT category FROM archived_summary WHERE category <> ''
+                ORDER BY category
+            """
+            categories_result = db.execute_read_query(categories_query)
             categories_list = [cat['category'] for cat in categories_result] if categories_result else []
             
             # Formulário
@@ -254,8 +276,8 @@ elif page == "Lançamentos":
         with col3:
             date_range = st.date_input("Intervalo de Datas", value=(datetime.now() - timedelta(days=30), datetime.now()), key="date_range")
         
-        # Construir query com filtros
-        query = "SELECT * FROM transactions WHERE 1=1"
+        # Construir query com filtros (períodos antes do corte incluem o arquivo; ver archive.py)
+        query = "SELECT * FROM {transactions} WHERE 1=1"
         params = []
         
         if filter_account != "Todas":
@@ -274,7 +296,8 @@ elif page == "Lançamentos":
         
         query += " ORDER BY date DESC, id DESC"
         
-        transactions = db.execute_query(query, tuple(params))
+        since = date_range[0].strftime("%Y-%m-%d") if len(date_range) == 2 else None
+        transactions = archive.query_ledger(query, tuple(params), since=since)
         
         if transactions:
             # Preparar dados para exibição
@@ -293,6 +316,115 @@ elif page == "Lançamentos":
             st.dataframe(display_data, use_container_width=True)
         else:
             st.info("ℹ️ Nenhuma transação encontrada com os filtros aplicados.")
+    
+    # TAB 3: Resumo (respondido pelo cubo pré-agregado)
+    with tab3:
+        st.subheader("Resumo por Período")
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            level_label = st.selectbox("Nível", ["Ano", "Mês", "Semana"], index=1, key="cube_level")
+        
+        with col2:
+            group_label = st.selectbox("Agrupar por", ["Categoria", "PF/PJ", "Conta", "Método", "Nenhum"], key="cube_group")
+        
+        with col3:
+            cube_type = st.selectbox("Tipo", ["Saída", "Entrada"], key="cube_type")
+        
+        level_map = {"Ano": "year", "Mês": "month", "Semana": "week"}
+        group_map = {"Categoria": ["category"], "PF/PJ": ["account_type"], "Conta": ["account_id"], "Método": ["method"], "Nenhum": []}
+        
+        # Drill-down: meses de um ano, semanas de um mês
+        period_filter = {}
+        if level_map[level_label] == "month":
+            years = [row['period'] for row in cube.query_cube('year')]
+            if years:
+                period_filter['year'] = st.selectbox("Ano", years[::-1], key="cube_year")
+        elif level_map[level_label] == "week":
+            months = [row['period'] for row in cube.query_cube('month')]
+            if months:
+                period_filter['month'] = st.selectbox("Mês", months[::-1], key="cube_month")
+        
+        summary = cube.query_cube(
+            level_map[level_label],
+            group_map[group_label],
+            transaction_type={"Saída": "expense", "Entrada": "income"}[cube_type],
+            **period_filter
+        )
+        
+        if summary:
+            account_names = {acc_id: name for name, acc_id in accounts_dict.items()}
+            display_data = []
+            for row in summary:
+                item = {"Período": row['period']}
+                if group_label == "Conta":
+                    item["Conta"] = account_names.get(row['account_id'], row['account_id'])
+                elif group_label != "Nenhum":
+                    item[group_label] = row[group_map[group_label][0]] or "-"
+                item["Total"] = format_currency(row['total'])
+                item["Lançamentos"] = row['count']
+                display_data.append(item)
+            st.dataframe(display_data, use_container_width=True)
+        else:
+            st.info("ℹ️ Nenhum lançamento no período.")
+    
+    # TAB 4: Calendário (mapa de calor diário, ver cashflow.py)
+    with tab4:
+        st.subheader("Calendário de Caixa")
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            calendar_range = st.date_input(
+                "Período",
+                value=(datetime.now() - timedelta(days=364), datetime.now()),
+                key="calendar_range"
+            )
+        
+        with col2:
+            calendar_account = st.selectbox("Conta", ["Todas"] + list(accounts_dict.keys()), key="calendar_account")
+        
+        with col3:
+            metric_map = {"Entradas - Saídas": "net", "Entradas": "inflow", "Saídas": "outflow", "Saldo do dia": "balance"}
+            calendar_metric = st.selectbox("Métrica", list(metric_map.keys()), key="calendar_metric")
+        
+        if len(calendar_range) == 2:
+            flow = cashflow.get_daily_cash_flow(
+                calendar_range[0].strftime("%Y-%m-%d"),
+                calendar_range[1].strftime("%Y-%m-%d"),
+                None if calendar_account == "Todas" else [accounts_dict[calendar_account]]
+            )
+            calendar = cashflow.calendar_frame(flow, metric_map[calendar_metric])
+            
+            # altair é opcional: só o mapa de calor depende dele
+            try:
+                import altair as alt
+            except ImportError:
+                alt = None
+            
+            if alt is None:
+                st.warning("⚠️ O mapa de calor precisa do pacote altair (pip install altair).")
+            else:
+                # Cores divergentes para entradas - saídas (negativo em vermelho), sequenciais nas demais
+                scheme = "redyellowgreen" if metric_map[calendar_metric] == "net" else "blues"
+                scale = alt.Scale(scheme=scheme, domainMid=0) if scheme == "redyellowgreen" else alt.Scale(scheme=scheme)
+                calendar['week'] = calendar['week_start'].dt.strftime("%Y-%m-%d")
+                heatmap = alt.Chart(calendar).mark_rect().encode(
+                    x=alt.X("week:O", title=None, axis=None),  # uma coluna por semana; datas no tooltip
+                    y=alt.Y("weekday:O", title=None,
+                            axis=alt.Axis(labelExpr="['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom'][datum.value]")),
+                    color=alt.Color("value:Q", title="R$", scale=scale),
+                    tooltip=[alt.Tooltip("date:T", title="Data", format="%d/%m/%Y"),
+                             alt.Tooltip("value:Q", title="Valor", format=",.2f")],
+                ).properties(height=140).facet(row=alt.Row("year:O", title=None)).resolve_scale(x="independent")
+                st.altair_chart(heatmap, use_container_width=True)
+            
+            totals = flow['inflow'].to_numpy().sum(), flow['outflow'].to_numpy().sum()
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Entradas no período", format_currency(totals[0]))
+            col2.metric("Saídas no período", format_currency(totals[1]))
+            col3.metric("Saldo ao fim do período", format_currency(flow['balance'].iloc[-1].sum()))
 
 # ============================================================================
 # PÁGINA: RECONCILIAÇÃO
@@ -318,6 +450,25 @@ elif page == "Reconciliação":
     accounts_query = "SELECT id, name FROM accounts WHERE active = 1 ORDER BY name"
     accounts_result = db.execute_query(accounts_query)
     
+    # Gastos fora do padrão na semana: revisar antes de conferir os saldos
+    week_anomalies = anomalies.detect_anomalies(selected_week_start_str)
+    if not week_anomalies.empty:
+        st.subheader("🔎 Gastos Fora do Padrão")
+        kind_labels = {
+            'transaction': "Lançamento acima do usual da categoria",
+            'weekday': "Dia acima do usual para o dia da semana",
+            'weekly_total': "Semana acima da média recente",
+        }
+        anomalies_display = week_anomalies.assign(
+            kind=week_anomalies['kind'].map(kind_labels),
+            date=week_anomalies['date'].dt.strftime("%d/%m/%Y"),
+            amount=week_anomalies['amount'].map(format_currency),
+            baseline=week_anomalies['baseline'].map(format_currency),
+            score=week_anomalies['score'].round(1),
+        )[['kind', 'category', 'date', 'description', 'amount', 'baseline', 'score']]
+        anomalies_display.columns = ["Sinal", "Categoria", "Data", "Descrição", "Valor", "Típico", "Score"]
+        st.dataframe(anomalies_display, use_container_width=True)
+    
     if not accounts_result:
         st.error("❌ Nenhuma conta ativa configurada.")
     else:
@@ -370,16 +521,14 @@ elif page == "Reconciliação":
 elif page == "Configurações":
     st.title("⚙️ Configurações")
     
-    tab1, tab2 = st.tabs(["Teto Semanal", "Conta Operacional"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Teto Semanal", "Conta Operacional", "Backups", "Retenção"])
     
     # TAB 1: Teto Semanal
     with tab1:
         st.subheader("Teto Semanal")
         
         # Obter teto atual
-        query = "SELECT value FROM settings WHERE key = 'weekly_cap_amount'"
-        result = db.execute_query(query)
-        current_cap = float(result[0]['value']) if result else 0.0
+        current_cap = config.get_weekly_cap_amount()
         
         new_cap = st.number_input(
             "Defina o teto semanal (R$)",
@@ -388,13 +537,16 @@ elif page == "Configurações":
             step=10.0
         )
         
+        current_thresholds = ",".join(f"{t:g}" for t in config.get_weekly_cap_thresholds())
+        new_thresholds = st.text_input(
+            "Limiares de alerta (% do teto, separados por vírgula)",
+            value=current_thresholds
+        )
+        
         if st.button("Salvar Teto Semanal", type="primary"):
             try:
-                db.execute_insert(
-                    "INSERT INTO settings (key, value) VALUES (?, ?) "
-                    "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
-                    ("weekly_cap_amount", str(new_cap))
-                )
+                config.set_weekly_cap_thresholds(alerts.parse_thresholds(new_thresholds))
+                config.set_weekly_cap_amount(new_cap)
                 st.success("✅ Teto semanal atualizado com sucesso!")
                 st.rerun()
             except Exception as e:
@@ -405,18 +557,13 @@ elif page == "Configurações":
         st.subheader("Conta Operacional")
         
         # Obter contas
-        accounts_query = "SELECT id, name, role FROM accounts ORDER BY name"
-        accounts_result = db.execute_query(accounts_query)
+        accounts_result = config.list_accounts()
         
         if not accounts_result:
             st.error("❌ Nenhuma conta configurada.")
         else:
             # Encontrar conta operacional atual
-            current_op_id = None
-            for acc in accounts_result:
-                if acc['role'] == 'operacional':
-                    current_op_id = acc['id']
-                    break
+            current_op_id = config.get_operational_account_id()
             
             account_names = [acc['name'] for acc in accounts_result]
             current_op_name = next((acc['name'] for acc in accounts_result if acc['id'] == current_op_id), None)
@@ -431,14 +578,12 @@ elif page == "Configurações":
                 try:
                     selected_op_id = next(acc['id'] for acc in accounts_result if acc['name'] == selected_op_name)
                     
-                    # Desmarcar todas as contas operacionais
-                    db.execute_query("UPDATE accounts SET role = 'cofre' WHERE role = 'operacional'")
-                    
-                    # Marcar a selecionada como operacional
-                    db.execute_query("UPDATE accounts SET role = 'operacional' WHERE id = ?", (selected_op_id,))
-                    
-                    st.success("✅ Conta operacional atualizada com sucesso!")
-                    st.rerun()
+                    # Troca atômica: desmarca as demais e marca a selecionada na mesma transação
+                    if config.set_operational_account(selected_op_id):
+                        st.success("✅ Conta operacional atualizada com sucesso!")
+                        st.rerun()
+                    else:
+                        st.error("❌ A conta selecionada está inativa ou não existe mais.")
                 except Exception as e:
                     st.error(f"❌ Erro ao atualizar: {str(e)}")
         
@@ -453,14 +598,94 @@ elif page == "Configurações":
             if st.button("Criar Conta"):
                 try:
                     role_map = {"Operacional": "operacional", "Cofre": "cofre"}
-                    db.execute_insert(
-                        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
-                        (new_account_name, new_account_type, role_map[new_account_role], 1)
-                    )
+                    config.create_account(new_account_name, new_account_type, role_map[new_account_role])
                     st.success("✅ Conta criada com sucesso!")
                     st.rerun()
                 except Exception as e:
                     st.error(f"❌ Erro ao criar conta: {str(e)}")
+    
+    # TAB 3: Backups (cópia online, sem parar a aplicação; ver backup.py)
+    with tab3:
+        st.subheader("Backups")
+        st.caption(f"Pasta: {backup.BACKUP_DIR}. Para backups agendados, use 'python cli.py backup' no cron.")
+        
+        if st.button("Fazer Backup Agora", type="primary"):
+            progress_bar = st.progress(0.0)
+            try:
+                manifest = backup.create_backup(
+                    force=True, progress=lambda done, total: progress_bar.progress(done / total if total else 1.0)
+                )
+                progress_bar.progress(1.0)
+                st.success(
+                    f"✅ Backup criado: {manifest['pages']} páginas, "
+                    f"{manifest['compressed_size'] / 1024:.0f} KB comprimido."
+                )
+            except Exception as e:
+                st.error(f"❌ Erro no backup: {str(e)}")
+        
+        backups = backup.list_backups()
+        if not backups:
+            st.info("ℹ️ Nenhum backup encontrado.")
+        else:
+            st.dataframe([
+                {
+                    "Data": datetime.fromisoformat(item['created_at']).strftime("%d/%m/%Y %H:%M:%S"),
+                    "Lançamentos": item['tables'].get('transactions', 0),
+                    "Tamanho (KB)": round(item['compressed_size'] / 1024, 1),
+                }
+                for item in backups
+            ], use_container_width=True)
+            
+            with st.expander("Restaurar Backup"):
+                st.warning("⚠️ A restauração substitui TODOS os dados atuais pelos do backup.")
+                labels = {
+                    datetime.fromisoformat(item['created_at']).strftime("%d/%m/%Y %H:%M:%S"): item['path']
+                    for item in backups
+                }
+                selected_backup = st.selectbox("Backup", list(labels.keys()))
+                confirm = st.checkbox("Confirmo a restauração")
+                if st.button("Restaurar", disabled=not confirm):
+                    try:
+                        backup.restore_backup(labels[selected_backup])
+                        st.success("✅ Backup restaurado e verificado.")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ Erro ao restaurar: {str(e)}")
+    
+    # TAB 4: Retenção (lançamentos antigos vão para o banco de arquivo; ver archive.py)
+    with tab4:
+        st.subheader("Retenção de Lançamentos")
+        status = archive.archive_status()
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Corte Atual", format_date(status['cutoff']) if status['cutoff'] else "-")
+        with col2:
+            st.metric("Na Tabela Quente", status['hot_rows'])
+        with col3:
+            st.metric("Arquivados", status['archived_rows'])
+        st.caption(
+            f"Arquivo: {status['archive_path']}. Saldos e KPIs continuam exatos; "
+            "o histórico de períodos arquivados é lido do arquivo."
+        )
+        
+        retention = st.number_input(
+            "Meses mantidos na tabela quente", min_value=1, value=config.get_retention_months(), step=1
+        )
+        if st.button("Salvar Retenção"):
+            try:
+                config.set_retention_months(int(retention))
+                st.success("✅ Retenção atualizada!")
+            except ValueError as e:
+                st.error(f"❌ {str(e)}")
+        
+        cutoff = archive.retention_cutoff(int(retention))
+        if st.button(f"Arquivar lançamentos anteriores a {format_date(cutoff)}", type="primary"):
+            try:
+                result = archive.apply_retention(int(retention))
+                st.success(f"✅ {result['archived']} lançamento(s) arquivado(s).")
+                st.rerun()
+            except Exception as e:
+                st.error(f"❌ Erro ao arquivar: {str(e)}")
 
 # ============================================================================
 # RODAPÉ
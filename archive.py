@@ -0,0 +1,437 @@
+import os
+import sqlite3
+from datetime import datetime, date
+from typing import List, Dict, Any, Optional, Tuple
+from dateutil.relativedelta import relativedelta
+import depgraph
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from db import get_db_connection, get_read_connection, execute_read_query, begin_immediate
+    from dates import get_week_start, sql_week_start
+except ImportError:
+    import db
+    import dates
+    get_db_connection = db.get_db_connection
+    get_read_connection = db.get_read_connection
+    execute_read_query = db.execute_read_query
+    begin_immediate = db.begin_immediate
+    get_week_start = dates.get_week_start
+    sql_week_start = dates.sql_week_start
+
+# Retenção: lançamentos anteriores a uma data de corte saem da tabela quente
+# (transactions) para um banco de arquivo separado, anexado com ATTACH quando preciso.
+#
+# No banco principal ficam:
+#   - archived_summary: totais dos lançamentos arquivados na mesma chave do cubo
+#     (conta, mês, semana, categoria, tipo, método). Com ela, saldos de abertura,
+#     account_balances, spending_cube e weekly_spend_state continuam exatos e podem
+#     ser recriados (aggregates.py) sem ler o arquivo;
+#   - settings.archive_cutoff: todos os lançamentos arquivados têm data < corte.
+#
+# Leituras de período usam query_ledger(): se o período começa antes do corte, a
+# query roda sobre a união main.transactions + archive.transactions; senão, só
+# sobre a tabela quente. Somas acumuladas (saldos até uma data) usam a tabela
+# quente mais archived_balances(). Lançamentos arquivados são somente-leitura.
+
+ARCHIVE_SCHEMA = 'archive'
+DATE_FORMAT = "%Y-%m-%d"
+
+# Células dos lançamentos na chave do cubo: tabela quente agrupada + resumo do
+# arquivo. Base das recomputações em aggregates.py, cube.py e alerts.py.
+LEDGER_CELLS = f"""
+    SELECT account_id, substr(date, 1, 7) AS month, {sql_week_start('date')} AS week_start,
+           COALESCE(category, '') AS category, transaction_type, COALESCE(method, '') AS method,
+           SUM(amount) AS total, COUNT(*) AS tx_count
+    FROM transactions GROUP BY 1, 2, 3, 4, 5, 6
+    UNION ALL
+    SELECT account_id, month, week_start, category, transaction_type, method, total, tx_count
+    FROM archived_summary
+"""
+
+# Efeito no saldo (mesma regra de ledger.get_account_balance), por célula e por lançamento
+_SIGNED_TOTAL = """(CASE transaction_type
+    WHEN 'income' THEN total
+    WHEN 'expense' THEN -total
+    WHEN 'transfer' THEN -total
+    ELSE 0 END)"""
+
+_SIGNED_AMOUNT = """(CASE transaction_type
+    WHEN 'income' THEN amount
+    WHEN 'expense' THEN -amount
+    WHEN 'transfer' THEN -amount
+    ELSE 0 END)"""
+
+
+def archive_path(database: Optional[str] = None) -> str:
+    """
+    Caminho do banco de arquivo de um banco principal (padrão: db.DATABASE_NAME):
+    '<banco>_archive.db' ao lado dele. FINANCEOS_ARCHIVE_PATH só vale para o banco
+    definido pelo ambiente (db.ENV_DATABASE_NAME): outros tenants (cli.py --db)
+    nunca dividem o arquivo com ele.
+    """
+    import db
+    database = database or db.DATABASE_NAME
+    configured = os.getenv("FINANCEOS_ARCHIVE_PATH")
+    if configured and os.path.abspath(database) == os.path.abspath(db.ENV_DATABASE_NAME):
+        return configured
+    root, ext = os.path.splitext(database)
+    return f"{root}_archive{ext or '.db'}"
+
+
+def get_cutoff() -> Optional[str]:
+    """Data de corte do arquivo (YYYY-MM-DD), ou None se nada foi arquivado."""
+    import config
+    return config.get_archive_cutoff()
+
+
+def needs_archive(since: Optional[str]) -> bool:
+    """
+    Indica se uma leitura que precisa dos lançamentos a partir de 'since' tem de
+    consultar o arquivo (since=None: desde o início).
+    """
+    cutoff = get_cutoff()
+    return cutoff is not None and (since is None or since < cutoff)
+
+
+def attach(conn: sqlite3.Connection, path: Optional[str] = None) -> None:
+    """Anexa o banco de arquivo (padrão: archive_path()) à conexão como 'archive' (fora de transação)."""
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (path or archive_path(),))
+
+
+def _hot_columns(conn: sqlite3.Connection) -> List[str]:
+    return [row[1] for row in conn.execute("PRAGMA main.table_info(transactions)")]
+
+
+def union_source(conn: sqlite3.Connection) -> str:
+    """Subquery com a união main.transactions + archive.transactions (arquivo já anexado)."""
+    columns = ", ".join(_hot_columns(conn))
+    return (f"(SELECT {columns} FROM main.transactions "
+            f"UNION ALL SELECT {columns} FROM {ARCHIVE_SCHEMA}.transactions)")
+
+
+def query_ledger(query: str, params: Tuple = (), since: Optional[str] = None) -> List[sqlite3.Row]:
+    """
+    Executa uma leitura do ledger incluindo os lançamentos arquivados quando preciso.
+
+    A query escreve '{transactions}' no lugar do nome da tabela (com alias próprio,
+    se usar colunas qualificadas). Se o período lido começa antes do corte, o
+    arquivo é anexado e '{transactions}' vira a união das duas tabelas; senão,
+    a query roda só sobre a tabela quente, como execute_read_query.
+
+    Args:
+        query: SELECT com o marcador '{transactions}'.
+        params: Parâmetros da query.
+        since: Primeira data cujos lançamentos a query precisa (None: desde o início).
+
+    Returns:
+        Linhas do resultado.
+    """
+    if not needs_archive(since):
+        return execute_read_query(query.format(transactions="transactions"), params)
+    conn = get_read_connection()
+    try:
+        attach(conn)
+        return conn.execute(query.format(transactions=union_source(conn)), params).fetchall()
+    finally:
+        conn.close()
+
+
+def archived_balances(until_date: Optional[str] = None) -> Dict[int, float]:
+    """
+    Contribuição dos lançamentos arquivados para o saldo de cada conta até uma data.
+
+    Com until_date a partir do corte (ou None), sai do resumo no banco principal;
+    antes do corte, soma o detalhe do arquivo.
+
+    Returns:
+        Dicionário account_id -> valor (vazio se nada foi arquivado).
+    """
+    cutoff = get_cutoff()
+    if cutoff is None:
+        return {}
+    if until_date is None or until_date >= cutoff:
+        rows = execute_read_query(
+            f"SELECT account_id, SUM({_SIGNED_TOTAL}) AS balance FROM archived_summary GROUP BY account_id"
+        )
+    else:
+        rows = query_ledger(
+            f"SELECT account_id, SUM({_SIGNED_AMOUNT}) AS balance "
+            f"FROM {ARCHIVE_SCHEMA}.transactions WHERE date <= ? GROUP BY account_id",
+            (until_date,)
+        )
+    return {row['account_id']: row['balance'] or 0.0 for row in rows}
+
+
+def consistency(conn: sqlite3.Connection) -> Tuple[int, int]:
+    """
+    Confere banco principal e arquivo (anexado como 'archive') um contra o outro.
+
+    Lançamentos só entram no arquivo e no resumo juntos (archive_transactions), então
+    a soma de archived_summary.tx_count é sempre o número de linhas do arquivo. Um
+    banco restaurado sem o arquivo correspondente (ou o contrário) quebra essa igualdade.
+
+    Returns:
+        (linhas segundo o resumo, linhas no arquivo).
+    """
+    expected = conn.execute("SELECT COALESCE(SUM(tx_count), 0) FROM main.archived_summary").fetchone()[0]
+    has_table = conn.execute(
+        f"SELECT EXISTS (SELECT 1 FROM {ARCHIVE_SCHEMA}.sqlite_master WHERE type = 'table' AND name = 'transactions')"
+    ).fetchone()[0]
+    found = conn.execute(f"SELECT COUNT(*) FROM {ARCHIVE_SCHEMA}.transactions").fetchone()[0] if has_table else 0
+    return expected, found
+
+
+def _ensure_archive_schema(cursor: sqlite3.Cursor) -> None:
+    """Cria (ou completa) archive.transactions com as colunas da tabela quente + archived_at."""
+    columns = [(row[1], row[2] or '') for row in cursor.execute("PRAGMA main.table_info(transactions)")]
+    definitions = ", ".join(
+        f"{name} INTEGER PRIMARY KEY" if name == 'id' else f"{name} {kind}".strip() for name, kind in columns
+    )
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.transactions (
+            {definitions},
+            archived_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+    # Colunas criadas na tabela quente depois do primeiro arquivamento
+    existing = {row[1] for row in cursor.execute(f"PRAGMA {ARCHIVE_SCHEMA}.table_info(transactions)")}
+    for name, kind in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {ARCHIVE_SCHEMA}.transactions ADD COLUMN {name} {kind}")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_date ON transactions (date)")
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_account_date ON transactions (account_id, date)"
+    )
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_fingerprint ON transactions (fingerprint)")
+
+
+def retention_cutoff(retention_months: Optional[int] = None, today: Optional[str] = None) -> str:
+    """
+    Data de corte para manter 'retention_months' meses completos na tabela quente.
+
+    O corte é o primeiro dia do mês (today - retention_months), limitado à
+    Segunda-feira da semana atual (a semana corrente fica sempre na tabela quente).
+    """
+    if retention_months is None:
+        import config
+        retention_months = config.get_retention_months()
+    today = today or datetime.now().strftime(DATE_FORMAT)
+    first = (datetime.strptime(today, DATE_FORMAT).date() - relativedelta(months=retention_months)).replace(day=1)
+    return min(first.strftime(DATE_FORMAT), get_week_start(today))
+
+
+def _discard_stale_rows(cursor: sqlite3.Cursor) -> None:
+    """
+    Remove do arquivo as sobras de um banco principal restaurado de um backup anterior
+    ao arquivamento: linhas que voltaram a estar na tabela quente ou que não estão
+    abaixo do corte gravado no banco (a tabela quente é a fonte da verdade).
+    """
+    row = cursor.execute("SELECT value FROM main.settings WHERE key = 'archive_cutoff'").fetchone()
+    cutoff = row[0] if row and row[0] else None
+    if cutoff is None:
+        cursor.execute(f"DELETE FROM {ARCHIVE_SCHEMA}.transactions")
+    else:
+        cursor.execute(
+            f"DELETE FROM {ARCHIVE_SCHEMA}.transactions "
+            "WHERE date >= ? OR id IN (SELECT id FROM main.transactions)",
+            (cutoff,)
+        )
+
+
+def archive_transactions(cutoff: str, today: Optional[str] = None, vacuum: bool = False) -> Dict[str, Any]:
+    """
+    Move para o banco de arquivo os lançamentos com data anterior a 'cutoff'.
+
+    Em uma única transação (atômica nos dois arquivos): copia as linhas para
+    archive.transactions, soma-as em archived_summary, remove-as da tabela quente
+    com os triggers dos agregados desligados (os agregados não mudam: o resumo
+    passa a responder por essas linhas) e grava o novo corte. As duas pernas de
+    uma transferência têm a mesma data e são arquivadas juntas.
+
+    Args:
+        cutoff: Data de corte (YYYY-MM-DD). Não pode ser posterior à Segunda-feira da semana atual.
+        today: Data de referência (YYYY-MM-DD). Se None, usa a data atual do sistema.
+        vacuum: Se True, compacta o banco principal depois de arquivar.
+
+    Returns:
+        Dicionário com 'cutoff', 'archived' (linhas movidas), 'summary_cells', 'hot_rows' e 'archive_path'.
+
+    Raises:
+        ValueError: Se o corte for inválido, posterior à semana atual ou anterior ao corte
+            vigente, ou se o arquivo não corresponder ao resumo do banco principal.
+    """
+    datetime.strptime(cutoff, DATE_FORMAT)  # valida o formato
+    today = today or datetime.now().strftime(DATE_FORMAT)
+    if cutoff > get_week_start(today):
+        raise ValueError("O corte não pode ser posterior ao início da semana atual.")
+    current = get_cutoff()
+    if current is not None and cutoff < current:
+        raise ValueError(f"O corte não pode recuar (corte atual: {current}).")
+
+    from aggregates import install_triggers, _TRIGGER_NAMES
+    import config
+
+    conn = get_db_connection()
+    try:
+        attach(conn)  # ATTACH não pode rodar dentro de uma transação
+        begin_immediate(conn)
+        cursor = conn.cursor()
+        _ensure_archive_schema(cursor)
+        _discard_stale_rows(cursor)
+        expected, found = consistency(conn)
+        if expected != found:
+            raise ValueError(
+                f"O arquivo ({found} lançamentos) não corresponde ao resumo do banco ({expected}). "
+                "Restaure o banco e o arquivo do mesmo backup."
+            )
+        columns = ", ".join(_hot_columns(conn))
+        cursor.execute(
+            f"INSERT INTO {ARCHIVE_SCHEMA}.transactions ({columns}) "
+            f"SELECT {columns} FROM main.transactions WHERE date < ?",
+            (cutoff,)
+        )
+        archived = cursor.rowcount
+        cursor.execute(f"""
+            INSERT INTO archived_summary
+                (account_id, month, week_start, category, transaction_type, method, total, tx_count)
+            SELECT account_id, substr(date, 1, 7), {sql_week_start('date')}, COALESCE(category, ''),
+                   transaction_type, COALESCE(method, ''), SUM(amount), COUNT(*)
+            FROM main.transactions WHERE date < ?
+            GROUP BY 1, 2, 3, 4, 5, 6
+            ON CONFLICT(account_id, month, week_start, category, transaction_type, method) DO UPDATE SET
+                total = total + excluded.total,
+                tx_count = tx_count + excluded.tx_count
+        """, (cutoff,))
+        cells = cursor.rowcount
+
+        for name in _TRIGGER_NAMES:
+            cursor.execute(f"DROP TRIGGER IF EXISTS main.{name}")
+        cursor.execute("DELETE FROM main.transactions WHERE date < ?", (cutoff,))
+        if cursor.rowcount != archived:
+            raise sqlite3.IntegrityError("Linhas removidas diferem das arquivadas.")
+        install_triggers(cursor)
+
+        cursor.execute(
+            "INSERT INTO settings (key, value) VALUES ('archive_cutoff', ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (cutoff,)
+        )
+        config._bump_version(cursor)
+        # O checkpoint de integridade somou linhas que saíram: a próxima verificação é completa
+        cursor.execute("DELETE FROM integrity_checkpoints")
+        conn.commit()
+        hot_rows = conn.execute("SELECT COUNT(*) FROM main.transactions").fetchone()[0]
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    depgraph.invalidate_all()
+    if vacuum:
+        conn = get_db_connection()
+        try:
+            conn.execute("VACUUM")
+        finally:
+            conn.close()
+    return {
+        'cutoff': cutoff,
+        'archived': archived,
+        'summary_cells': cells,
+        'hot_rows': hot_rows,
+        'archive_path': archive_path(),
+    }
+
+
+def apply_retention(retention_months: Optional[int] = None, today: Optional[str] = None,
+                    vacuum: bool = False) -> Dict[str, Any]:
+    """
+    Arquiva tudo o que está fora da janela de retenção (ver retention_cutoff).
+    Se o corte calculado não avança em relação ao vigente, nada é movido.
+    """
+    cutoff = retention_cutoff(retention_months, today)
+    current = get_cutoff()
+    if current is not None and cutoff <= current:
+        return {'cutoff': current, 'archived': 0, 'summary_cells': 0, 'hot_rows': None,
+                'archive_path': archive_path()}
+    return archive_transactions(cutoff, today=today, vacuum=vacuum)
+
+
+def archive_status() -> Dict[str, Any]:
+    """Corte vigente, linhas na tabela quente, linhas e células arquivadas e caminho do arquivo."""
+    cutoff = get_cutoff()
+    counts = execute_read_query("""
+        SELECT (SELECT COUNT(*) FROM transactions) AS hot_rows,
+               (SELECT COALESCE(SUM(tx_count), 0) FROM archived_summary) AS archived_rows,
+               (SELECT COUNT(*) FROM archived_summary) AS summary_cells
+    """)[0]
+    return {'cutoff': cutoff, **dict(counts), 'archive_path': archive_path()}
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import time
+    import db
+    import ledger
+    import kpis
+    import statements
+    from aggregates import verify_aggregates, rebuild_aggregates
+    from integrity import check_integrity
+    db.initialize_db()
+
+    OP_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Operacional PF", "PF", "operacional", 1)
+    )
+    db.execute_insert("UPDATE accounts SET role = 'cofre' WHERE role = 'operacional' AND id <> ?", (OP_ID,))
+    COFRE_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Cofre", "PF", "cofre", 1)
+    )
+    # Três anos de lançamentos diários
+    queries = []
+    start = date(2023, 1, 2)
+    for day in range(3 * 365):
+        day_str = (start + relativedelta(days=day)).strftime(DATE_FORMAT)
+        queries.append((
+            "INSERT INTO transactions (date, amount, transaction_type, account_id, category, description) "
+            "VALUES (?, ?, 'expense', ?, 'Mercado', 'Compras')",
+            (day_str, 20.0 + day % 9, OP_ID)
+        ))
+        if day % 15 == 0:
+            queries.append((
+                "INSERT INTO transactions (date, amount, transaction_type, account_id, category, description) "
+                "VALUES (?, 3000.0, 'income', ?, 'Salário', 'Quinzena')",
+                (day_str, OP_ID)
+            ))
+    db.execute_many_atomic(queries)
+    ledger.add_transfer("2024-06-10", OP_ID, COFRE_ID, 500.00, "Reserva", "PIX")
+
+    checkpoints = ("2024-03-31", "2025-06-30", None)
+    before = {
+        'balances': [ledger.get_account_balance(account, day) for account in (OP_ID, COFRE_ID) for day in checkpoints],
+        'week': kpis.get_weekly_variable_expenses("2024-05-06", OP_ID),
+        'statement': statements.build_statements(["2024-06"], [OP_ID])[0]['closing_balance'],
+    }
+
+    result = archive_transactions("2025-01-01", today="2026-01-15")
+    print(f"Arquivados: {result['archived']} lançamentos ({result['summary_cells']} células de resumo); "
+          f"{result['hot_rows']} ficam na tabela quente")
+
+    after = {
+        'balances': [ledger.get_account_balance(account, day) for account in (OP_ID, COFRE_ID) for day in checkpoints],
+        'week': kpis.get_weekly_variable_expenses("2024-05-06", OP_ID),
+        'statement': statements.build_statements(["2024-06"], [OP_ID])[0]['closing_balance'],
+    }
+    same = all(abs(a - b) < 0.005 for a, b in zip(before['balances'], after['balances']))
+    print(f"Saldos iguais antes e depois? {same}")
+    print(f"Semana arquivada (via ATTACH) igual? {abs(before['week'] - after['week']) < 0.005}")
+    print(f"Extrato de 2024-06 igual? {abs(before['statement'] - after['statement']) < 0.005}")
+    print("Agregados exatos?", not any(verify_aggregates().values()))
+    rebuild_aggregates()
+    print("Agregados exatos depois de recriar?", not any(verify_aggregates().values()))
+    print("Integridade ok?", check_integrity(full=True, save_checkpoint=False)['ok'])
+
+    started = time.perf_counter()
+    rows = query_ledger("SELECT COUNT(*) AS n FROM {transactions} WHERE date >= ?", ("2023-01-01",), since="2023-01-01")
+    print(f"Histórico completo via ATTACH: {rows[0]['n']} linhas em {(time.perf_counter() - started) * 1000:.1f} ms")
+    print(archive_status())
@@ -0,0 +1,580 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable
+import archive
+import db
+import depgraph
+import snapshot
+
+# Backups online do banco, sem parar a aplicação.
+#
+# A cópia usa a API de backup do SQLite em passos de poucas páginas: a cada passo o
+# backup segura a trava de leitura só pelo tempo de copiar 'pages' páginas e dorme
+# 'sleep' segundos, deixando os escritores avançarem. Se outra conexão gravar no
+# meio, o SQLite recomeça a cópia sozinho, e o resultado é sempre um retrato
+# consistente. A cópia é conferida (PRAGMA integrity_check), comprimida (gzip) e
+# registrada em um manifesto JSON ao lado do arquivo. Só os 'keep' backups mais
+# recentes são mantidos.
+#
+# Incremental: um backup sem mudança no banco desde o anterior (mesma assinatura
+# do arquivo: contador de mudanças do cabeçalho, tamanho e mtime) é pulado.
+#
+# O banco de arquivo (archive.py), se existir, entra no mesmo backup (arquivo
+# '.archive.db.gz' e seção 'archive' do manifesto) e é restaurado junto: os dois
+# só fazem sentido como par (archived_summary e archive_cutoff descrevem o arquivo).
+
+BACKUP_DIR = os.getenv("FINANCEOS_BACKUP_DIR", "/tmp/finance_os_backups")
+DEFAULT_PAGES = 64      # páginas por passo
+DEFAULT_SLEEP = 0.005   # segundos entre passos
+DEFAULT_KEEP = 7
+MAX_RESTARTS = 3        # recomeços por escrita concorrente antes de copiar em um só passo
+PREFIX = "finance_os-"
+SUFFIX = ".db.gz"
+ARCHIVE_SUFFIX = ".archive.db.gz"
+MAX_PAIR_ATTEMPTS = 3   # cópias do par principal + arquivo até pegarem o mesmo estado
+
+ProgressCallback = Callable[[int, int], None]  # (páginas copiadas, total de páginas)
+
+_scheduler: Dict[str, Any] = {'thread': None, 'stop_event': None, 'runs': 0, 'last': None, 'last_error': None}
+
+
+def _signature(path: str) -> str:
+    """Assinatura do estado do banco em disco (muda a cada commit)."""
+    parts = []
+    for file_path in (path, path + "-wal"):
+        if os.path.exists(file_path):
+            info = os.stat(file_path)
+            parts.append(f"{info.st_size}:{info.st_mtime_ns}")
+    with open(path, 'rb') as f:
+        header = f.read(28)
+    counter = struct.unpack(">I", header[24:28])[0] if len(header) == 28 else 0
+    return f"{counter}|" + "|".join(parts)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_path(backup_path: str) -> str:
+    return backup_path[:-len(SUFFIX)] + ".json"
+
+
+def _archive_backup_path(backup_path: str) -> str:
+    return backup_path[:-len(SUFFIX)] + ARCHIVE_SUFFIX
+
+
+def _table_counts(conn: sqlite3.Connection) -> Dict[str, int]:
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+    return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+
+
+def _check_copy(path: str) -> Dict[str, int]:
+    """Confere a integridade de uma cópia não comprimida; retorna as contagens por tabela."""
+    conn = sqlite3.connect(path)
+    try:
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != 'ok':
+            raise sqlite3.DatabaseError(f"Cópia corrompida: {result}")
+        return _table_counts(conn)
+    finally:
+        conn.close()
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _online_copy(
+    source: sqlite3.Connection,
+    target: sqlite3.Connection,
+    pages: int,
+    sleep: float,
+    progress: Optional[ProgressCallback]
+) -> Dict[str, int]:
+    """
+    Copia 'source' para 'target' em passos. Se escritas concorrentes fizerem a cópia
+    recomeçar mais de MAX_RESTARTS vezes, termina em um único passo (trava de leitura
+    pelo tempo de uma cópia inteira, mas garante que o backup termina).
+
+    Returns:
+        Dicionário com 'pages' (total de páginas) e 'restarts'.
+    """
+    state = {'pages': 0, 'remaining': None, 'restarts': 0}
+
+    def on_step(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state.update(pages=total, remaining=remaining)
+        if progress is not None:
+            progress(total - remaining, total)
+        if remaining and sleep:
+            # A trava de leitura é solta ao fim de cada passo: a pausa é a vez dos escritores
+            # (o 'sleep' do sqlite3 só vale quando o passo encontra o banco travado)
+            time.sleep(sleep)
+
+    try:
+        source.backup(target, pages=pages, progress=on_step, sleep=sleep)
+    except _TooManyRestarts:
+        source.backup(target, pages=-1)
+    if not state['pages'] or state['restarts'] > MAX_RESTARTS:
+        state['pages'] = target.execute("PRAGMA page_count").fetchone()[0]
+    return {'pages': state['pages'], 'restarts': state['restarts']}
+
+
+def _check_pair(main_path: str, archive_file: Optional[str]) -> bool:
+    """Se o banco principal e o arquivo (ou a falta dele) descrevem o mesmo estado."""
+    conn = sqlite3.connect(main_path)
+    try:
+        if archive_file is None:
+            return conn.execute("SELECT COALESCE(SUM(tx_count), 0) FROM archived_summary").fetchone()[0] == 0
+        archive.attach(conn, archive_file)
+        expected, found = archive.consistency(conn)
+        return expected == found
+    finally:
+        conn.close()
+
+
+def _compress(raw_path: str, path: str) -> None:
+    with open(raw_path, 'rb') as raw, gzip.open(path + ".partial", 'wb', compresslevel=6) as compressed:
+        shutil.copyfileobj(raw, compressed, 1 << 20)
+    os.replace(path + ".partial", path)  # o .db.gz só aparece completo
+
+
+def list_backups(output_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Manifestos dos backups existentes, do mais recente para o mais antigo."""
+    output_dir = output_dir or BACKUP_DIR
+    if not os.path.isdir(output_dir):
+        return []
+    manifests = []
+    for name in os.listdir(output_dir):
+        if name.startswith(PREFIX) and name.endswith(SUFFIX) and not name.endswith(ARCHIVE_SUFFIX):
+            path = os.path.join(output_dir, name)
+            try:
+                with open(_manifest_path(path), encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue  # backup sem manifesto (incompleto): ignorado
+            manifests.append(dict(manifest, path=path))
+    return sorted(manifests, key=lambda m: m['created_at'], reverse=True)
+
+
+def _rotate(output_dir: str, keep: int) -> List[str]:
+    removed = []
+    for manifest in list_backups(output_dir)[keep:]:
+        for path in (manifest['path'], _archive_backup_path(manifest['path']), _manifest_path(manifest['path'])):
+            if os.path.exists(path):
+                os.remove(path)
+        removed.append(manifest['path'])
+    return removed
+
+
+def create_backup(
+    output_dir: Optional[str] = None,
+    pages: int = DEFAULT_PAGES,
+    sleep: float = DEFAULT_SLEEP,
+    keep: int = DEFAULT_KEEP,
+    force: bool = False,
+    progress: Optional[ProgressCallback] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Faz um backup online do banco atual (db.DATABASE_NAME) e do seu banco de arquivo.
+
+    O arquivo é copiado antes do principal; se um arquivamento acontecer entre as
+    duas cópias, o par não confere (archive.consistency) e é copiado de novo.
+
+    Args:
+        output_dir: Pasta dos backups. Se None, usa BACKUP_DIR.
+        pages: Páginas copiadas por passo (menos páginas = escritores menos bloqueados).
+        sleep: Pausa entre passos, em segundos.
+        keep: Quantos backups manter (os mais antigos são apagados).
+        force: Se True, faz o backup mesmo sem mudanças desde o anterior.
+        progress: Função chamada a cada passo com (páginas copiadas, total).
+
+    Returns:
+        O manifesto do backup ('path', 'created_at', 'source', 'signature', 'pages',
+        'restarts', 'size', 'compressed_size', 'sha256', 'tables', 'archive', 'elapsed',
+        'removed'), ou None se foi pulado por não haver mudanças. 'archive' é None se não
+        há banco de arquivo, ou um dicionário com 'file', 'size', 'compressed_size',
+        'sha256' e 'tables'.
+
+    Raises:
+        sqlite3.DatabaseError: Se o par principal + arquivo não conferir após MAX_PAIR_ATTEMPTS cópias.
+    """
+    output_dir = output_dir or BACKUP_DIR
+    os.makedirs(output_dir, exist_ok=True)
+    source_path = db.DATABASE_NAME
+    archive_source = archive.archive_path()
+    has_archive = os.path.exists(archive_source)
+    signature = _signature(source_path)
+    if has_archive:
+        signature += "#" + _signature(archive_source)
+    backups = list_backups(output_dir)
+    if not force and backups and backups[0]['signature'] == signature:
+        return None
+
+    started = time.perf_counter()
+    created_at = datetime.now()
+    path = os.path.join(output_dir, f"{PREFIX}{created_at.strftime('%Y%m%d-%H%M%S-%f')}{SUFFIX}")
+    archive_file = _archive_backup_path(path)
+    fd, raw_path = tempfile.mkstemp(suffix=".db", dir=output_dir)
+    os.close(fd)
+    raw_archive = None
+    if has_archive:
+        fd, raw_archive = tempfile.mkstemp(suffix=".db", dir=output_dir)
+        os.close(fd)
+    try:
+        for attempt in range(1, MAX_PAIR_ATTEMPTS + 1):
+            if raw_archive is not None:
+                source = sqlite3.connect(archive_source, timeout=db.BUSY_TIMEOUT)
+                target = sqlite3.connect(raw_archive)
+                try:
+                    _online_copy(source, target, pages, sleep, None)
+                finally:
+                    target.close()
+                    source.close()
+            source = db.get_db_connection()
+            target = sqlite3.connect(raw_path)
+            try:
+                copy = _online_copy(source, target, pages, sleep, progress)
+            finally:
+                target.close()
+                source.close()
+            if _check_pair(raw_path, raw_archive):
+                break
+            if attempt == MAX_PAIR_ATTEMPTS:
+                raise sqlite3.DatabaseError(f"Banco principal e arquivo não correspondem após {MAX_PAIR_ATTEMPTS} cópias.")
+        tables = _check_copy(raw_path)
+
+        archive_manifest = None
+        if raw_archive is not None:
+            archive_tables = _check_copy(raw_archive)
+            _compress(raw_archive, archive_file)
+            archive_manifest = {
+                'file': os.path.basename(archive_file),
+                'size': os.path.getsize(raw_archive),
+                'compressed_size': os.path.getsize(archive_file),
+                'sha256': _sha256(archive_file),
+                'tables': archive_tables,
+            }
+        _compress(raw_path, path)
+        manifest = {
+            'created_at': created_at.isoformat(timespec='microseconds'),
+            'source': source_path,
+            'signature': signature,
+            'pages': copy['pages'],
+            'restarts': copy['restarts'],
+            'size': os.path.getsize(raw_path),
+            'compressed_size': os.path.getsize(path),
+            'sha256': _sha256(path),
+            'tables': tables,
+            'archive': archive_manifest,
+        }
+        with open(_manifest_path(path), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+    finally:
+        for leftover in (raw_path, raw_archive, path + ".partial", archive_file + ".partial"):
+            if leftover and os.path.exists(leftover):
+                os.remove(leftover)
+
+    removed = _rotate(output_dir, keep)
+    return dict(manifest, path=path, elapsed=time.perf_counter() - started, removed=removed)
+
+
+def _decompress(backup_path: str, directory: str) -> str:
+    fd, raw_path = tempfile.mkstemp(suffix=".db", dir=directory)
+    os.close(fd)
+    with gzip.open(backup_path, 'rb') as compressed, open(raw_path, 'wb') as raw:
+        shutil.copyfileobj(compressed, raw, 1 << 20)
+    return raw_path
+
+
+def verify_backup(backup_path: str) -> Dict[str, Any]:
+    """
+    Confere um backup: hash do arquivo, integridade do banco e contagens por tabela
+    iguais às do manifesto; o mesmo para o banco de arquivo, se houver, e se os dois
+    formam um par consistente.
+
+    Returns:
+        Dicionário com 'ok' e 'errors' (lista de problemas encontrados).
+    """
+    errors = []
+    with open(_manifest_path(backup_path), encoding='utf-8') as f:
+        manifest = json.load(f)
+    if _sha256(backup_path) != manifest['sha256']:
+        errors.append("sha256 diferente do manifesto")
+    directory = os.path.dirname(os.path.abspath(backup_path))
+    archive_manifest = manifest.get('archive')
+    raw_archive = None
+    if archive_manifest is not None:
+        archive_file = os.path.join(directory, archive_manifest['file'])
+        if not os.path.exists(archive_file):
+            return {'ok': False, 'errors': errors + ["banco de arquivo do backup não encontrado"]}
+        if _sha256(archive_file) != archive_manifest['sha256']:
+            errors.append("sha256 do arquivo diferente do manifesto")
+        raw_archive = _decompress(archive_file, directory)
+    raw_path = _decompress(backup_path, directory)
+    try:
+        tables = _check_copy(raw_path)
+        if tables != manifest['tables']:
+            errors.append("contagens por tabela diferentes do manifesto")
+        if raw_archive is not None and _check_copy(raw_archive) != archive_manifest['tables']:
+            errors.append("contagens por tabela do arquivo diferentes do manifesto")
+        if not _check_pair(raw_path, raw_archive):
+            errors.append("banco principal e arquivo não correspondem")
+    except sqlite3.DatabaseError as e:
+        errors.append(str(e))
+    finally:
+        for leftover in (raw_path, raw_archive):
+            if leftover:
+                os.remove(leftover)
+    return {'ok': not errors, 'errors': errors}
+
+
+def _temp_copy(path: str, directory: str) -> str:
+    """Copia um banco (online) para um arquivo temporário em 'directory'; retorna o caminho."""
+    fd, copy_path = tempfile.mkstemp(suffix=".db", dir=directory)
+    os.close(fd)
+    _copy_db(path, copy_path, -1)
+    return copy_path
+
+
+def _copy_db(source_path: str, target_path: str, pages: int, progress: Optional[ProgressCallback] = None) -> None:
+    source = sqlite3.connect(source_path, timeout=db.BUSY_TIMEOUT)
+    target = sqlite3.connect(target_path, timeout=db.BUSY_TIMEOUT)
+    try:
+        _online_copy(source, target, pages, 0.0, progress)
+    finally:
+        target.close()
+        source.close()
+
+
+def _clear_archived(path: str) -> None:
+    """Apaga os lançamentos de uma cópia do banco de arquivo."""
+    conn = sqlite3.connect(path)
+    try:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions'").fetchone():
+            with conn:
+                conn.execute("DELETE FROM transactions")
+    finally:
+        conn.close()
+
+
+def restore_backup(
+    backup_path: str,
+    target_path: Optional[str] = None,
+    pages: int = DEFAULT_PAGES,
+    progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """
+    Restaura um backup sobre o banco (verificado antes e depois).
+
+    A restauração também usa a API de backup: o conteúdo do banco é trocado de forma
+    atômica, com o banco no lugar, e conexões abertas por outras partes da aplicação
+    continuam válidas.
+
+    O banco de arquivo do destino (archive.archive_path(target_path)) é restaurado
+    do mesmo backup; se o backup não tem arquivo, os lançamentos arquivados do
+    destino são apagados (o resumo restaurado não os conhece). O par é conferido
+    em arquivos temporários antes de tocar no destino, e o estado atual do destino
+    é guardado: se a troca do principal ou do arquivo falhar, os dois voltam a ele.
+    Com o snapshot de leitura ativo (snapshot.py), ele é recopiado em seguida.
+
+    Args:
+        backup_path: Arquivo .db.gz a restaurar.
+        target_path: Banco de destino. Se None, o banco atual (db.DATABASE_NAME).
+        pages: Páginas por passo.
+        progress: Função chamada a cada passo com (páginas copiadas, total).
+
+    Returns:
+        Dicionário com 'restored' (caminho do destino), 'tables' (contagens por tabela)
+        e 'archive' (caminho do arquivo restaurado, ou None).
+
+    Raises:
+        ValueError: Se o backup não passar na verificação.
+        sqlite3.DatabaseError: Se o par não conferir antes ou depois da troca (destino intacto).
+    """
+    check = verify_backup(backup_path)
+    if not check['ok']:
+        raise ValueError(f"Backup inválido: {'; '.join(check['errors'])}")
+    with open(_manifest_path(backup_path), encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    target_path = target_path or db.DATABASE_NAME
+    directory = os.path.dirname(os.path.abspath(backup_path))
+    archive_target = archive.archive_path(target_path)
+    archive_manifest = manifest.get('archive')
+    had_archive = os.path.exists(archive_target)
+    temp_paths = []
+    try:
+        # 1. Par a restaurar, em arquivos temporários, conferido antes de tocar no destino
+        raw_path = _decompress(backup_path, directory)
+        temp_paths.append(raw_path)
+        raw_archive = None
+        if archive_manifest is not None:
+            raw_archive = _decompress(os.path.join(directory, archive_manifest['file']), directory)
+            temp_paths.append(raw_archive)
+        elif had_archive:
+            # Backup sem arquivo: o destino fica com o arquivo vazio (o resumo restaurado não o conhece)
+            raw_archive = _temp_copy(archive_target, directory)
+            temp_paths.append(raw_archive)
+            _clear_archived(raw_archive)
+        if _check_copy(raw_path) != manifest['tables']:
+            raise sqlite3.DatabaseError("Contagens do backup diferentes do manifesto.")
+        if not _check_pair(raw_path, raw_archive):
+            raise sqlite3.DatabaseError("Banco principal e arquivo do backup não correspondem.")
+
+        # 2. Estado atual do destino, para desfazer a troca se ela falhar no meio
+        previous_main = _temp_copy(target_path, directory)
+        temp_paths.append(previous_main)
+        previous_archive = None
+        if raw_archive is not None and had_archive:
+            previous_archive = _temp_copy(archive_target, directory)
+            temp_paths.append(previous_archive)
+
+        # 3. Troca: principal, depois arquivo; conferidos de novo no destino
+        try:
+            _copy_db(raw_path, target_path, pages, progress)
+            if raw_archive is not None:
+                _copy_db(raw_archive, archive_target, pages)
+            conn = sqlite3.connect(target_path, timeout=db.BUSY_TIMEOUT)
+            try:
+                tables = _table_counts(conn)
+            finally:
+                conn.close()
+            if tables != manifest['tables']:
+                raise sqlite3.DatabaseError("Contagens após a restauração diferentes do manifesto.")
+            if not _check_pair(target_path, archive_target if raw_archive is not None else None):
+                raise sqlite3.DatabaseError("Banco principal e arquivo restaurados não correspondem.")
+        except Exception:
+            _copy_db(previous_main, target_path, -1)
+            if previous_archive is not None:
+                _copy_db(previous_archive, archive_target, -1)
+            elif raw_archive is not None and os.path.exists(archive_target):
+                os.remove(archive_target)  # não existia antes da restauração
+            raise
+    finally:
+        for path in temp_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    if target_path == db.DATABASE_NAME:
+        snapshot.refresh(force=True)  # leituras pelo snapshot (se ativo) já veem o conteúdo restaurado
+        depgraph.invalidate_all()  # o conteúdo inteiro mudou
+    return {'restored': target_path, 'tables': tables,
+            'archive': archive_target if archive_manifest is not None else None}
+
+
+def _scheduler_loop(interval: float, stop_event: threading.Event, options: Dict[str, Any]) -> None:
+    while not stop_event.wait(interval):
+        try:
+            _scheduler['last'] = create_backup(**options)
+            _scheduler['last_error'] = None
+        except (OSError, sqlite3.Error) as e:  # o agendamento continua na próxima rodada
+            _scheduler['last_error'] = f"{type(e).__name__}: {e}"
+        _scheduler['runs'] += 1
+
+
+def start_scheduled_backups(interval: float, **options: Any) -> None:
+    """
+    Inicia uma thread que roda create_backup(**options) a cada 'interval' segundos
+    (backups sem mudança no banco são pulados).
+    """
+    if _scheduler['thread'] is not None:
+        return
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=_scheduler_loop, args=(interval, stop_event, options),
+        name="finance-os-backup", daemon=True
+    )
+    _scheduler.update(thread=thread, stop_event=stop_event, runs=0, last=None, last_error=None)
+    thread.start()
+
+
+def stop_scheduled_backups() -> None:
+    """Para o agendamento (espera o backup em andamento terminar)."""
+    if _scheduler['thread'] is None:
+        return
+    _scheduler['stop_event'].set()
+    _scheduler['thread'].join()
+    _scheduler.update(thread=None, stop_event=None)
+
+
+def backup_status() -> Dict[str, Any]:
+    """Situação do agendamento: se está ativo, rodadas, último backup e último erro."""
+    return {
+        'scheduled': _scheduler['thread'] is not None,
+        'runs': _scheduler['runs'],
+        'last': _scheduler['last'],
+        'last_error': _scheduler['last_error'],
+    }
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import ledger
+    db.initialize_db()
+
+    OP_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Operacional PF", "PF", "operacional", 1)
+    )
+    for day in range(1, 29):
+        ledger.add_transaction(f"2026-02-{day:02d}", 20.00, "expense", OP_ID, "Alimentação", "Gasto diário")
+
+    output_dir = tempfile.mkdtemp(prefix="finance_os_backups_")
+
+    # Backup com um escritor concorrente: os passos pequenos não o bloqueiam
+    stop = threading.Event()
+    written = []
+
+    def writer():
+        while not stop.is_set():
+            written.append(ledger.add_transaction("2026-03-01", 1.00, "expense", OP_ID, "Teste", "Durante o backup"))
+            time.sleep(0.01)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    steps = []
+    first = create_backup(output_dir, pages=4, sleep=0.002, progress=lambda done, total: steps.append(done))
+    stop.set()
+    thread.join()
+    print(f"Backup: {first['pages']} páginas em {len(steps)} passos ({first['restarts']} recomeço(s)), "
+          f"{first['elapsed'] * 1000:.0f} ms; {len(written)} escritas concorrentes; "
+          f"{first['size']} -> {first['compressed_size']} bytes")
+    create_backup(output_dir)  # pega as escritas feitas depois da cópia
+    print(f"Sem mudanças desde o último backup: {create_backup(output_dir) is None}")
+
+    # Restauração verificada: volta ao estado do primeiro backup
+    before = first['tables']['transactions']
+    ledger.add_transaction("2026-03-02", 999.00, "expense", OP_ID, "Teste", "Depois do backup")
+    print(f"Verificação: {verify_backup(first['path'])}")
+    restored = restore_backup(first['path'])
+    print(f"Restaurado: {restored['tables']['transactions']} lançamentos (backup: {before}); "
+          f"saldo {ledger.get_account_balance(OP_ID):.2f}")
+
+    # Banco de arquivo no mesmo backup: backup -> arquivamento -> restauração -> arquivamento
+    import archive
+    before_archive = create_backup(output_dir, force=True)
+    archived = archive.archive_transactions("2026-02-16")['archived']
+    with_archive = create_backup(output_dir)
+    restore_backup(before_archive['path'])
+    again = archive.archive_transactions("2026-02-16")['archived']
+    print(f"Arquivados: {archived}; no backup: {with_archive['archive']['tables']['transactions']}; "
+          f"rearquivados após restaurar: {again}; verificação: {verify_backup(with_archive['path'])['ok']}")
+    shutil.rmtree(output_dir)
@@ -0,0 +1,167 @@
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+import depgraph
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from db import execute_read_query
+    from archive import query_ledger, needs_archive, archived_balances
+except ImportError:
+    import db
+    import archive
+    execute_read_query = db.execute_read_query
+    query_ledger = archive.query_ledger
+    needs_archive = archive.needs_archive
+    archived_balances = archive.archived_balances
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# Métricas do calendário (ver calendar_frame)
+METRICS = ('net', 'inflow', 'outflow', 'balance')
+
+# Uma única query agrupada: lançamentos anteriores ao início entram no grupo de
+# data NULL (saldo de abertura), os do período por (conta, dia). Mesma regra de
+# saldo de ledger.get_account_balance: income soma; expense e transfer subtraem.
+# Períodos que começam antes do corte do arquivo leem também os lançamentos
+# arquivados (archive.query_ledger); senão, a parte arquivada entra pelo resumo.
+_DAILY_QUERY = """
+    SELECT
+        account_id,
+        CASE WHEN date < ? THEN NULL ELSE date END AS day,
+        SUM(CASE WHEN transaction_type = 'income' THEN amount ELSE 0 END) AS inflow,
+        SUM(CASE WHEN transaction_type IN ('expense', 'transfer') THEN amount ELSE 0 END) AS outflow
+    FROM {transactions}
+    WHERE date <= ?
+      AND account_id IN ({placeholders})
+    GROUP BY account_id, day
+"""
+
+
+def _resolve_accounts(account_ids: Optional[Sequence[int]]) -> List[int]:
+    if account_ids is not None:
+        return sorted(set(account_ids))
+    return [row['id'] for row in execute_read_query("SELECT id FROM accounts WHERE active = 1 ORDER BY id")]
+
+
+def get_daily_cash_flow(
+    start_date: str,
+    end_date: str,
+    account_ids: Optional[Sequence[int]] = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    Matriz diária densa (dias x contas) de entradas, saídas e saldo ao fim do dia.
+
+    Uma query agrupada por (conta, dia) traz os totais; os dias sem movimento
+    entram com 0 e o saldo sai de uma soma acumulada (NumPy) a partir do saldo de
+    abertura. O saldo de cada dia é igual a ledger.get_account_balance(conta, dia).
+    O resultado fica em cache (depgraph) até um novo lançamento ou alteração de contas.
+
+    Args:
+        start_date: Primeiro dia (YYYY-MM-DD).
+        end_date: Último dia (YYYY-MM-DD).
+        account_ids: Contas (colunas). Se None, todas as contas ativas.
+
+    Returns:
+        Dicionário com os DataFrames 'inflow', 'outflow' e 'balance', indexados
+        pelas datas do período e com uma coluna por account_id
+        (não altere: o valor é compartilhado pelo cache).
+    """
+    if end_date < start_date:
+        raise ValueError("end_date deve ser igual ou posterior a start_date.")
+    accounts = _resolve_accounts(account_ids)
+
+    def compute():
+        index = pd.date_range(start_date, end_date, freq='D', name='date')
+        columns = pd.Index(accounts, name='account_id')
+        inflow = np.zeros((len(index), len(accounts)))
+        outflow = np.zeros_like(inflow)
+        opening = np.zeros(len(accounts))
+        if accounts:
+            query = _DAILY_QUERY.replace("{placeholders}", ", ".join("?" * len(accounts)))
+            rows = query_ledger(query, (start_date, end_date, *accounts), since=start_date)
+            if not needs_archive(start_date):
+                archived = archived_balances()
+                opening += np.array([archived.get(account, 0.0) for account in accounts])
+            if rows:
+                account_col = np.searchsorted(accounts, [row['account_id'] for row in rows])
+                days = np.array([row['day'] or start_date for row in rows], dtype='datetime64[D]')
+                offsets = (days - np.datetime64(start_date, 'D')).astype(np.int64)
+                row_in = np.fromiter((row['inflow'] for row in rows), dtype=float, count=len(rows))
+                row_out = np.fromiter((row['outflow'] for row in rows), dtype=float, count=len(rows))
+                before = np.fromiter((row['day'] is None for row in rows), dtype=bool, count=len(rows))
+                np.add.at(opening, account_col[before], row_in[before] - row_out[before])
+                within = ~before
+                np.add.at(inflow, (offsets[within], account_col[within]), row_in[within])
+                np.add.at(outflow, (offsets[within], account_col[within]), row_out[within])
+        balance = opening + np.cumsum(inflow - outflow, axis=0)
+        return {
+            'inflow': pd.DataFrame(inflow, index=index, columns=columns),
+            'outflow': pd.DataFrame(outflow, index=index, columns=columns),
+            'balance': pd.DataFrame(balance, index=index, columns=columns),
+        }
+
+    node = ('daily_cash_flow', start_date, end_date, tuple(accounts))
+    return depgraph.cached(node, [('transactions',), ('accounts',)], compute)
+
+
+def calendar_frame(flow: Dict[str, pd.DataFrame], metric: str = 'net') -> pd.DataFrame:
+    """
+    Dados do mapa de calor em formato de calendário (somando as contas).
+
+    Args:
+        flow: Resultado de get_daily_cash_flow.
+        metric: 'net' (entradas - saídas), 'inflow', 'outflow' ou 'balance' (saldo ao fim do dia).
+
+    Returns:
+        DataFrame com uma linha por dia: 'date', 'value', 'year', 'week_start'
+        (Segunda-feira da semana, eixo das colunas) e 'weekday' (0 = Segunda ... 6 = Domingo).
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Métrica inválida: {metric}. Use {', '.join(METRICS)}.")
+    if metric == 'net':
+        values = flow['inflow'].to_numpy().sum(axis=1) - flow['outflow'].to_numpy().sum(axis=1)
+    else:
+        values = flow[metric].to_numpy().sum(axis=1)
+    dates = flow['inflow'].index
+    weekday = dates.dayofweek
+    return pd.DataFrame({
+        'date': dates,
+        'value': values,
+        'year': dates.year,
+        'week_start': dates - pd.to_timedelta(weekday, unit='D'),
+        'weekday': weekday,
+    })
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import time
+    import db
+    import ledger
+    db.initialize_db()
+
+    OP_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Operacional PF", "PF", "operacional", 1)
+    )
+    COFRE_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Cofre", "PF", "cofre", 1)
+    )
+    ledger.add_transaction("2025-12-20", 1000.00, "income", OP_ID, "Salário", "Saldo anterior")
+    ledger.add_transaction("2026-01-05", 5000.00, "income", OP_ID, "Salário", "Salário")
+    ledger.add_transaction("2026-01-07", 120.00, "expense", OP_ID, "Mercado", "Compras")
+    ledger.add_transfer("2026-01-10", OP_ID, COFRE_ID, 1500.00, "Reserva", "PIX")
+
+    flow = get_daily_cash_flow("2026-01-01", "2026-01-31")
+    print(flow['balance'].loc["2026-01-04":"2026-01-11"])
+    same = all(
+        abs(flow['balance'].loc[day, account] - ledger.get_account_balance(account, day.strftime(DATE_FORMAT))) < 0.005
+        for day in flow['balance'].index for account in flow['balance'].columns
+    )
+    print(f"Saldo diário == get_account_balance(conta, dia)? {same}")
+
+    # Vários anos: uma query e uma soma acumulada
+    started = time.perf_counter()
+    depgraph.invalidate_all()
+    calendar = calendar_frame(get_daily_cash_flow("2020-01-01", "2026-12-31"), metric='net')
+    print(f"Calendário 2020-2026: {len(calendar)} dias em {(time.perf_counter() - started) * 1000:.1f} ms")
@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, Callable
+import db
+import depgraph
+
+# Jobs em lote (noturnos) sem Streamlit. Exemplos:
+#   python cli.py rebuild
+#   python cli.py check-integrity --full
+#   python cli.py backfill-reconciliations --workers 4
+#   python cli.py forecast --days 30 --as-of 2026-01-31
+#   python cli.py kpi-history --start 2025-01-01 --end 2025-12-31 --output kpis_2025.csv
+#   python cli.py export --start-month 2025-01 --end-month 2025-12 --output-dir extratos
+#   python cli.py backup --output-dir /var/backups/finance_os --keep 14
+#   python cli.py restore --file /var/backups/finance_os/finance_os-20260131-020000-000000.db.gz
+#   python cli.py archive --months 24 --vacuum
+#   python cli.py --db cliente_a.db --db cliente_b.db --workers 2 rebuild
+#
+# Cada --db é um tenant (banco separado), processado em paralelo em processos
+# distintos. Dentro de um tenant, jobs por conta usam --workers threads.
+#
+# Códigos de saída:
+EXIT_OK = 0
+EXIT_ISSUES = 1    # job concluído, mas encontrou divergências (ex: integridade)
+EXIT_USAGE = 2     # argumentos inválidos (argparse)
+EXIT_FAILURE = 3   # job falhou com erro
+
+
+def _progress(options: Dict[str, Any], message: str) -> None:
+    if not options.get('quiet'):
+        print(message, file=sys.stderr, flush=True)
+
+
+def _account_ids(options: Dict[str, Any]) -> List[int]:
+    if options.get('account'):
+        return list(options['account'])
+    return [row['id'] for row in db.execute_read_query("SELECT id FROM accounts ORDER BY id")]
+
+
+def _per_account(options: Dict[str, Any], label: str, work: Callable[[int], Any]) -> Dict[int, Any]:
+    """Executa 'work' para cada conta em paralelo (threads), com progresso."""
+    accounts = _account_ids(options)
+    results = {}
+    with ThreadPoolExecutor(max_workers=options.get('workers') or 1) as pool:
+        futures = {pool.submit(work, account_id): account_id for account_id in accounts}
+        for done, future in enumerate(as_completed(futures), 1):
+            account_id = futures[future]
+            results[account_id] = future.result()
+            _progress(options, f"  {label}: conta {account_id} ({done}/{len(accounts)})")
+    return results
+
+
+# ============================================================================
+# JOBS (retornam (resultado serializável, encontrou_divergências))
+# ============================================================================
+
+def _job_rebuild(options: Dict[str, Any]) -> tuple:
+    from aggregates import rebuild_aggregates, verify_aggregates
+    rows = rebuild_aggregates()
+    divergences = verify_aggregates()
+    return {'rows': rows, 'divergences': {t: len(d) for t, d in divergences.items()}}, any(divergences.values())
+
+
+def _job_backfill_reconciliations(options: Dict[str, Any]) -> tuple:
+    from reconciliation import backfill_reconciliations
+    updated = _per_account(options, "reconciliações", backfill_reconciliations)
+    return {'updated': sum(updated.values()), 'by_account': updated}, False
+
+
+def _job_forecast(options: Dict[str, Any]) -> tuple:
+    from forecast import forecast_cash_flow
+    return forecast_cash_flow(days=options['days'], as_of=options.get('as_of')), False
+
+
+def _job_kpi_history(options: Dict[str, Any]) -> tuple:
+    from kpi_history import daily_dates, get_kpi_history
+    history = get_kpi_history(daily_dates(options['start'], options['end']), forecast_days=options['days'])
+    output = options.get('output')
+    if output:
+        history.to_csv(_tenant_path(options, output))
+    return {'dates': len(history), 'output': output}, False
+
+
+def _job_export(options: Dict[str, Any]) -> tuple:
+    from statements import generate_statements
+    paths = generate_statements(
+        options['start_month'], options['end_month'], _tenant_path(options, options['output_dir']),
+        account_ids=options.get('account'), formats=options['format'], processes=options.get('workers')
+    )
+    return {'files': len(paths)}, False
+
+
+def _job_check_integrity(options: Dict[str, Any]) -> tuple:
+    from integrity import check_integrity
+    report = check_integrity(full=options.get('full', False))
+    return report, not report['ok']
+
+
+def _job_backup(options: Dict[str, Any]) -> tuple:
+    from backup import BACKUP_DIR, create_backup
+    output_dir = _tenant_path(options, options.get('output_dir') or BACKUP_DIR)
+    manifest = create_backup(output_dir, keep=options['keep'], force=options.get('force', False))
+    if manifest is None:
+        return {'skipped': True, 'reason': 'sem mudanças desde o último backup'}, False
+    return {key: manifest[key] for key in ('path', 'pages', 'size', 'compressed_size', 'elapsed', 'removed')}, False
+
+
+def _job_restore(options: Dict[str, Any]) -> tuple:
+    from backup import restore_backup
+    return restore_backup(options['file']), False
+
+
+def _job_archive(options: Dict[str, Any]) -> tuple:
+    from archive import archive_transactions, apply_retention
+    if options.get('before'):
+        result = archive_transactions(options['before'], vacuum=options.get('vacuum', False))
+    else:
+        result = apply_retention(options.get('months'), vacuum=options.get('vacuum', False))
+    return result, False
+
+
+JOBS = {
+    'rebuild': _job_rebuild,
+    'backfill-reconciliations': _job_backfill_reconciliations,
+    'forecast': _job_forecast,
+    'kpi-history': _job_kpi_history,
+    'export': _job_export,
+    'check-integrity': _job_check_integrity,
+    'backup': _job_backup,
+    'restore': _job_restore,
+    'archive': _job_archive,
+}
+
+
+def _tenant_path(options: Dict[str, Any], path: str) -> str:
+    """Com vários tenants, separa as saídas por banco (ex: extratos/cliente_a/...)."""
+    if len(options.get('tenants', [])) <= 1:
+        return path
+    tenant = os.path.splitext(os.path.basename(options['db_path']))[0]
+    root, ext = os.path.splitext(path)
+    return os.path.join(path, tenant) if not ext else f"{root}_{tenant}{ext}"
+
+
+def run_job(job: str, db_path: Optional[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Executa um job em um banco (tenant). Usado diretamente e nos processos do pool.
+
+    Returns:
+        Dicionário com 'tenant', 'job', 'status' ('ok', 'issues' ou 'failed'),
+        'elapsed', 'result' e, em caso de falha, 'error'.
+    """
+    if db_path:
+        db.DATABASE_NAME = db_path
+    depgraph.invalidate_all()  # caches de outro tenant não valem aqui
+    options = dict(options, db_path=db.DATABASE_NAME)
+    started = time.perf_counter()
+    outcome = {'tenant': db.DATABASE_NAME, 'job': job}
+    try:
+        db.initialize_db()
+        result, has_issues = JOBS[job](options)
+        outcome.update(status='issues' if has_issues else 'ok', result=result)
+    except Exception as e:  # o job falha, mas os demais tenants continuam
+        outcome.update(status='failed', error=f"{type(e).__name__}: {e}")
+    outcome['elapsed'] = time.perf_counter() - started
+    return outcome
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="finance-os", description="Jobs em lote do Finance-OS (sem Streamlit).")
+    parser.add_argument("--db", action="append", dest="tenants", default=[],
+                        help="Banco SQLite (tenant). Pode ser repetido. Padrão: FINANCEOS_DB_PATH.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Paralelismo (processos por tenant / threads por conta).")
+    parser.add_argument("--account", type=int, action="append", help="Restringe a conta(s) (jobs por conta).")
+    parser.add_argument("--json", action="store_true", help="Imprime o resultado em JSON.")
+    parser.add_argument("--quiet", action="store_true", help="Sem mensagens de progresso.")
+    sub = parser.add_subparsers(dest="job", required=True)
+
+    sub.add_parser("rebuild", help="Recria as tabelas derivadas (saldos, cubo, gasto semanal) e confere.")
+    sub.add_parser("backfill-reconciliations", help="Recalcula saldo computado/delta das reconciliações.")
+
+    forecast = sub.add_parser("forecast", help="Previsão de fluxo de caixa.")
+    forecast.add_argument("--days", type=int, default=30)
+    forecast.add_argument("--as-of", dest="as_of", help="Data de referência (YYYY-MM-DD).")
+
+    history = sub.add_parser("kpi-history", help="Histórico diário de KPIs em lote.")
+    history.add_argument("--start", required=True)
+    history.add_argument("--end", required=True)
+    history.add_argument("--days", type=int, default=30, help="Horizonte da previsão.")
+    history.add_argument("--output", help="Arquivo CSV de saída.")
+
+    export = sub.add_parser("export", help="Extratos mensais por conta (HTML/CSV).")
+    export.add_argument("--start-month", required=True)
+    export.add_argument("--end-month", required=True)
+    export.add_argument("--output-dir", required=True)
+    export.add_argument("--format", action="append", choices=("html", "csv"),
+                        help="Formato(s). Padrão: html e csv.")
+
+    check = sub.add_parser("check-integrity", help="Verificação de integridade do ledger.")
+    check.add_argument("--full", action="store_true", help="Ignora o checkpoint e verifica tudo.")
+
+    backup = sub.add_parser("backup", help="Backup online comprimido (pulado se nada mudou).")
+    backup.add_argument("--output-dir", help="Pasta dos backups. Padrão: FINANCEOS_BACKUP_DIR.")
+    backup.add_argument("--keep", type=int, default=7, help="Quantos backups manter.")
+    backup.add_argument("--force", action="store_true", help="Faz o backup mesmo sem mudanças.")
+
+    restore = sub.add_parser("restore", help="Restaura um backup verificado sobre o banco.")
+    restore.add_argument("--file", required=True, help="Arquivo .db.gz gerado pelo backup.")
+
+    archive = sub.add_parser("archive", help="Move lançamentos antigos para o banco de arquivo.")
+    archive.add_argument("--months", type=int, help="Meses mantidos na tabela quente. Padrão: configuração.")
+    archive.add_argument("--before", help="Corte explícito (YYYY-MM-DD) no lugar da retenção.")
+    archive.add_argument("--vacuum", action="store_true", help="Compacta o banco principal depois.")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Ponto de entrada da linha de comando. Retorna o código de saída."""
+    args = build_parser().parse_args(argv)
+    options = vars(args)
+    options['format'] = tuple(options.get('format') or ('html', 'csv'))
+    tenants = args.tenants or [None]
+
+    outcomes = []
+    if len(tenants) == 1:
+        outcomes.append(run_job(args.job, tenants[0], options))
+    else:
+        with ProcessPoolExecutor(max_workers=min(args.workers, len(tenants))) as pool:
+            # Dentro de cada tenant, um processo: evita pools aninhados
+            tenant_options = dict(options, workers=1)
+            futures = [pool.submit(run_job, args.job, tenant, tenant_options) for tenant in tenants]
+            for future in as_completed(futures):
+                outcomes.append(future.result())
+                done = outcomes[-1]
+                _progress(options, f"[{len(outcomes)}/{len(tenants)}] {done['job']} em {done['tenant']}: "
+                                   f"{done['status']} ({done['elapsed']:.2f} s)")
+
+    for outcome in outcomes:
+        if len(tenants) == 1:
+            _progress(options, f"{outcome['job']} em {outcome['tenant']}: {outcome['status']} ({outcome['elapsed']:.2f} s)")
+        if args.json:
+            print(json.dumps(outcome, ensure_ascii=False, default=str))
+            continue
+        if len(tenants) > 1:
+            print(f"== {outcome['tenant']} ==")  # resultados de tenants diferentes não se misturam
+        if outcome['status'] == 'failed':
+            print(f"ERRO: {outcome['error']}")
+        else:
+            print(json.dumps(outcome['result'], ensure_ascii=False, indent=2, default=str))
+
+    statuses = {outcome['status'] for outcome in outcomes}
+    if 'failed' in statuses:
+        return EXIT_FAILURE
+    if 'issues' in statuses:
+        return EXIT_ISSUES
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
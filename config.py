@@ -0,0 +1,231 @@
+import threading
+import time
+from typing import List, Dict, Any, Optional, Sequence
+import depgraph
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from db import execute_read_query, transaction
+    from alerts import parse_thresholds
+except ImportError:
+    import db
+    import alerts
+    execute_read_query = db.execute_read_query
+    transaction = db.transaction
+    parse_thresholds = alerts.parse_thresholds
+
+# Registro tipado de configurações e papéis de conta, com cache em processo.
+#
+# Leituras ficam no grafo de dependências (depgraph) até uma escrita feita por
+# este módulo (write-through: a escrita invalida o nó na hora, para todas as
+# sessões do processo). Escritas de OUTROS processos (ex: cli.py) incrementam
+# settings.config_version na mesma transação; cada processo confere essa versão
+# no máximo a cada REVALIDATE_SECONDS e descarta o cache se ela mudou.
+
+REVALIDATE_SECONDS = 1.0
+ROLES = ('operacional', 'cofre')
+
+_lock = threading.Lock()
+_version_state = {'version': None, 'checked_at': 0.0}
+
+
+def _bump_version(cursor) -> None:
+    cursor.execute("UPDATE settings SET value = CAST(value AS INTEGER) + 1 WHERE key = 'config_version'")
+
+
+def _revalidate() -> None:
+    """Descarta o cache se outro processo alterou configurações/contas (checagem limitada no tempo)."""
+    now = time.monotonic()
+    with _lock:
+        if now - _version_state['checked_at'] < REVALIDATE_SECONDS:
+            return
+        _version_state['checked_at'] = now
+    result = execute_read_query("SELECT value FROM settings WHERE key = 'config_version'")
+    version = result[0]['value'] if result else None
+    with _lock:
+        changed = _version_state['version'] is not None and version != _version_state['version']
+        _version_state['version'] = version
+    if changed:
+        depgraph.invalidate('settings')
+        depgraph.invalidate('accounts')
+
+
+def _setting(key: str) -> Optional[str]:
+    """Valor bruto de uma chave de settings (em cache até uma escrita nessa chave)."""
+    _revalidate()
+
+    def compute():
+        result = execute_read_query("SELECT value FROM settings WHERE key = ?", (key,))
+        return result[0]['value'] if result else None
+    return depgraph.cached(('config', key), [('settings', key)], compute)
+
+
+def _set_setting(key: str, value: str) -> None:
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO settings (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+        _bump_version(cursor)
+    depgraph.invalidate('settings', key)
+
+
+def get_weekly_cap_amount() -> float:
+    """Retorna o valor do teto semanal configurado (0.0 se não configurado)."""
+    value = _setting('weekly_cap_amount')
+    return float(value) if value else 0.0
+
+
+def set_weekly_cap_amount(amount: float) -> bool:
+    """
+    Define o valor do teto semanal.
+
+    Raises:
+        ValueError: Se o valor for negativo.
+    """
+    if amount < 0:
+        raise ValueError("O teto semanal não pode ser negativo.")
+    _set_setting('weekly_cap_amount', str(float(amount)))
+    return True
+
+
+def get_weekly_cap_thresholds() -> List[float]:
+    """Limiares de alerta do teto semanal, em % (ex: [80.0, 100.0])."""
+    return parse_thresholds(_setting('weekly_cap_thresholds'))
+
+
+def set_weekly_cap_thresholds(thresholds: Sequence[float]) -> bool:
+    """
+    Define os limiares de alerta do teto semanal (em %).
+
+    Raises:
+        ValueError: Se a lista estiver vazia ou tiver valores não positivos.
+    """
+    if not thresholds or any(threshold <= 0 for threshold in thresholds):
+        raise ValueError("Informe ao menos um limiar positivo (em % do teto).")
+    _set_setting('weekly_cap_thresholds', ",".join(f"{t:g}" for t in sorted(set(thresholds))))
+    return True
+
+
+def get_retention_months() -> int:
+    """Meses completos mantidos na tabela quente antes do arquivamento (ver archive.py)."""
+    value = _setting('archive_retention_months')
+    return int(value) if value else 24
+
+
+def set_retention_months(months: int) -> bool:
+    """
+    Define a janela de retenção da tabela quente, em meses.
+
+    Raises:
+        ValueError: Se o valor for menor que 1.
+    """
+    if months < 1:
+        raise ValueError("A retenção deve ser de pelo menos 1 mês.")
+    _set_setting('archive_retention_months', str(int(months)))
+    return True
+
+
+def get_archive_cutoff() -> Optional[str]:
+    """Data de corte do arquivo (YYYY-MM-DD), ou None se nada foi arquivado. Gravada por archive.py."""
+    return _setting('archive_cutoff') or None
+
+
+def get_operational_account_id() -> Optional[int]:
+    """Retorna o ID da conta operacional ativa (None se não houver)."""
+    _revalidate()
+
+    def compute():
+        result = execute_read_query("SELECT id FROM accounts WHERE role = 'operacional' AND active = 1")
+        return result[0]['id'] if result else None
+    return depgraph.cached(('operational_account',), [('accounts',)], compute)
+
+
+def list_accounts() -> List[Dict[str, Any]]:
+    """Lista as contas (em cache até uma alteração em accounts)."""
+    _revalidate()
+    return depgraph.cached(
+        ('account_list',), [('accounts',)],
+        lambda: [dict(row) for row in execute_read_query("SELECT * FROM accounts ORDER BY name")]
+    )
+
+
+def _make_operational(cursor, account_id: int) -> None:
+    """Na transação do chamador: a conta passa a ser a única operacional."""
+    cursor.execute("UPDATE accounts SET role = 'cofre' WHERE role = 'operacional' AND id <> ?", (account_id,))
+    cursor.execute("UPDATE accounts SET role = 'operacional' WHERE id = ?", (account_id,))
+    cursor.execute(
+        "INSERT INTO settings (key, value) VALUES ('operational_account_id', ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (str(account_id),)
+    )
+
+
+def set_operational_account(account_id: int) -> bool:
+    """
+    Define a conta operacional, garantindo que apenas uma esteja ativa.
+
+    As demais contas operacionais passam a 'cofre' na MESMA transação: nenhuma
+    leitura concorrente vê zero ou duas contas operacionais.
+
+    Returns:
+        True se a conta foi definida; False se ela não existe ou está inativa.
+    """
+    with transaction() as conn:
+        cursor = conn.cursor()  # transaction() já detém a trava de escrita (BEGIN IMMEDIATE)
+        account = cursor.execute("SELECT active FROM accounts WHERE id = ?", (account_id,)).fetchone()
+        if account is None or not account['active']:
+            return False
+        _make_operational(cursor, account_id)
+        _bump_version(cursor)
+    depgraph.invalidate('accounts')
+    return True
+
+
+def create_account(name: str, account_type: str, role: str, active: bool = True) -> int:
+    """
+    Cria uma conta. Se o papel for 'operacional', ela substitui a operacional atual
+    na mesma transação.
+
+    Args:
+        name: Nome da conta.
+        account_type: 'PF' ou 'PJ'.
+        role: 'operacional' ou 'cofre'.
+        active: Se a conta está ativa.
+
+    Returns:
+        O ID da conta criada.
+    """
+    if role not in ROLES:
+        raise ValueError(f"Papel inválido: {role}. Use {', '.join(ROLES)}.")
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+            (name, account_type, 'cofre' if role == 'operacional' else role, 1 if active else 0)
+        )
+        account_id = cursor.lastrowid
+        if role == 'operacional' and active:
+            _make_operational(cursor, account_id)
+        _bump_version(cursor)
+    depgraph.invalidate('accounts')
+    return account_id
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import db
+    db.initialize_db()
+
+    first = create_account("Conta Operacional PF", "PF", "operacional")
+    second = create_account("Conta Operacional Nova", "PF", "operacional")
+    print(f"Operacional após criar duas: {get_operational_account_id()} (esperado: {second})")
+    set_operational_account(first)
+    count = db.execute_query("SELECT COUNT(*) AS n FROM accounts WHERE role = 'operacional'")[0]['n']
+    print(f"Operacional após set_operational_account: {get_operational_account_id()} ({count} conta operacional)")
+
+    set_weekly_cap_amount(500.0)
+    before = depgraph.stats()
+    for _ in range(1000):
+        get_weekly_cap_amount()
+    after = depgraph.stats()
+    print(f"Teto: {get_weekly_cap_amount():.2f}; 1000 leituras, {after['misses'] - before['misses']} consulta(s) ao banco")
@@ -0,0 +1,172 @@
+import sqlite3
+from typing import List, Dict, Any, Optional, Sequence
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from db import get_db_connection, execute_read_query
+    from archive import LEDGER_CELLS
+except ImportError:
+    import db
+    import archive
+    get_db_connection = db.get_db_connection
+    execute_read_query = db.execute_read_query
+    LEDGER_CELLS = archive.LEDGER_CELLS
+
+# O cubo (tabela spending_cube) guarda totais por
+# (account_id, month, week_start, category, transaction_type, method) e é mantido
+# pelos triggers de transactions (aggregates.py), em qualquer caminho de escrita.
+# A semana entra na chave para permitir o drill-down ano -> mês -> semana; uma
+# semana que cruza a virada do mês aparece dividida entre os dois meses.
+
+_CUBE_KEY_COLUMNS = "account_id, month, week_start, category, transaction_type, method"
+
+# Níveis de tempo do roll-up e as dimensões disponíveis para agrupamento.
+_LEVELS = {
+    'year': "substr(c.month, 1, 4)",
+    'month': "c.month",
+    'week': "c.week_start",
+}
+_GROUP_COLUMNS = {
+    'account_id': "c.account_id",
+    'account_type': "a.type",  # PF / PJ
+    'category': "c.category",
+    'transaction_type': "c.transaction_type",
+    'method': "c.method",
+}
+
+
+def rebuild_cube(conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Recria o cubo inteiro a partir da tabela transactions e do resumo dos
+    lançamentos arquivados (um único GROUP BY).
+
+    Args:
+        conn: Conexão a usar (opcional). Se None, abre e fecha uma conexão própria.
+
+    Returns:
+        Número de células geradas.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM spending_cube")
+        cursor.execute(f"""
+            INSERT INTO spending_cube ({_CUBE_KEY_COLUMNS}, total, tx_count)
+            SELECT {_CUBE_KEY_COLUMNS}, SUM(total), SUM(tx_count)
+            FROM ({LEDGER_CELLS})
+            GROUP BY 1, 2, 3, 4, 5, 6
+        """)
+        cells = cursor.rowcount
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+    return cells
+
+
+def query_cube(
+    level: str = 'month',
+    group_by: Sequence[str] = (),
+    account_id: Optional[int] = None,
+    account_type: Optional[str] = None,
+    transaction_type: Optional[str] = None,
+    category: Optional[str] = None,
+    year: Optional[str] = None,
+    month: Optional[str] = None,
+    week_start: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Consulta agregada (roll-up / drill-down) respondida a partir do cubo.
+
+    Exemplos:
+        query_cube('year')                                    -> total por ano
+        query_cube('month', year='2026')                      -> drill-down do ano por mês
+        query_cube('week', ['category'], month='2026-01')     -> semanas do mês por categoria
+        query_cube('month', ['account_type'])                 -> PF x PJ por mês
+        query_cube('month', ['account_id'], account_type='PJ') -> drill-down PJ por conta
+
+    Args:
+        level: Nível de tempo ('year', 'month' ou 'week').
+        group_by: Dimensões adicionais ('account_id', 'account_type', 'category',
+                  'transaction_type', 'method').
+        account_id, account_type, transaction_type, category: Filtros opcionais.
+        year, month, week_start: Filtros de período (YYYY, YYYY-MM, YYYY-MM-DD).
+
+    Returns:
+        Lista de dicionários com 'period', as dimensões pedidas, 'total' e 'count'.
+    """
+    if level not in _LEVELS:
+        raise ValueError(f"Nível inválido: {level}. Use {', '.join(_LEVELS)}.")
+    unknown = [dim for dim in group_by if dim not in _GROUP_COLUMNS]
+    if unknown:
+        raise ValueError(f"Dimensões inválidas: {', '.join(unknown)}.")
+
+    select_columns = [f"{_LEVELS[level]} AS period"]
+    select_columns += [f"{_GROUP_COLUMNS[dim]} AS {dim}" for dim in group_by]
+
+    conditions = []
+    params = []
+    filters = [
+        ("c.account_id = ?", account_id),
+        ("a.type = ?", account_type),
+        ("c.transaction_type = ?", transaction_type),
+        ("c.category = ?", category),
+        ("c.month LIKE ? || '-%'", year),
+        ("c.month = ?", month),
+        ("c.week_start = ?", week_start),
+    ]
+    for condition, value in filters:
+        if value is not None:
+            conditions.append(condition)
+            params.append(value)
+
+    query = f"""
+        SELECT {', '.join(select_columns)}, SUM(c.total) AS total, SUM(c.tx_count) AS count
+        FROM spending_cube c
+        JOIN accounts a ON a.id = c.account_id
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        GROUP BY {', '.join(str(i) for i in range(1, len(select_columns) + 1))}
+        ORDER BY period, total DESC
+    """
+    return [dict(row) for row in execute_read_query(query, tuple(params))]
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import db
+    import ledger
+    db.initialize_db()
+
+    OP_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Operacional PF", "PF", "operacional", 1)
+    )
+    PJ_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta PJ", "PJ", "cofre", 1)
+    )
+    ledger.add_transaction("2026-01-20", 50.00, "expense", OP_ID, "Alimentação", "Almoço", "cartao")
+    ledger.add_transaction("2026-01-30", 30.00, "expense", OP_ID, "Alimentação", "Jantar", "cartao")
+    ledger.add_transaction("2026-02-02", 100.00, "expense", OP_ID, "Transporte", "Gasolina", "debito")
+    ledger.add_transaction("2026-02-03", 900.00, "expense", PJ_ID, "Impostos", "DAS", "boleto")
+
+    print("Despesas por mês e categoria:")
+    for row in query_cube('month', ['category'], transaction_type='expense', year='2026'):
+        print(f"  {row['period']} {row['category']}: R$ {row['total']:.2f} ({row['count']})")
+
+    print("\nDespesas por semana (Janeiro/2026):")
+    for row in query_cube('week', transaction_type='expense', month='2026-01'):
+        print(f"  {row['period']}: R$ {row['total']:.2f}")
+
+    print("\nPF x PJ por ano:")
+    for row in query_cube('year', ['account_type'], transaction_type='expense'):
+        print(f"  {row['period']} {row['account_type']}: R$ {row['total']:.2f}")
+
+    # O cubo mantido pelos triggers deve coincidir com uma reconstrução completa
+    before = query_cube('week', ['account_id', 'category', 'transaction_type', 'method'])
+    rebuild_cube()
+    after = query_cube('week', ['account_id', 'category', 'transaction_type', 'method'])
+    print(f"\nCubo mantido == reconstruído? {before == after}")
@@ -51,6 +51,13 @@ def is_date_in_week(date_str: str, week_start_str: str) -> bool:
 
     return week_start_obj <= date_obj <= week_end_obj
 
+def sql_week_start(column: str = "date") -> str:
+    """
+    Retorna a expressão SQL (SQLite) equivalente a get_week_start para uma coluna de data.
+    strftime('%w') retorna 0 para Domingo; (w + 6) % 7 dá os dias passados desde a Segunda-feira.
+    """
+    return f"date({column}, '-' || ((CAST(strftime('%w', {column}) AS INTEGER) + 6) % 7) || ' days')"
+
 # Exemplo de uso:
 if __name__ == '__main__':
     today = datetime.date.today().strftime(DATE_FORMAT)
@@ -1,18 +1,151 @@
 import os
+import random
 import sqlite3
-from typing import List, Tuple
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 # Em Streamlit Cloud, /tmp é gravável. Para outros ambientes, você pode sobrescrever via env.
 DATABASE_NAME = os.getenv("FINANCEOS_DB_PATH", "/tmp/finance_os.db")
+# Banco definido pelo ambiente (DATABASE_NAME pode ser trocado depois, ex: cli.py --db).
+ENV_DATABASE_NAME = DATABASE_NAME
+
+# Frequências aceitas em planned_fixed (mesma lista de recurrence.FREQUENCIES)
+PLANNED_FREQUENCIES_SQL = "'monthly', 'weekly', 'biweekly', 'quarterly', 'yearly', 'last_business_day', 'rrule'"
+
+
+# Concorrência entre escritores (sessões do Streamlit, importação, cli.py):
+# - cada conexão espera até BUSY_TIMEOUT segundos por uma trava (busy handler do SQLite);
+# - transações de escrita começam com BEGIN IMMEDIATE (trava de escrita antes da
+#   primeira leitura, sem o impasse de promover uma leitura a escrita);
+# - se a trava não vier no prazo, o BEGIN é repetido até WRITE_RETRIES vezes, com
+#   espera exponencial com jitter (RETRY_BASE_DELAY, 2x, 4x... até RETRY_MAX_DELAY).
+# Valores ajustáveis por variável de ambiente ou configure_busy_handling().
+BUSY_TIMEOUT = float(os.getenv("FINANCEOS_BUSY_TIMEOUT", "5.0"))  # segundos
+WRITE_RETRIES = int(os.getenv("FINANCEOS_WRITE_RETRIES", "5"))
+RETRY_BASE_DELAY = 0.05  # segundos
+RETRY_MAX_DELAY = 2.0    # segundos
+
+# Métricas de contenção (por processo): contadores e histograma da espera pela trava
+LOCK_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)  # limites superiores, em segundos
+_stats_lock = threading.Lock()
+_write_stats: Dict[str, Any] = {}
+
+
+def reset_write_stats() -> None:
+    """Zera as métricas de contenção de escrita."""
+    with _stats_lock:
+        _write_stats.clear()
+        _write_stats.update(
+            transactions=0, contended=0, retries=0, failures=0, lock_wait_total=0.0, lock_wait_max=0.0,
+            lock_wait_histogram=[0] * (len(LOCK_WAIT_BUCKETS) + 1),
+        )
+
+
+reset_write_stats()
+
+
+def write_stats() -> Dict[str, Any]:
+    """
+    Métricas de contenção de escrita desde o último reset_write_stats().
+
+    Returns:
+        Dicionário com 'transactions' (escritas iniciadas), 'contended' (que esperaram
+        pela trava mais de 1 ms), 'retries', 'failures' (desistências após WRITE_RETRIES),
+        'lock_wait_total', 'lock_wait_max' (segundos) e 'lock_wait_histogram'
+        (lista de (limite superior em segundos ou None, contagem)).
+    """
+    with _stats_lock:
+        stats = dict(_write_stats)
+        stats['lock_wait_histogram'] = list(zip(LOCK_WAIT_BUCKETS + (None,), _write_stats['lock_wait_histogram']))
+    return stats
+
+
+def configure_busy_handling(
+    busy_timeout: Optional[float] = None,
+    retries: Optional[int] = None,
+    base_delay: Optional[float] = None,
+    max_delay: Optional[float] = None
+) -> None:
+    """Ajusta a espera por travas e a política de novas tentativas (None mantém o valor atual)."""
+    global BUSY_TIMEOUT, WRITE_RETRIES, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+    if busy_timeout is not None:
+        BUSY_TIMEOUT = busy_timeout
+    if retries is not None:
+        WRITE_RETRIES = retries
+    if base_delay is not None:
+        RETRY_BASE_DELAY = base_delay
+    if max_delay is not None:
+        RETRY_MAX_DELAY = max_delay
+
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def begin_immediate(conn: sqlite3.Connection) -> None:
+    """
+    Abre uma transação de escrita (BEGIN IMMEDIATE) em 'conn', esperando pela trava
+    com novas tentativas e registrando as métricas de contenção.
+
+    Raises:
+        sqlite3.OperationalError: Se a trava não for obtida após WRITE_RETRIES tentativas.
+    """
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            break
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt >= WRITE_RETRIES:
+                with _stats_lock:
+                    _write_stats['failures'] += 1
+                raise
+            attempt += 1
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+            time.sleep(random.uniform(0, delay))  # jitter "cheio": evita escritores em sincronia
+    waited = time.perf_counter() - started
+    with _stats_lock:
+        _write_stats['transactions'] += 1
+        _write_stats['retries'] += attempt
+        _write_stats['contended'] += waited > 0.001
+        _write_stats['lock_wait_total'] += waited
+        _write_stats['lock_wait_max'] = max(_write_stats['lock_wait_max'], waited)
+        _write_stats['lock_wait_histogram'][bisect_left(LOCK_WAIT_BUCKETS, waited)] += 1
+
+
+# Fábrica opcional de conexões somente-leitura (ex: snapshot em memória, ver snapshot.py).
+# Quando None, as leituras usam o banco em disco.
+_read_connection_factory: Optional[Callable[[], sqlite3.Connection]] = None
 
 
 def get_db_connection() -> sqlite3.Connection:
     """Retorna uma conexão com o banco de dados SQLite."""
-    conn = sqlite3.connect(DATABASE_NAME)
+    conn = sqlite3.connect(DATABASE_NAME, timeout=BUSY_TIMEOUT)
     conn.row_factory = sqlite3.Row  # Permite acessar colunas por nome
     return conn
 
 
+def set_read_connection_factory(factory: Optional[Callable[[], sqlite3.Connection]]) -> None:
+    """Define (ou remove, com None) a fábrica de conexões usada pelas leituras do CORE."""
+    global _read_connection_factory
+    _read_connection_factory = factory
+
+
+def get_read_connection() -> sqlite3.Connection:
+    """
+    Retorna uma conexão para consultas somente-leitura (dashboard, relatórios, KPIs).
+    Usa o snapshot em memória quando habilitado; caso contrário, o banco em disco.
+    """
+    if _read_connection_factory is not None:
+        return _read_connection_factory()
+    return get_db_connection()
+
+
 def initialize_db() -> None:
     """Cria as tabelas do schema se elas não existirem."""
     conn = get_db_connection()
@@ -41,24 +174,104 @@ def initialize_db() -> None:
             category TEXT,
             description TEXT,
             method TEXT, -- PIX | boleto | debito | cartao | outro
+            fingerprint TEXT, -- hash de importação (NULL para lançamentos manuais)
+            transfer_group_id TEXT, -- liga as duas pernas de uma transferência (NULL nos demais)
             FOREIGN KEY (account_id) REFERENCES accounts (id)
         );
     """)
 
-    # Tabela de Planejamento Fixo
+    # Bancos criados antes da importação idempotente não têm a coluna fingerprint.
+    _ensure_column(cursor, "transactions", "fingerprint", "TEXT")
+
+    # Índice único: reimportar o mesmo extrato não duplica lançamentos.
+    # Lançamentos manuais ficam com fingerprint NULL (o SQLite permite vários NULLs).
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_fingerprint
+        ON transactions (fingerprint);
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_transactions_account_date
+        ON transactions (account_id, date);
+    """)
+
+    # Transferências ligadas por grupo. Bancos antigos: as pernas gravadas por
+    # ledger.add_transfer são consecutivas (expense e, em seguida, income).
+    if _ensure_column(cursor, "transactions", "transfer_group_id", "TEXT"):
+        cursor.execute("""
+            UPDATE transactions SET transfer_group_id = 'legacy-' || (
+                CASE transaction_type WHEN 'expense' THEN id ELSE id - 1 END
+            )
+            WHERE category = 'Transferência' AND id IN (
+                SELECT e.id FROM transactions e JOIN transactions i ON i.id = e.id + 1
+                WHERE e.transaction_type = 'expense' AND i.transaction_type = 'income'
+                  AND e.category = 'Transferência' AND i.category = 'Transferência'
+                  AND e.date = i.date AND e.amount = i.amount AND e.description IS i.description
+                UNION ALL
+                SELECT e.id + 1 FROM transactions e JOIN transactions i ON i.id = e.id + 1
+                WHERE e.transaction_type = 'expense' AND i.transaction_type = 'income'
+                  AND e.category = 'Transferência' AND i.category = 'Transferência'
+                  AND e.date = i.date AND e.amount = i.amount AND e.description IS i.description
+            )
+        """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_transactions_transfer_group
+        ON transactions (transfer_group_id);
+    """)
+
+    # Trilha de auditoria das correções (ledger.update_transaction / void_transaction)
     cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transaction_audit (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id INTEGER NOT NULL,
+            action TEXT NOT NULL CHECK(action IN ('update', 'void')),
+            changed_at TEXT NOT NULL DEFAULT (datetime('now')),
+            before_json TEXT NOT NULL, -- linha antes da alteração
+            after_json TEXT,           -- linha depois (NULL quando anulada)
+            reason TEXT
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transaction_audit_tx ON transaction_audit (transaction_id);")
+
+    # Progresso da verificação de integridade incremental (ver integrity.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS integrity_checkpoints (
+            name TEXT PRIMARY KEY,
+            last_transaction_id INTEGER NOT NULL DEFAULT 0,
+            last_audit_id INTEGER NOT NULL DEFAULT 0,
+            state_json TEXT NOT NULL, -- somas por conta e transferências pendentes
+            updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+    """)
+
+    # Tabela de Planejamento Fixo (regras de recorrência: ver recurrence.py)
+    # Bancos antigos aceitavam apenas 'monthly': o SQLite não altera CHECK, então a tabela é recriada.
+    planned_sql = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'planned_fixed'"
+    ).fetchone()
+    if planned_sql and "'weekly'" not in planned_sql[0]:
+        cursor.execute("ALTER TABLE planned_fixed RENAME TO planned_fixed_old")
+    cursor.execute(f"""
         CREATE TABLE IF NOT EXISTS planned_fixed (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
             amount REAL NOT NULL,
-            frequency TEXT NOT NULL CHECK(frequency IN ('monthly')),
-            due_day INTEGER NOT NULL, -- 1-31
+            frequency TEXT NOT NULL CHECK(frequency IN ({PLANNED_FREQUENCIES_SQL})),
+            due_day INTEGER, -- 1-31 (mensal/trimestral/anual) ou 1-7 (semanal sem start_date)
             account_id INTEGER NOT NULL,
             category TEXT,
             active BOOLEAN NOT NULL DEFAULT 1,
+            start_date TEXT, -- YYYY-MM-DD: início/âncora da recorrência (opcional)
+            end_date TEXT,   -- YYYY-MM-DD: fim da recorrência (opcional)
+            rrule TEXT,      -- regra RFC 5545 quando frequency = 'rrule'
             FOREIGN KEY (account_id) REFERENCES accounts (id)
         );
     """)
+    if planned_sql and "'weekly'" not in planned_sql[0]:
+        cursor.execute("""
+            INSERT INTO planned_fixed (id, name, amount, frequency, due_day, account_id, category, active)
+            SELECT id, name, amount, frequency, due_day, account_id, category, active FROM planned_fixed_old
+        """)
+        cursor.execute("DROP TABLE planned_fixed_old")
 
     # Tabela de Reconciliações (HITL)
     cursor.execute("""
@@ -84,15 +297,124 @@ def initialize_db() -> None:
         );
     """)
 
+    # Saldo por conta (mantido por triggers em transactions; ver aggregates.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS account_balances (
+            account_id INTEGER PRIMARY KEY,
+            balance REAL NOT NULL DEFAULT 0,
+            tx_count INTEGER NOT NULL DEFAULT 0
+        );
+    """)
+
+    # Cubo de gastos pré-agregado (mantido por triggers; ver cube.py e aggregates.py)
+    # category/method usam '' no lugar de NULL para que a chave primária funcione no UPSERT.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS spending_cube (
+            account_id INTEGER NOT NULL,
+            month TEXT NOT NULL,      -- YYYY-MM
+            week_start TEXT NOT NULL, -- YYYY-MM-DD (Segunda-feira)
+            category TEXT NOT NULL DEFAULT '',
+            transaction_type TEXT NOT NULL,
+            method TEXT NOT NULL DEFAULT '',
+            total REAL NOT NULL DEFAULT 0,
+            tx_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_id, month, week_start, category, transaction_type, method)
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_spending_cube_month ON spending_cube (month);")
+
+    # Resumo dos lançamentos movidos para o banco de arquivo (mesma chave do cubo; ver archive.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS archived_summary (
+            account_id INTEGER NOT NULL,
+            month TEXT NOT NULL,      -- YYYY-MM
+            week_start TEXT NOT NULL, -- YYYY-MM-DD (Segunda-feira)
+            category TEXT NOT NULL DEFAULT '',
+            transaction_type TEXT NOT NULL,
+            method TEXT NOT NULL DEFAULT '',
+            total REAL NOT NULL DEFAULT 0,
+            tx_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (account_id, month, week_start, category, transaction_type, method)
+        );
+    """)
+
+    # Gasto semanal corrente por conta (gasto mantido por triggers; limiares em alerts.py)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS weekly_spend_state (
+            account_id INTEGER NOT NULL,
+            week_start TEXT NOT NULL, -- YYYY-MM-DD (Segunda-feira)
+            spent REAL NOT NULL DEFAULT 0,
+            last_threshold REAL NOT NULL DEFAULT 0, -- maior limiar (%) já alertado na semana
+            PRIMARY KEY (account_id, week_start)
+        );
+    """)
+
+    # Eventos de alerta do teto semanal
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS alert_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL DEFAULT (datetime('now')),
+            account_id INTEGER NOT NULL,
+            week_start TEXT NOT NULL,
+            threshold REAL NOT NULL, -- % do teto cruzado (ex: 80, 100)
+            spent REAL NOT NULL,
+            cap REAL NOT NULL,
+            FOREIGN KEY (account_id) REFERENCES accounts (id)
+        );
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_alert_events_week ON alert_events (account_id, week_start);")
+
     # Defaults (não sobrescreve se já existir)
     cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('weekly_cap_amount', '450');")
     cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('operational_account_id', '');")
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('weekly_cap_thresholds', '80,100');")
+    # Versão das configurações/contas (config.py revalida o cache em processo por ela)
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('config_version', '0');")
+    # Retenção: corte do arquivo ('' = nada arquivado) e janela em meses (ver archive.py)
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('archive_cutoff', '');")
+    cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('archive_retention_months', '24');")
 
+    # Triggers que mantêm os agregados (import tardio: aggregates importa db)
+    from aggregates import install_triggers, rebuild_empty_aggregates
+    install_triggers(cursor)
     
     conn.commit()
+
+    # Bancos anteriores às tabelas agregadas: popula a partir do ledger uma única vez.
+    rebuild_empty_aggregates(conn)
     conn.close()
 
 
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """
+    Abre uma conexão para um bloco de escrita atômico (BEGIN IMMEDIATE, ver begin_immediate).
+    Faz commit ao final do bloco ou rollback se qualquer exceção ocorrer.
+    """
+    conn = get_db_connection()
+    try:
+        begin_immediate(conn)
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _ensure_column(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> bool:
+    """
+    Adiciona uma coluna a uma tabela existente, caso ela ainda não exista (migração leve).
+    Retorna True se a coluna foi criada agora.
+    """
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+    return False
+
+
 def execute_query(query: str, params: Tuple = ()) -> List[sqlite3.Row]:
     """Executa SELECT e retorna resultados."""
     conn = get_db_connection()
@@ -103,15 +425,22 @@ def execute_query(query: str, params: Tuple = ()) -> List[sqlite3.Row]:
     return results
 
 
-def execute_insert(query: str, params: Tuple = ()) -> int:
-    """Executa INSERT/UPDATE/DELETE e retorna o lastrowid (quando aplicável)."""
-    conn = get_db_connection()
+def execute_read_query(query: str, params: Tuple = ()) -> List[sqlite3.Row]:
+    """Executa SELECT somente-leitura (roteado para o snapshot, quando habilitado)."""
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute(query, params)
-    conn.commit()
-    last_row_id = cursor.lastrowid
+    results = cursor.fetchall()
     conn.close()
-    return last_row_id
+    return results
+
+
+def execute_insert(query: str, params: Tuple = ()) -> int:
+    """Executa INSERT/UPDATE/DELETE e retorna o lastrowid (quando aplicável)."""
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return cursor.lastrowid
 
 
 def execute_many_atomic(queries_params: List[Tuple[str, Tuple]]) -> None:
@@ -119,14 +448,7 @@ def execute_many_atomic(queries_params: List[Tuple[str, Tuple]]) -> None:
     Executa múltiplas queries em uma única transação (atômica).
     Se qualquer query falhar, todas são revertidas (rollback).
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
+    with transaction() as conn:
+        cursor = conn.cursor()
         for query, params in queries_params:
             cursor.execute(query, params)
-        conn.commit()
-    except sqlite3.Error:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
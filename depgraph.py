@@ -0,0 +1,170 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Grafo de dependências para resultados intermediários (ex: forecast).
+#
+# Cada nó em cache declara de quais entradas depende, como chaves hierárquicas:
+#   ('transactions', account_id, week_start)  -> lançamentos de uma conta em uma semana
+#   ('transactions', account_id)              -> todos os lançamentos de uma conta
+#   ('planned_fixed',), ('settings',), ('accounts',)
+#
+# Invalidar uma chave descarta os nós cuja dependência é prefixo dela ou é
+# prefixada por ela. Assim, um novo lançamento em ('transactions', 1, '2026-01-19')
+# invalida o saldo da conta 1 e o total daquela semana, mas preserva as demais
+# semanas, os fixos planejados e as outras contas.
+#
+# O cache é por processo. Escritas feitas pelo ledger (e demais módulos do CORE)
+# invalidam os nós afetados na hora. Escritas por SQL direto ou por outro processo
+# (ex: cli.py) são detectadas pelo PRAGMA data_version do banco, conferido no máximo
+# a cada REVALIDATE_SECONDS (como config.py faz com config_version): se mudou, o
+# cache inteiro é descartado. O PRAGMA também muda com os commits deste processo
+# (feitos por outras conexões); por isso, quem grava e já invalidou as chaves
+# afetadas chama note_local_commit(), que dá a mudança por vista.
+#
+# O cache guarda no máximo MAX_NODES nós; acima disso, sai o usado há mais tempo (LRU).
+
+DependencyKey = Tuple[Any, ...]
+
+REVALIDATE_SECONDS = 1.0
+MAX_NODES = 4096
+
+_lock = threading.RLock()
+_values: "OrderedDict[DependencyKey, Any]" = OrderedDict()
+_node_deps: Dict[DependencyKey, List[DependencyKey]] = {}
+_version = 0
+_stats = {'hits': 0, 'misses': 0, 'invalidated': 0, 'evicted': 0}
+
+_probe_lock = threading.Lock()
+_probe: Dict[str, Any] = {'conn': None, 'path': None, 'data_version': None, 'checked_at': 0.0}
+
+
+def _related(dep: DependencyKey, key: DependencyKey) -> bool:
+    """Verifica se uma dependência e uma chave invalidada se sobrepõem (uma é prefixo da outra)."""
+    size = min(len(dep), len(key))
+    return dep[:size] == key[:size]
+
+
+def _data_version() -> Optional[int]:
+    """PRAGMA data_version do banco atual, lido por uma conexão dedicada (chamar com _probe_lock)."""
+    import db
+    try:
+        if _probe['path'] != db.DATABASE_NAME:
+            if _probe['conn'] is not None:
+                _probe['conn'].close()
+            _probe.update(conn=None, path=None, data_version=None)
+            _probe['conn'] = sqlite3.connect(db.DATABASE_NAME, timeout=db.BUSY_TIMEOUT, check_same_thread=False)
+            _probe['path'] = db.DATABASE_NAME
+        return _probe['conn'].execute("PRAGMA data_version").fetchone()[0]
+    except sqlite3.Error:
+        return None  # banco indisponível: confere de novo no próximo intervalo
+
+
+def _revalidate() -> None:
+    """Descarta o cache se o banco mudou por outra conexão (checagem limitada no tempo)."""
+    now = time.monotonic()
+    with _probe_lock:
+        if now - _probe['checked_at'] < REVALIDATE_SECONDS:
+            return
+        _probe['checked_at'] = now
+        previous = (_probe['path'], _probe['data_version'])
+        version = _data_version()
+        if version is None:
+            return
+        _probe['data_version'] = version
+    if previous[0] is not None and (previous[0] != _probe['path'] or previous[1] not in (None, version)):
+        invalidate_all()  # outro processo gravou, ou o banco atual passou a ser outro
+
+
+def note_local_commit() -> None:
+    """
+    Registra que o banco mudou por um commit DESTE processo, já coberto por
+    invalidações pontuais (ex: ledger._after_commit): só escritas de outras
+    conexões/processos descartam o cache inteiro.
+    """
+    import db
+    with _probe_lock:
+        if _probe['conn'] is None or _probe['path'] != db.DATABASE_NAME:
+            return
+        version = _data_version()
+        if version is not None:
+            _probe['data_version'] = version
+
+
+def cached(node: DependencyKey, deps: List[DependencyKey], compute: Callable[[], Any]) -> Any:
+    """
+    Retorna o valor de um nó do grafo, calculando-o apenas se não estiver em cache
+    (ou se o banco mudou por fora desde que foi guardado).
+
+    Args:
+        node: Chave do nó (ex: ('weekly_variable', 1, '2026-01-19')).
+        deps: Entradas das quais o nó depende.
+        compute: Função sem argumentos que calcula o valor.
+
+    Returns:
+        O valor do nó.
+    """
+    _revalidate()
+    with _lock:
+        if node in _values:
+            _stats['hits'] += 1
+            _values.move_to_end(node)
+            return _values[node]
+        _stats['misses'] += 1
+        version = _version
+
+    value = compute()
+
+    with _lock:
+        # Se houve invalidação durante o cálculo, o valor pode estar obsoleto: não guarda.
+        if version == _version:
+            _values[node] = value
+            _values.move_to_end(node)
+            _node_deps[node] = list(deps)
+            while len(_values) > MAX_NODES:
+                evicted, _ = _values.popitem(last=False)
+                _node_deps.pop(evicted, None)
+                _stats['evicted'] += 1
+    return value
+
+
+def invalidate(*key: Any) -> int:
+    """
+    Invalida os nós que dependem da chave informada.
+
+    Args:
+        key: Chave hierárquica (ex: invalidate('transactions', 1, '2026-01-19')).
+
+    Returns:
+        Número de nós descartados.
+    """
+    global _version
+    with _lock:
+        _version += 1
+        stale = [
+            node for node, deps in _node_deps.items()
+            if any(_related(dep, key) for dep in deps)
+        ]
+        for node in stale:
+            _values.pop(node, None)
+            _node_deps.pop(node, None)
+        _stats['invalidated'] += len(stale)
+        return len(stale)
+
+
+def invalidate_all() -> None:
+    """Descarta todo o cache (ex: após escrita por SQL direto ou por outro processo)."""
+    global _version
+    with _lock:
+        _version += 1
+        _stats['invalidated'] += len(_values)
+        _values.clear()
+        _node_deps.clear()
+
+
+def stats() -> Dict[str, int]:
+    """Retorna contadores de acertos, recálculos, invalidações e despejos (LRU), além do número de nós em cache."""
+    with _lock:
+        return dict(_stats, nodes=len(_values))
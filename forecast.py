@@ -1,91 +1,141 @@
-from typing import Dict
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
+import depgraph
 # Tenta importar para testes diretos e para uso como módulo
 try:
-    from db import execute_query
-    from ledger import get_total_cash
+    from db import execute_read_query
+    from ledger import get_account_balance
     from planned import get_fixed_for_period, generate_fixed_events
     from kpis import get_weekly_variable_expenses
     from dates import get_week_start, get_week_end
+    from rolling import average_weekly_spend
+    from config import get_operational_account_id
 except ImportError:
     import db
     import ledger
     import planned
     import kpis
     import dates
-    execute_query = db.execute_query
-    get_total_cash = kpis.get_total_cash
+    import rolling
+    import config
+    execute_read_query = db.execute_read_query
+    get_account_balance = ledger.get_account_balance
     get_fixed_for_period = planned.get_fixed_for_period
     generate_fixed_events = planned.generate_fixed_events
     get_weekly_variable_expenses = kpis.get_weekly_variable_expenses
     get_week_start = dates.get_week_start
     get_week_end = dates.get_week_end
+    average_weekly_spend = rolling.average_weekly_spend
+    get_operational_account_id = config.get_operational_account_id
 
 DATE_FORMAT = "%Y-%m-%d"
 
-def get_average_weekly_variable_expenses(num_weeks: int = 4) -> float:
+# ============================================================================
+# NÓS DO GRAFO DE DEPENDÊNCIAS (ver depgraph.py)
+# Cada parte do forecast fica em cache e só é recalculada quando a entrada
+# da qual depende é alterada (lançamentos por conta/semana, fixos, contas).
+# ============================================================================
+
+def _active_account_ids() -> List[int]:
+    """IDs das contas ativas (em cache até uma alteração em accounts)."""
+    def compute():
+        return [row['id'] for row in execute_read_query("SELECT id FROM accounts WHERE active = 1")]
+    return depgraph.cached(('active_accounts',), [('accounts',)], compute)
+
+def _account_balance(account_id: int, as_of: Optional[str] = None) -> float:
+    """Saldo computado de uma conta até 'as_of' (em cache até um novo lançamento na conta)."""
+    return depgraph.cached(
+        ('balance', account_id, as_of),
+        [('transactions', account_id)],
+        lambda: get_account_balance(account_id, until_date=as_of)
+    )
+
+def _average_weekly_spend(account_id: int, num_weeks: int, today: str) -> float:
+    """
+    Média semanal de despesas (rolling.average_weekly_spend), em cache até um
+    lançamento da conta em uma das semanas da janela.
+    """
+    if num_weeks <= 0:
+        return 0.0
+    today_obj = datetime.strptime(today, DATE_FORMAT)
+    weeks = [
+        get_week_start((today_obj - timedelta(weeks=i)).strftime(DATE_FORMAT))
+        for i in range(num_weeks)
+    ]
+    return depgraph.cached(
+        ('avg_weekly_spend', account_id, num_weeks, weeks[0]),
+        [('transactions', account_id, week_start) for week_start in weeks],
+        lambda: average_weekly_spend(account_id, num_weeks, today)
+    )
+
+def _fixed_for_period(start_date: str, end_date: str) -> float:
+    """Total de fixos planejados no período (em cache até uma alteração em planned_fixed)."""
+    return depgraph.cached(
+        ('fixed_for_period', start_date, end_date),
+        [('planned_fixed',)],
+        lambda: get_fixed_for_period(start_date, end_date)
+    )
+
+def get_current_cash(as_of: Optional[str] = None) -> float:
+    """
+    Soma os saldos das contas ativas, como kpis.get_total_cash, mas reaproveitando
+    o saldo em cache de cada conta que não recebeu lançamentos desde o último cálculo.
+    Com 'as_of', considera apenas lançamentos até essa data.
+    """
+    return sum(_account_balance(account_id, as_of) for account_id in _active_account_ids())
+
+def get_average_weekly_variable_expenses(num_weeks: int = 4, as_of: Optional[str] = None) -> float:
     """
     Calcula a média semanal de despesas variáveis da conta operacional
     nas últimas 'num_weeks' semanas.
     
     Args:
         num_weeks: Número de semanas para calcular a média.
+        as_of: Data de referência (YYYY-MM-DD); a janela termina na semana dessa data.
+               Se None, usa a data atual.
         
     Returns:
         A média semanal de despesas variáveis (valor positivo).
     """
     
     # 1. Encontrar a conta operacional
-    query = "SELECT id FROM accounts WHERE role = 'operacional' AND active = 1"
-    result = execute_query(query)
-    if not result:
+    operational_account_id = get_operational_account_id()
+    if operational_account_id is None:
         return 0.0
-    operational_account_id = result[0]['id']
-    
-    # 2. Iterar pelas últimas 'num_weeks'
-    today = datetime.now().date()
-    total_expenses = 0.0
     
-    for i in range(num_weeks):
-        # Encontrar a data de início da semana 'i' semanas atrás
-        # Começa na semana atual (i=0) e vai para trás
-        
-        # Encontra uma data dentro da semana 'i' semanas atrás
-        date_in_week = today - timedelta(weeks=i)
-        week_start = get_week_start(date_in_week.strftime(DATE_FORMAT))
-        
-        # Calcula as despesas variáveis dessa semana
-        weekly_expenses = get_weekly_variable_expenses(week_start, operational_account_id)
-        total_expenses += weekly_expenses
-        
-    # 3. Calcular a média
-    if num_weeks > 0:
-        return total_expenses / num_weeks
-    return 0.0
+    # 2. Série semanal das últimas 'num_weeks' semanas (incluindo a atual) em uma única query
+    today = as_of or datetime.now().strftime(DATE_FORMAT)
+    return _average_weekly_spend(operational_account_id, num_weeks, today)
 
-def forecast_cash_flow(days: int = 30) -> Dict[str, float]:
+def forecast_cash_flow(days: int = 30, as_of: Optional[str] = None) -> Dict[str, float]:
     """
     Calcula a previsão de fluxo de caixa para os próximos 'days' dias.
     
     Regra: Saldo Atual - Fixos Planejados - Média Semanal de Variáveis (últimas 4 semanas) * (dias / 7)
+
+    Cada parcela vem do grafo de dependências: após um novo lançamento, apenas o
+    saldo da conta e a semana afetada são recalculados.
     
     Args:
         days: Número de dias para a previsão.
+        as_of: Data de referência (YYYY-MM-DD): reproduz a previsão feita nesse dia
+               (saldo até a data, fixos a partir dela). Se None, usa a data atual.
         
     Returns:
         Dicionário com o saldo atual e o saldo previsto.
     """
     
     # 1. Saldo Atual
-    current_cash = get_total_cash()
+    current_cash = get_current_cash(as_of)
     
     # 2. Fixos Planejados
-    start_date = datetime.now().strftime(DATE_FORMAT)
-    end_date = (datetime.now() + timedelta(days=days)).strftime(DATE_FORMAT)
-    planned_fixed_expenses = get_fixed_for_period(start_date, end_date)
+    reference = datetime.strptime(as_of, DATE_FORMAT) if as_of else datetime.now()
+    start_date = reference.strftime(DATE_FORMAT)
+    end_date = (reference + timedelta(days=days)).strftime(DATE_FORMAT)
+    planned_fixed_expenses = _fixed_for_period(start_date, end_date)
     
     # 3. Média Semanal de Variáveis
-    avg_weekly_variable_expenses = get_average_weekly_variable_expenses(num_weeks=4)
+    avg_weekly_variable_expenses = get_average_weekly_variable_expenses(num_weeks=4, as_of=as_of)
     
     # 4. Projeção de Variáveis
     num_weeks_in_period = days / 7.0
@@ -155,3 +205,11 @@ if __name__ == '__main__':
     print(f"  - Fixos Planejados: R$ {forecast['planned_fixed_expenses']:.2f}")
     print(f"  - Variáveis Projetadas: R$ {forecast['projected_variable_expenses']:.2f}")
     print(f"  = Saldo Previsto: R$ {forecast['forecasted_cash']:.2f}")
+
+    # 3. Novo lançamento: só o saldo da conta e a semana afetada são recalculados
+    ledger.add_transaction(today.strftime(DATE_FORMAT), 25.00, "expense", OPERATIONAL_ACCOUNT_ID, "Alimentação", "Lanche")
+    before = depgraph.stats()
+    forecast_cash_flow(days=30)
+    after = depgraph.stats()
+    print(f"\nRecalculados após novo lançamento: {after['misses'] - before['misses']} nós "
+          f"(reaproveitados: {after['hits'] - before['hits']})")
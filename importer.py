@@ -0,0 +1,450 @@
+import csv
+import hashlib
+import re
+import unicodedata
+from collections import defaultdict
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from db import get_db_connection, begin_immediate
+    from ledger import _apply_derived, _after_commit
+    from archive import needs_archive, attach, union_source
+except ImportError:
+    import db
+    import ledger
+    import archive
+    get_db_connection = db.get_db_connection
+    begin_immediate = db.begin_immediate
+    _apply_derived = ledger._apply_derived
+    _after_commit = ledger._after_commit
+    needs_archive = archive.needs_archive
+    attach = archive.attach
+    union_source = archive.union_source
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# Janela padrão (em dias) para considerar dois lançamentos de mesmo valor como quase-duplicados.
+NEAR_DUPLICATE_WINDOW_DAYS = 2
+
+# Cabeçalhos aceitos no CSV de extrato (normalizados, sem acento e em minúsculas).
+_HEADER_ALIASES = {
+    'date': ('date', 'data', 'data lancamento', 'data movimento'),
+    'description': ('description', 'descricao', 'historico', 'lancamento', 'memo'),
+    'amount': ('amount', 'valor', 'valor (r$)', 'value'),
+    'bank_ref': ('bank_ref', 'ref', 'referencia', 'documento', 'id', 'fitid'),
+}
+
+
+def normalize_description(description: Optional[str]) -> str:
+    """
+    Normaliza a descrição de um lançamento para comparação:
+    remove acentos e pontuação, converte para minúsculas e colapsa espaços.
+    """
+    if not description:
+        return ""
+    text = unicodedata.normalize("NFKD", description)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^0-9a-z]+", " ", text.lower())
+    return " ".join(text.split())
+
+
+def _to_cents(amount: float) -> int:
+    """Converte um valor monetário para centavos (inteiro), evitando erros de ponto flutuante."""
+    return int(round(amount * 100))
+
+
+def compute_fingerprint(
+    account_id: int,
+    date: str,
+    amount: float,
+    transaction_type: str,
+    description: Optional[str] = None,
+    bank_ref: Optional[str] = None,
+    occurrence: int = 0
+) -> str:
+    """
+    Calcula o fingerprint (hash) de um lançamento importado.
+
+    O hash combina conta, data, valor (com sinal pelo tipo), descrição normalizada
+    e referência bancária. 'occurrence' diferencia linhas idênticas dentro do mesmo
+    extrato (ex: dois cafés de mesmo valor no mesmo dia), de forma que reimportar
+    o mesmo arquivo gere sempre os mesmos fingerprints.
+
+    Returns:
+        Hash hexadecimal SHA-1 do lançamento.
+    """
+    signed_cents = _to_cents(amount) * (-1 if transaction_type == 'expense' else 1)
+    key = "|".join([
+        str(account_id),
+        date,
+        str(signed_cents),
+        normalize_description(description),
+        (bank_ref or "").strip(),
+        str(occurrence),
+    ])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _parse_date(value: str) -> str:
+    """Converte datas de extrato (YYYY-MM-DD ou DD/MM/YYYY) para YYYY-MM-DD."""
+    value = value.strip()
+    for fmt in (DATE_FORMAT, "%d/%m/%Y", "%d/%m/%y"):
+        try:
+            return datetime.strptime(value, fmt).strftime(DATE_FORMAT)
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida no extrato: {value!r}")
+
+
+def _parse_amount(value: str) -> float:
+    """Converte valores de extrato ('-1.234,56', '1234.56', 'R$ 50,00') para float com sinal."""
+    text = value.strip().replace("R$", "").replace(" ", "")
+    if "," in text:
+        # Formato brasileiro: ponto como milhar e vírgula como decimal
+        text = text.replace(".", "").replace(",", ".")
+    return float(text)
+
+
+def parse_statement_csv(file_path: str, delimiter: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Lê um extrato bancário em CSV e retorna as linhas normalizadas.
+
+    O CSV deve ter cabeçalho com, no mínimo, data, descrição e valor (com sinal:
+    negativo para saídas). A coluna de referência bancária é opcional.
+
+    Args:
+        file_path: Caminho do arquivo CSV.
+        delimiter: Separador de colunas. Se None, é detectado automaticamente.
+
+    Returns:
+        Lista de linhas com 'date', 'amount' (positivo), 'transaction_type'
+        ('income' ou 'expense'), 'description' e 'bank_ref'.
+    """
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        if delimiter is None:
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t").delimiter
+            except csv.Error:
+                delimiter = ","
+        reader = csv.reader(f, delimiter=delimiter)
+        header = [normalize_description(col) for col in next(reader, [])]
+
+        columns = {}
+        for field, aliases in _HEADER_ALIASES.items():
+            for index, col in enumerate(header):
+                if col in aliases:
+                    columns[field] = index
+                    break
+        missing = {'date', 'description', 'amount'} - set(columns)
+        if missing:
+            raise ValueError(f"Colunas obrigatórias ausentes no extrato: {', '.join(sorted(missing))}")
+
+        lines = []
+        for row in reader:
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            signed_amount = _parse_amount(row[columns['amount']])
+            bank_ref = row[columns['bank_ref']].strip() if 'bank_ref' in columns else None
+            lines.append({
+                'date': _parse_date(row[columns['date']]),
+                'amount': abs(signed_amount),
+                'transaction_type': 'expense' if signed_amount < 0 else 'income',
+                'description': row[columns['description']].strip(),
+                'bank_ref': bank_ref or None,
+            })
+    return lines
+
+
+def prepare_import_rows(
+    lines: List[Dict[str, Any]],
+    account_id: int,
+    category: Optional[str] = None,
+    method: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Converte linhas de extrato em linhas prontas para o ledger, com fingerprint.
+
+    Linhas idênticas dentro do mesmo extrato recebem um número de ocorrência
+    sequencial, que entra no fingerprint.
+    """
+    occurrences = defaultdict(int)
+    rows = []
+    for line in lines:
+        base_key = (
+            line['date'],
+            _to_cents(line['amount']),
+            line['transaction_type'],
+            normalize_description(line.get('description')),
+            line.get('bank_ref') or "",
+        )
+        occurrence = occurrences[base_key]
+        occurrences[base_key] += 1
+        rows.append({
+            'date': line['date'],
+            'amount': line['amount'],
+            'transaction_type': line['transaction_type'],
+            'account_id': account_id,
+            'category': line.get('category', category),
+            'description': line.get('description'),
+            'method': line.get('method', method),
+            'fingerprint': compute_fingerprint(
+                account_id, line['date'], line['amount'], line['transaction_type'],
+                line.get('description'), line.get('bank_ref'), occurrence
+            ),
+        })
+    return rows
+
+
+def find_near_duplicates(
+    candidates: List[Dict[str, Any]],
+    existing: List[Dict[str, Any]],
+    window_days: int = NEAR_DUPLICATE_WINDOW_DAYS
+) -> List[Dict[str, Any]]:
+    """
+    Detecta quase-duplicados: mesmo tipo e mesmo valor, com datas a até 'window_days' dias.
+
+    Usa uma varredura ordenada: os dois conjuntos são agrupados por (tipo, valor em centavos)
+    e ordenados por data; para cada candidato, o início da janela só avança, de forma que o
+    custo é O((n + m) log(n + m)) mais o número de pares encontrados, sem laços aninhados
+    sobre todo o ledger.
+
+    Args:
+        candidates: Linhas novas (ex: extrato sendo importado).
+        existing: Linhas já existentes no ledger (precisam de 'id').
+        window_days: Tolerância de datas, em dias.
+
+    Returns:
+        Lista de pares {'candidate', 'existing', 'days_apart'}.
+    """
+    def group(rows):
+        grouped = defaultdict(list)
+        for row in rows:
+            key = (row['transaction_type'], _to_cents(row['amount']))
+            ordinal = datetime.strptime(row['date'], DATE_FORMAT).toordinal()
+            grouped[key].append((ordinal, row))
+        for items in grouped.values():
+            items.sort(key=lambda item: item[0])
+        return grouped
+
+    existing_groups = group(existing)
+    pairs = []
+    for key, new_items in group(candidates).items():
+        old_items = existing_groups.get(key)
+        if not old_items:
+            continue
+        lo = 0
+        for ordinal, candidate in new_items:
+            while lo < len(old_items) and old_items[lo][0] < ordinal - window_days:
+                lo += 1
+            j = lo
+            while j < len(old_items) and old_items[j][0] <= ordinal + window_days:
+                old_ordinal, old_row = old_items[j]
+                if old_row.get('fingerprint') != candidate.get('fingerprint'):
+                    pairs.append({
+                        'candidate': candidate,
+                        'existing': old_row,
+                        'days_apart': abs(old_ordinal - ordinal),
+                    })
+                j += 1
+    return pairs
+
+
+def import_statement(
+    lines: List[Dict[str, Any]],
+    account_id: int,
+    category: Optional[str] = None,
+    method: Optional[str] = None,
+    window_days: int = NEAR_DUPLICATE_WINDOW_DAYS,
+    skip_near_duplicates: bool = False
+) -> Dict[str, Any]:
+    """
+    Importa linhas de extrato no ledger de forma idempotente.
+
+    Duplicatas exatas (mesmo fingerprint) são descartadas pelo índice único, via
+    INSERT OR IGNORE a partir de uma tabela temporária, em uma única transação.
+    Quase-duplicados (ex: lançamento manual e a mesma despesa vinda do extrato)
+    são apenas reportados para revisão humana, a menos que 'skip_near_duplicates'
+    seja True.
+
+    Args:
+        lines: Linhas de extrato (ver parse_statement_csv).
+        account_id: ID da conta do extrato.
+        category: Categoria padrão para as linhas sem categoria (opcional).
+        method: Método padrão (opcional).
+        window_days: Tolerância de datas para quase-duplicados.
+        skip_near_duplicates: Se True, não insere linhas com quase-duplicado no ledger.
+
+    Returns:
+        Dicionário com 'inserted', 'duplicates' e 'near_duplicates' (lista de pares).
+    """
+    rows = prepare_import_rows(lines, account_id, category, method)
+    if not rows:
+        return {'inserted': 0, 'duplicates': 0, 'near_duplicates': []}
+
+    # Extratos que alcançam o período arquivado também são conferidos contra o arquivo
+    earliest = min(datetime.strptime(r['date'], DATE_FORMAT) for r in rows) - timedelta(days=window_days)
+    with_archive = needs_archive(earliest.strftime(DATE_FORMAT))
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if with_archive:
+            attach(conn)  # antes da transação
+        ledger_source = union_source(conn) if with_archive else "transactions"
+        # Trava de escrita desde a checagem de duplicatas até a inserção
+        begin_immediate(conn)
+        cursor.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS import_staging (
+                seq INTEGER PRIMARY KEY,
+                date TEXT, amount REAL, transaction_type TEXT, account_id INTEGER,
+                category TEXT, description TEXT, method TEXT, fingerprint TEXT
+            )
+        """)
+        cursor.execute("DELETE FROM import_staging")
+        cursor.executemany(
+            """
+            INSERT INTO import_staging
+            (seq, date, amount, transaction_type, account_id, category, description, method, fingerprint)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (seq, r['date'], r['amount'], r['transaction_type'], r['account_id'],
+                 r['category'], r['description'], r['method'], r['fingerprint'])
+                for seq, r in enumerate(rows)
+            ]
+        )
+
+        # 1. Duplicatas exatas: join pelo índice único de fingerprint
+        cursor.execute(f"""
+            SELECT s.seq FROM import_staging s
+            JOIN {ledger_source} t ON t.fingerprint = s.fingerprint
+        """)
+        duplicate_seqs = {row['seq'] for row in cursor.fetchall()}
+        new_rows = [r for seq, r in enumerate(rows) if seq not in duplicate_seqs]
+
+        # 2. Quase-duplicados: uma única leitura da janela de datas da conta
+        near_duplicates = []
+        if new_rows:
+            min_date = min(r['date'] for r in new_rows)
+            max_date = max(r['date'] for r in new_rows)
+            window = timedelta(days=window_days)
+            cursor.execute(
+                f"""
+                SELECT id, date, amount, transaction_type, description, fingerprint
+                FROM {ledger_source}
+                WHERE account_id = ? AND date BETWEEN ? AND ?
+                """,
+                (
+                    account_id,
+                    (datetime.strptime(min_date, DATE_FORMAT) - window).strftime(DATE_FORMAT),
+                    (datetime.strptime(max_date, DATE_FORMAT) + window).strftime(DATE_FORMAT),
+                )
+            )
+            existing = [dict(row) for row in cursor.fetchall()]
+            near_duplicates = find_near_duplicates(new_rows, existing, window_days)
+
+        if skip_near_duplicates and near_duplicates:
+            skipped = {pair['candidate']['fingerprint'] for pair in near_duplicates}
+            cursor.executemany(
+                "DELETE FROM import_staging WHERE fingerprint = ?",
+                [(fp,) for fp in skipped]
+            )
+
+        # 3. Inserção em conjunto; o índice único descarta o que já existe
+        cursor.executemany("DELETE FROM import_staging WHERE seq = ?", [(seq,) for seq in duplicate_seqs])
+        # Ids crescentes (AUTOINCREMENT) e trava de escrita: as linhas novas são as de id maior
+        last_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+        cursor.execute("""
+            INSERT OR IGNORE INTO transactions
+            (date, amount, transaction_type, account_id, category, description, method, fingerprint)
+            SELECT date, amount, transaction_type, account_id, category, description, method, fingerprint
+            FROM import_staging
+            ORDER BY seq
+        """)
+        # rowcount conta só as linhas inseridas (não as escritas dos triggers nos agregados)
+        inserted = cursor.rowcount
+
+        # 4. Alertas do teto na mesma transação (cubo e saldos vêm dos triggers)
+        inserted_rows = []
+        if inserted:
+            cursor.execute("""
+                SELECT date, amount, transaction_type, account_id, category, method
+                FROM transactions
+                WHERE id > ?
+                ORDER BY id
+            """, (last_id,))
+            inserted_rows = [dict(row) for row in cursor.fetchall()]
+            _apply_derived(cursor, inserted_rows)
+
+        cursor.execute("DELETE FROM import_staging")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    if inserted_rows:
+        _after_commit(inserted_rows)
+
+    return {
+        'inserted': inserted,
+        'duplicates': len(duplicate_seqs),
+        'near_duplicates': near_duplicates,
+    }
+
+
+def import_transactions_from_csv(file_path: str, account_id: int) -> int:
+    """
+    Processa um arquivo CSV de extrato, insere as transações e retorna o número
+    de transações importadas. Reimportar o mesmo arquivo (ou um extrato que se
+    sobrepõe) não duplica lançamentos.
+
+    Args:
+        file_path: Caminho do arquivo CSV.
+        account_id: ID da conta do extrato.
+
+    Returns:
+        Número de transações efetivamente inseridas.
+    """
+    result = import_statement(parse_statement_csv(file_path), account_id)
+    return result['inserted']
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import os
+    import tempfile
+    import db
+    import ledger
+    db.initialize_db()
+
+    ACCOUNT_ID = 1
+
+    # Extrato de exemplo (valores negativos são saídas)
+    csv_content = (
+        "Data;Descrição;Valor;Documento\n"
+        "19/01/2026;SALARIO EMPRESA;2.000,00;A1\n"
+        "20/01/2026;Padaria São João;-12,50;A2\n"
+        "20/01/2026;Padaria São João;-12,50;A3\n"
+        "21/01/2026;Posto Shell;-100,00;A4\n"
+    )
+    path = os.path.join(tempfile.gettempdir(), "extrato_exemplo.csv")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(csv_content)
+
+    # Lançamento manual que também aparece no extrato (quase-duplicado)
+    ledger.add_transaction("2026-01-21", 100.00, "expense", ACCOUNT_ID, "Transporte", "Gasolina", "debito")
+
+    lines = parse_statement_csv(path)
+    first = import_statement(lines, ACCOUNT_ID)
+    print(f"Primeira importação: {first['inserted']} inseridas, {first['duplicates']} duplicadas")
+    for pair in first['near_duplicates']:
+        print(f"  Quase-duplicado: {pair['candidate']['description']} ~ {pair['existing']['description']} "
+              f"({pair['days_apart']} dia(s))")
+
+    # Reimportação do mesmo extrato: nada deve ser inserido
+    second = import_statement(lines, ACCOUNT_ID)
+    print(f"Reimportação: {second['inserted']} inseridas, {second['duplicates']} duplicadas") # Esperado: 0 inseridas, 4 duplicadas
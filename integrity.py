@@ -0,0 +1,292 @@
+import json
+import sqlite3
+from collections import Counter
+from typing import List, Dict, Any, Optional
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from db import get_db_connection
+except ImportError:
+    import db
+    get_db_connection = db.get_db_connection
+
+# Verificação de integridade do ledger em streaming.
+#
+# Os lançamentos são lidos em ordem de id, em blocos, mantendo apenas:
+#   - a soma corrente por conta (para comparar com account_balances);
+#   - as transferências com uma só perna vista até o momento (normalmente poucas,
+#     pois as pernas são gravadas juntas).
+# Esse estado é salvo em integrity_checkpoints ao final; a próxima execução lê só
+# os lançamentos novos. Correções em linhas já verificadas são aplicadas a partir
+# da trilha de auditoria (transaction_audit). Alterações por SQL direto, fora do
+# ledger, não passam pela auditoria: rode com full=True para reverificar tudo.
+# Lançamentos movidos para o banco de arquivo (archive.py) entram nas somas
+# iniciais pelo resumo archived_summary; arquivar apaga o checkpoint.
+
+CHECKPOINT_NAME = 'ledger'
+BALANCE_TOLERANCE = 0.005
+
+# Tabelas cujas linhas referenciam contas (linhas órfãs se a conta não existir)
+_ACCOUNT_REFERENCES = (
+    'account_balances', 'spending_cube', 'weekly_spend_state', 'reconciliations', 'planned_fixed', 'alert_events',
+)
+
+
+def _signed(row: Dict[str, Any]) -> float:
+    """Efeito de um lançamento no saldo (mesma regra de ledger.get_account_balance)."""
+    if row['transaction_type'] == 'income':
+        return row['amount']
+    if row['transaction_type'] in ('expense', 'transfer'):
+        return -row['amount']
+    return 0.0
+
+
+class _Report:
+    """Acumula divergências com memória limitada (contagem total + primeiras 'max_issues')."""
+
+    def __init__(self, max_issues: int):
+        self.max_issues = max_issues
+        self.counts = Counter()
+        self.issues: List[Dict[str, Any]] = []
+
+    def add(self, kind: str, **details: Any) -> None:
+        self.counts[kind] += 1
+        if len(self.issues) < self.max_issues:
+            self.issues.append({'kind': kind, **details})
+
+
+def _initial_state(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """Estado antes do primeiro lançamento: as somas partem do resumo dos lançamentos arquivados."""
+    balances = {row[0]: row[1] for row in conn.execute("""
+        SELECT account_id, SUM(CASE transaction_type
+            WHEN 'income' THEN total
+            WHEN 'expense' THEN -total
+            WHEN 'transfer' THEN -total
+            ELSE 0 END)
+        FROM archived_summary GROUP BY account_id
+    """)}
+    return {'last_transaction_id': 0, 'last_audit_id': 0, 'balances': balances, 'pending': {}}
+
+
+def _load_checkpoint(conn: sqlite3.Connection) -> Dict[str, Any]:
+    row = conn.execute(
+        "SELECT * FROM integrity_checkpoints WHERE name = ?", (CHECKPOINT_NAME,)
+    ).fetchone()
+    if row is None:
+        return _initial_state(conn)
+    state = json.loads(row['state_json'])
+    return {
+        'last_transaction_id': row['last_transaction_id'],
+        'last_audit_id': row['last_audit_id'],
+        'balances': {int(account_id): total for account_id, total in state['balances'].items()},
+        'pending': state['pending'],
+    }
+
+
+def _apply_audit(conn: sqlite3.Connection, state: Dict[str, Any]) -> int:
+    """
+    Aplica às somas do checkpoint as correções (update/void) feitas depois dele
+    em lançamentos já verificados. Retorna o último id de auditoria lido.
+    """
+    last_audit_id = state['last_audit_id']
+    cursor = conn.execute(
+        "SELECT id, transaction_id, before_json, after_json FROM transaction_audit WHERE id > ? ORDER BY id",
+        (last_audit_id,)
+    )
+    for audit in cursor:
+        last_audit_id = audit['id']
+        if audit['transaction_id'] > state['last_transaction_id']:
+            continue  # a linha ainda será lida no stream, já no estado atual
+        before = json.loads(audit['before_json'])
+        balances = state['balances']
+        balances[before['account_id']] = balances.get(before['account_id'], 0.0) - _signed(before)
+        if audit['after_json']:
+            after = json.loads(audit['after_json'])
+            balances[after['account_id']] = balances.get(after['account_id'], 0.0) + _signed(after)
+        # Pernas pendentes alteradas/anuladas são reavaliadas ao final
+    return last_audit_id
+
+
+def _check_transfer_pair(legs: List[Dict[str, Any]], group_id: str, report: _Report) -> None:
+    """Uma transferência tem uma perna expense e uma income de mesmo valor (soma zero no caixa)."""
+    types = sorted(leg['transaction_type'] for leg in legs)
+    if types != ['expense', 'income']:
+        report.add('transfer_legs', transfer_group_id=group_id, legs=[leg['id'] for leg in legs], types=types)
+        return
+    net = sum(leg['amount'] if leg['transaction_type'] == 'income' else -leg['amount'] for leg in legs)
+    if abs(net) > BALANCE_TOLERANCE:
+        report.add('transfer_not_zero', transfer_group_id=group_id, legs=[leg['id'] for leg in legs], net=net)
+
+
+def check_integrity(
+    full: bool = False,
+    batch_size: int = 5000,
+    max_issues: int = 1000,
+    save_checkpoint: bool = True
+) -> Dict[str, Any]:
+    """
+    Verifica a integridade do ledger em streaming (ordem de id, memória constante).
+
+    Verificações:
+        missing_account    -> lançamento em conta inexistente
+        transfer_legs      -> grupo de transferência sem exatamente uma perna expense e uma income
+        transfer_not_zero  -> pernas de uma transferência com valores diferentes (caixa não fecha)
+        orphan_transfer    -> perna de transferência sem a outra perna
+        orphan_row         -> linha de tabela derivada/auxiliar apontando para conta inexistente
+        balance_mismatch   -> account_balances diferente da soma recalculada dos lançamentos
+
+    Args:
+        full: Se True, ignora o checkpoint e verifica o ledger inteiro.
+        batch_size: Linhas lidas por bloco.
+        max_issues: Máximo de divergências detalhadas no relatório (as contagens são sempre completas).
+        save_checkpoint: Se True, grava o progresso para a próxima execução.
+
+    Returns:
+        Dicionário com 'ok', 'from_id', 'last_id', 'checked_rows', 'issue_counts' e 'issues'.
+    """
+    report = _Report(max_issues)
+    conn = get_db_connection()
+    conn.isolation_level = None  # leitura em uma única transação (visão consistente)
+    try:
+        conn.execute("BEGIN")
+        if full:
+            state = _initial_state(conn)
+            last_audit = conn.execute("SELECT COALESCE(MAX(id), 0) FROM transaction_audit").fetchone()[0]
+            state['last_audit_id'] = last_audit
+        else:
+            state = _load_checkpoint(conn)
+            state['last_audit_id'] = _apply_audit(conn, state)
+        from_id = state['last_transaction_id']
+        account_ids = {row[0] for row in conn.execute("SELECT id FROM accounts")}
+        balances = state['balances']
+        pending = state['pending']  # transfer_group_id -> pernas vistas (dicts pequenos)
+
+        checked = 0
+        last_id = from_id
+        cursor = conn.execute(
+            """
+            SELECT id, date, amount, transaction_type, account_id, transfer_group_id
+            FROM transactions WHERE id > ? ORDER BY id
+            """,
+            (from_id,)
+        )
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            for row in batch:
+                row = dict(row)
+                checked += 1
+                last_id = row['id']
+                if row['account_id'] not in account_ids:
+                    report.add('missing_account', transaction_id=row['id'], account_id=row['account_id'])
+                balances[row['account_id']] = balances.get(row['account_id'], 0.0) + _signed(row)
+
+                group_id = row['transfer_group_id']
+                if group_id:
+                    legs = pending.setdefault(group_id, [])
+                    legs.append({key: row[key] for key in ('id', 'amount', 'transaction_type')})
+                    if len(legs) == 2:
+                        _check_transfer_pair(legs, group_id, report)
+                        del pending[group_id]
+
+        # Grupos ainda incompletos: relê o grupo (indexado) antes de acusar perna órfã
+        for group_id in list(pending):
+            legs = [dict(row) for row in conn.execute(
+                "SELECT id, amount, transaction_type FROM transactions WHERE transfer_group_id = ?", (group_id,)
+            )]
+            if not legs:
+                del pending[group_id]  # transferência anulada
+            elif len(legs) == 1:
+                report.add('orphan_transfer', transfer_group_id=group_id, transaction_id=legs[0]['id'])
+                pending[group_id] = legs
+            else:
+                _check_transfer_pair(legs, group_id, report)
+                del pending[group_id]
+
+        for table in _ACCOUNT_REFERENCES:
+            for row in conn.execute(f"""
+                SELECT t.account_id, COUNT(*) AS count FROM {table} t
+                LEFT JOIN accounts a ON a.id = t.account_id
+                WHERE a.id IS NULL GROUP BY t.account_id
+            """):
+                report.add('orphan_row', table=table, account_id=row['account_id'], count=row['count'])
+
+        stored = {row['account_id']: row['balance'] for row in conn.execute(
+            "SELECT account_id, balance FROM account_balances"
+        )}
+        for account_id in set(stored) | set(balances):
+            expected = balances.get(account_id, 0.0)
+            actual = stored.get(account_id, 0.0)
+            if abs(expected - actual) > BALANCE_TOLERANCE:
+                report.add('balance_mismatch', account_id=account_id, expected=expected, stored=actual)
+        conn.execute("COMMIT")
+
+        if save_checkpoint:
+            conn.execute(
+                """
+                INSERT INTO integrity_checkpoints (name, last_transaction_id, last_audit_id, state_json, updated_at)
+                VALUES (?, ?, ?, ?, datetime('now'))
+                ON CONFLICT(name) DO UPDATE SET
+                    last_transaction_id = excluded.last_transaction_id,
+                    last_audit_id = excluded.last_audit_id,
+                    state_json = excluded.state_json,
+                    updated_at = excluded.updated_at
+                """,
+                (CHECKPOINT_NAME, last_id, state['last_audit_id'],
+                 json.dumps({'balances': {str(k): v for k, v in balances.items()}, 'pending': pending}))
+            )
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        conn.close()
+
+    return {
+        'ok': not report.counts,
+        'from_id': from_id,
+        'last_id': last_id,
+        'checked_rows': checked,
+        'issue_counts': dict(report.counts),
+        'issues': report.issues,
+    }
+
+
+def reset_checkpoint() -> None:
+    """Apaga o checkpoint: a próxima verificação percorre o ledger inteiro."""
+    conn = get_db_connection()
+    try:
+        conn.execute("DELETE FROM integrity_checkpoints WHERE name = ?", (CHECKPOINT_NAME,))
+        conn.commit()
+    finally:
+        conn.close()
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import db
+    import ledger
+    db.initialize_db()
+
+    OP_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Operacional PF", "PF", "operacional", 1)
+    )
+    COFRE_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Cofre", "PF", "cofre", 1)
+    )
+    for day in range(1, 29):
+        ledger.add_transaction(f"2026-02-{day:02d}", 20.00, "expense", OP_ID, "Alimentação", "Gasto diário")
+    ledger.add_transfer("2026-02-10", OP_ID, COFRE_ID, 300.00, "Reserva", "PIX")
+
+    first = check_integrity(full=True)
+    print(f"Verificação completa: {first['checked_rows']} linhas, ok = {first['ok']}")
+
+    # Novos lançamentos e uma correção auditada: a próxima execução lê só as linhas novas
+    tx_id = ledger.add_transaction("2026-03-01", 50.00, "expense", OP_ID, "Transporte", "Uber")
+    ledger.update_transaction(tx_id - 1, amount=400.00, reason="Valor da reserva")  # perna income da transferência
+    second = check_integrity()
+    print(f"Incremental: {second['checked_rows']} linha(s) a partir do id {second['from_id']}, ok = {second['ok']}")
+
+    # Perna de transferência removida por SQL direto: a outra perna fica órfã
+    db.execute_insert("DELETE FROM transactions WHERE id = ?", (tx_id - 1,))
+    third = check_integrity(full=True)
+    print(f"Após DELETE direto: {third['issue_counts']}")
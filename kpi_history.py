@@ -0,0 +1,209 @@
+from typing import Optional, Sequence
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from db import execute_read_query
+    from dates import get_week_start
+    from planned import _get_index
+    from config import get_operational_account_id
+    from archive import query_ledger, needs_archive, archived_balances
+except ImportError:
+    import db
+    import dates
+    import planned
+    import config
+    import archive
+    execute_read_query = db.execute_read_query
+    get_week_start = dates.get_week_start
+    _get_index = planned._get_index
+    get_operational_account_id = config.get_operational_account_id
+    query_ledger = archive.query_ledger
+    needs_archive = archive.needs_archive
+    archived_balances = archive.archived_balances
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# Colunas do histórico, na mesma semântica das funções de data única:
+#   total_cash                   -> kpis.get_total_cash(as_of=d)
+#   weekly_variable_expenses     -> kpis.get_current_week_variable_expenses(op, today=d)
+#   avg_weekly_variable_expenses -> forecast.get_average_weekly_variable_expenses(n, as_of=d)
+#   planned_fixed_expenses, projected_variable_expenses, forecasted_cash
+#                                -> forecast.forecast_cash_flow(days, as_of=d)
+KPI_COLUMNS = (
+    'total_cash', 'weekly_variable_expenses', 'avg_weekly_variable_expenses',
+    'planned_fixed_expenses', 'projected_variable_expenses', 'forecasted_cash',
+)
+
+
+def _ordinals(values: Sequence[str]) -> np.ndarray:
+    return np.fromiter(
+        (datetime.strptime(value, DATE_FORMAT).toordinal() for value in values),
+        dtype=np.int64, count=len(values)
+    )
+
+
+def _cumulative_until(day_ordinals: np.ndarray, cumulative: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Soma acumulada dos dias <= cada alvo (0 antes do primeiro dia com lançamento)."""
+    positions = np.searchsorted(day_ordinals, targets, side='right')
+    padded = np.concatenate(([0.0], cumulative))
+    return padded[positions]
+
+
+def daily_dates(start_date: str, end_date: str) -> list:
+    """Lista das datas (YYYY-MM-DD) de start_date a end_date, inclusive."""
+    return [day.strftime(DATE_FORMAT) for day in pd.date_range(start_date, end_date, freq='D')]
+
+
+def get_kpi_history(
+    as_of_dates: Sequence[str],
+    num_weeks: int = 4,
+    forecast_days: int = 30,
+    operational_account_id: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Avalia o conjunto de KPIs do Dashboard para várias datas de referência de uma vez.
+
+    Em vez de N consultas por data, usa duas consultas agrupadas por dia (variação
+    de caixa das contas ativas e despesas da conta operacional), somas acumuladas
+    em NumPy e o índice de fixos planejados (planned.py) para todo o horizonte.
+    Um ano de histórico diário sai em poucas dezenas de milissegundos.
+
+    Args:
+        as_of_dates: Datas de referência (YYYY-MM-DD), em qualquer ordem.
+        num_weeks: Janela da média semanal de variáveis.
+        forecast_days: Horizonte da previsão, em dias.
+        operational_account_id: Conta operacional. Se None, usa a conta ativa com role 'operacional'.
+
+    Returns:
+        DataFrame indexado pela data de referência, com as colunas de KPI_COLUMNS.
+    """
+    if not as_of_dates:
+        return pd.DataFrame(columns=list(KPI_COLUMNS))
+    targets = _ordinals(as_of_dates)
+
+    if operational_account_id is None:
+        operational_account_id = get_operational_account_id()
+
+    # Semana de cada data: Segunda-feira = ordinal - weekday
+    weekdays = np.fromiter(
+        (datetime.strptime(value, DATE_FORMAT).weekday() for value in as_of_dates),
+        dtype=np.int64, count=len(as_of_dates)
+    )
+    week_starts = targets - weekdays
+    week_ends = week_starts + 6
+
+    # 1. Caixa: variação diária das contas ativas (mesma regra de ledger.get_account_balance).
+    # Datas anteriores ao corte do arquivo leem o detalhe arquivado (archive.py); senão,
+    # a parte arquivada entra como um saldo de abertura constante (resumo).
+    first_target = datetime.fromordinal(int(targets.min())).strftime(DATE_FORMAT)
+    cash_rows = query_ledger("""
+        SELECT t.date, SUM(CASE t.transaction_type
+            WHEN 'income' THEN t.amount
+            WHEN 'expense' THEN -t.amount
+            WHEN 'transfer' THEN -t.amount
+            ELSE 0 END) AS net_change
+        FROM {transactions} t
+        JOIN accounts a ON a.id = t.account_id
+        WHERE a.active = 1
+        GROUP BY t.date
+        ORDER BY t.date
+    """, since=first_target)
+    cash_days = _ordinals([row['date'] for row in cash_rows])
+    cash_cumulative = np.cumsum([row['net_change'] or 0.0 for row in cash_rows], dtype=float)
+    total_cash = _cumulative_until(cash_days, cash_cumulative, targets)
+    if not needs_archive(first_target):
+        active = {row['id'] for row in execute_read_query("SELECT id FROM accounts WHERE active = 1")}
+        total_cash = total_cash + sum(
+            value for account, value in archived_balances().items() if account in active
+        )
+
+    # 2. Despesas diárias da conta operacional (desde a semana mais antiga da média)
+    first_week = week_starts.min() - 7 * max(num_weeks - 1, 0)
+    spend_rows = []
+    if operational_account_id is not None:
+        spend_rows = query_ledger("""
+            SELECT date, SUM(amount) AS total
+            FROM {transactions}
+            WHERE transaction_type = 'expense' AND account_id = ?
+            GROUP BY date
+            ORDER BY date
+        """, (operational_account_id,), since=datetime.fromordinal(int(first_week)).strftime(DATE_FORMAT))
+    spend_days = _ordinals([row['date'] for row in spend_rows])
+    spend_cumulative = np.cumsum([row['total'] for row in spend_rows], dtype=float)
+
+    def spend_between(first: np.ndarray, last: np.ndarray) -> np.ndarray:
+        return (_cumulative_until(spend_days, spend_cumulative, last)
+                - _cumulative_until(spend_days, spend_cumulative, first - 1))
+
+    weekly_expenses = spend_between(week_starts, week_ends)
+    if num_weeks > 0:
+        avg_weekly = spend_between(week_starts - 7 * (num_weeks - 1), week_ends) / num_weeks
+    else:
+        avg_weekly = np.zeros(len(targets))
+
+    # 3. Fixos planejados em [d, d + forecast_days], com um único índice para o horizonte
+    first_day = datetime.fromordinal(int(targets.min())).date()
+    last_day = datetime.fromordinal(int(targets.max()) + forecast_days).date()
+    index = _get_index(first_day, last_day)
+    planned_fixed = np.fromiter(
+        (index.total(datetime.fromordinal(int(t)).date(), datetime.fromordinal(int(t) + forecast_days).date())
+         for t in targets),
+        dtype=float, count=len(targets)
+    )
+
+    projected_variable = avg_weekly * (forecast_days / 7.0)
+    return pd.DataFrame(
+        {
+            'total_cash': total_cash,
+            'weekly_variable_expenses': weekly_expenses,
+            'avg_weekly_variable_expenses': avg_weekly,
+            'planned_fixed_expenses': planned_fixed,
+            'projected_variable_expenses': projected_variable,
+            'forecasted_cash': total_cash - planned_fixed - projected_variable,
+        },
+        index=pd.Index(list(as_of_dates), name='as_of'),
+    )
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import time
+    import db
+    import ledger
+    import planned
+    import kpis
+    import forecast
+    db.initialize_db()
+
+    OP_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Operacional PF", "PF", "operacional", 1)
+    )
+    db.execute_insert("UPDATE accounts SET role = 'cofre' WHERE role = 'operacional' AND id <> ?", (OP_ID,))
+    planned.add_planned_item("Aluguel", 1500.00, "monthly", OP_ID, due_day=5)
+
+    start = datetime.strptime("2025-01-01", DATE_FORMAT)
+    for day in range(365):
+        date = (start + timedelta(days=day)).strftime(DATE_FORMAT)
+        ledger.add_transaction(date, 30.00 + day % 7 * 5, "expense", OP_ID, "Simulação", "Gasto diário")
+        if day % 14 == 0:
+            ledger.add_transaction(date, 2500.00, "income", OP_ID, "Salário", "Quinzena")
+
+    dates_2025 = daily_dates("2025-01-01", "2025-12-31")
+    t0 = time.perf_counter()
+    history = get_kpi_history(dates_2025)
+    elapsed = (time.perf_counter() - t0) * 1000
+    print(f"Histórico diário de 2025 ({len(history)} datas) em {elapsed:.1f} ms")
+    print(history.tail(3).round(2))
+
+    # Conferência com as funções de data única
+    for as_of in ("2025-03-15", "2025-08-31"):
+        single = forecast.forecast_cash_flow(days=30, as_of=as_of)
+        row = history.loc[as_of]
+        same = (
+            abs(row['total_cash'] - kpis.get_total_cash(as_of=as_of)) < 0.005
+            and abs(row['weekly_variable_expenses'] - kpis.get_current_week_variable_expenses(OP_ID, as_of)) < 0.005
+            and abs(row['forecasted_cash'] - single['forecasted_cash']) < 0.005
+        )
+        print(f"{as_of}: lote == data única? {same}")
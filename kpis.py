@@ -1,21 +1,25 @@
-from typing import Dict
+import json
+from typing import Dict, List, Optional, TypedDict
 from datetime import datetime
 from dates import get_week_end, get_current_week_range
 from ledger import get_account_balance
 
 # Tenta importar para testes diretos e para uso como módulo
 try:
-    from db import execute_query
+    from db import execute_read_query
     from dates import get_week_end, get_current_week_range
     from ledger import get_account_balance
+    from archive import query_ledger
 except ImportError:
     import db
     import dates
     import ledger
-    execute_query = db.execute_query
+    import archive
+    execute_read_query = db.execute_read_query
     get_week_end = dates.get_week_end
     get_current_week_range = dates.get_current_week_range
     get_account_balance = ledger.get_account_balance
+    query_ledger = archive.query_ledger
 
 
 def get_weekly_variable_expenses(week_start: str, operational_account_id: int) -> float:
@@ -34,16 +38,17 @@ def get_weekly_variable_expenses(week_start: str, operational_account_id: int) -
     
     # Regra: somar somente 'expense', conta operacional, datas dentro da semana.
     # Transferências são excluídas pelo filtro 'expense'.
+    # Semanas anteriores ao corte do arquivo são lidas via ATTACH (archive.py).
     query = """
         SELECT SUM(amount) AS total_expenses
-        FROM transactions
+        FROM {transactions}
         WHERE transaction_type = 'expense'
           AND account_id = ?
           AND date BETWEEN ? AND ?
     """
     params = (operational_account_id, week_start, week_end)
     
-    result = execute_query(query, params)
+    result = query_ledger(query, params, since=week_start)
     
     # O resultado é uma lista de tuplas/linhas. Pegamos o primeiro elemento (total_expenses)
     total = result[0]['total_expenses'] if result and result[0]['total_expenses'] is not None else 0.0
@@ -67,7 +72,7 @@ def get_current_week_variable_expenses(operational_account_id: int, today: str =
     # Reutiliza a função principal de cálculo semanal
     return get_weekly_variable_expenses(week_start, operational_account_id)
 
-def get_total_cash() -> float:
+def get_total_cash(as_of: str = None) -> float:
     """
     Soma os saldos computados de todas as contas ativas.
     
@@ -76,23 +81,94 @@ def get_total_cash() -> float:
     pois estas são tratadas como expense (saída) e income (entrada)
     que se anulam no total.
     
+    Args:
+        as_of: Data de referência (YYYY-MM-DD). Se informada, considera apenas
+               lançamentos até essa data (caixa "como era" no dia). Se None, todos.
+    
     Returns:
         O saldo total de caixa (cash) do sistema.
     """
     # 1. Obter IDs de todas as contas ativas
     query = "SELECT id FROM accounts WHERE active = 1"
-    active_accounts = execute_query(query)
+    active_accounts = execute_read_query(query)
     
     total_cash = 0.0
     
     # 2. Iterar e somar os saldos
     for account in active_accounts:
         account_id = account['id']
-        balance = get_account_balance(account_id)
+        balance = get_account_balance(account_id, until_date=as_of)
         total_cash += balance
         
     return total_cash
 
+class DashboardSnapshot(TypedDict):
+    """Tudo o que a página Dashboard exibe, lido de uma só vez."""
+    today: str
+    week_start: str
+    week_end: str
+    operational_account_id: Optional[int]
+    weekly_expenses: float
+    weekly_cap: float
+    active_accounts: int
+    total_cash: float
+    reconciled: bool
+    alerts: List[Dict]
+
+
+_DASHBOARD_QUERY = """
+    WITH op AS (
+        SELECT id FROM accounts WHERE role = 'operacional' AND active = 1 LIMIT 1
+    )
+    SELECT
+        (SELECT id FROM op) AS operational_account_id,
+        (SELECT COALESCE(SUM(spent), 0.0) FROM weekly_spend_state
+          WHERE account_id = (SELECT id FROM op) AND week_start = :week_start) AS weekly_expenses,
+        (SELECT COALESCE(CAST(value AS REAL), 0.0) FROM settings
+          WHERE key = 'weekly_cap_amount') AS weekly_cap,
+        (SELECT COUNT(*) FROM accounts WHERE active = 1) AS active_accounts,
+        (SELECT COALESCE(SUM(b.balance), 0.0) FROM accounts a
+          JOIN account_balances b ON b.account_id = a.id WHERE a.active = 1) AS total_cash,
+        EXISTS (SELECT 1 FROM reconciliations WHERE week_start = :week_start) AS reconciled,
+        (SELECT json_group_array(json_object(
+                    'threshold', threshold, 'spent', spent, 'cap', cap, 'created_at', created_at))
+           FROM (SELECT * FROM alert_events
+                  WHERE account_id = (SELECT id FROM op) AND week_start = :week_start
+                  ORDER BY threshold)) AS alerts
+"""
+
+
+def get_dashboard_snapshot(today: str = None) -> DashboardSnapshot:
+    """
+    Lê todos os números do Dashboard em uma única consulta (uma ida ao banco,
+    visão consistente): conta operacional, gasto e teto da semana, caixa total
+    das contas ativas, status da reconciliação e alertas da semana.
+
+    Usa as tabelas mantidas na escrita (weekly_spend_state, account_balances),
+    com os mesmos valores de alerts.get_weekly_spend e get_total_cash.
+
+    Args:
+        today: Data de referência (YYYY-MM-DD). Se None, usa a data atual do sistema.
+
+    Returns:
+        Um DashboardSnapshot.
+    """
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    week_start, week_end = get_current_week_range(today)
+    row = execute_read_query(_DASHBOARD_QUERY, {'week_start': week_start})[0]
+    return DashboardSnapshot(
+        today=today,
+        week_start=week_start,
+        week_end=week_end,
+        operational_account_id=row['operational_account_id'],
+        weekly_expenses=row['weekly_expenses'],
+        weekly_cap=row['weekly_cap'],
+        active_accounts=row['active_accounts'],
+        total_cash=row['total_cash'],
+        reconciled=bool(row['reconciled']),
+        alerts=json.loads(row['alerts']),
+    )
+
 # Exemplo de uso:
 if __name__ == '__main__':
     # Importar db para garantir que o banco esteja inicializado e populado
@@ -142,3 +218,12 @@ if __name__ == '__main__':
     # Saldo Cofre: 200 (income da transfer) = 200.00
     # Total: 600.00 + 200.00 = 800.00
     print(f"Saldo total de caixa (Cash - Invariante): R$ {total_cash:.2f}")
+    
+    # 4. Caixa "como era" em uma data passada
+    total_cash_past = get_total_cash(as_of="2026-01-20")
+    print(f"Saldo total de caixa em 2026-01-20: R$ {total_cash_past:.2f}") # Esperado: 1000 - 50 = 950.00
+    
+    # 5. Snapshot do Dashboard em uma única consulta
+    snapshot = get_dashboard_snapshot(today="2026-01-21")
+    print(f"Dashboard (2026-01-21): gasto R$ {snapshot['weekly_expenses']:.2f} de R$ {snapshot['weekly_cap']:.2f}, "
+          f"caixa R$ {snapshot['total_cash']:.2f}, reconciliada: {snapshot['reconciled']}")
@@ -1,17 +1,102 @@
+import json
 import sqlite3
-from typing import List, Dict, Any, Optional
+import uuid
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 from datetime import datetime
+import depgraph
 try:
-    from db import execute_insert, execute_query, get_db_connection, execute_many_atomic
+    from db import execute_insert, execute_query, execute_read_query, get_read_connection, transaction
+    from dates import get_week_start
+    from alerts import evaluate_thresholds, dispatch_new_events
+    from archive import archived_balances
 except ImportError:
     # Para execução direta do módulo (testes)
     import db
+    import dates
+    import alerts
+    import archive
     execute_insert = db.execute_insert
     execute_query = db.execute_query
-    get_db_connection = db.get_db_connection
+    execute_read_query = db.execute_read_query
+    get_read_connection = db.get_read_connection
+    transaction = db.transaction
+    get_week_start = dates.get_week_start
+    evaluate_thresholds = alerts.evaluate_thresholds
+    dispatch_new_events = alerts.dispatch_new_events
+    archived_balances = archive.archived_balances
 
 DATE_FORMAT = "%Y-%m-%d"
 
+_INSERT_QUERY = """
+    INSERT INTO transactions 
+    (date, amount, transaction_type, account_id, category, description, method, transfer_group_id) 
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _insert_params(row: Dict[str, Any]) -> tuple:
+    return (
+        row['date'], row['amount'], row['transaction_type'], row['account_id'],
+        row.get('category'), row.get('description'), row.get('method'), row.get('transfer_group_id')
+    )
+
+def _apply_derived(cursor: sqlite3.Cursor, rows: List[Dict[str, Any]]) -> None:
+    """
+    Completa, na transação do chamador, os dados derivados que os triggers de
+    transactions não cobrem (limiares do teto semanal; ver alerts.py).
+    Saldos, cubo e gasto semanal já foram atualizados pelos triggers (aggregates.py).
+
+    Args:
+        cursor: Cursor da transação de escrita.
+        rows: Lançamentos escritos (incluídos, alterados ou removidos).
+    """
+    evaluate_thresholds(cursor, rows)
+
+def _insert_rows(cursor: sqlite3.Cursor, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Insere lançamentos na transação do chamador e atualiza os dados derivados
+    na mesma transação (ver _apply_derived).
+
+    Returns:
+        Os IDs inseridos, na mesma ordem de 'rows'.
+    """
+    ids = []
+    for row in rows:
+        cursor.execute(_INSERT_QUERY, _insert_params(row))
+        ids.append(cursor.lastrowid)
+    _apply_derived(cursor, rows)
+    return ids
+
+def _after_commit(rows: List[Dict[str, Any]]) -> None:
+    """Invalida os caches derivados das contas/semanas afetadas e entrega novos alertas, após o commit."""
+    for account_id, week_start in {(row['account_id'], get_week_start(row['date'])) for row in rows}:
+        depgraph.invalidate('transactions', account_id, week_start)
+    depgraph.note_local_commit()
+    dispatch_new_events()
+
+def _transfer_rows(
+    date: str,
+    from_account_id: int,
+    to_account_id: int,
+    amount: float,
+    description: Optional[str] = None,
+    method: Optional[str] = None,
+    transfer_group_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Monta os dois lançamentos de uma transferência: expense na origem e income no destino,
+    ligados pelo mesmo transfer_group_id (gerado se não informado).
+    """
+    group_id = transfer_group_id or uuid.uuid4().hex
+    transfer_description = f"Transferência para {to_account_id}: {description or ''}"
+    return [
+        {'date': date, 'amount': amount, 'transaction_type': 'expense', 'account_id': from_account_id,
+         'category': 'Transferência', 'description': transfer_description, 'method': method,
+         'transfer_group_id': group_id},
+        {'date': date, 'amount': amount, 'transaction_type': 'income', 'account_id': to_account_id,
+         'category': 'Transferência', 'description': transfer_description, 'method': method,
+         'transfer_group_id': group_id},
+    ]
+
 def add_transaction(
     date: str,
     amount: float,
@@ -36,13 +121,17 @@ def add_transaction(
     Returns:
         O ID da transação inserida.
     """
-    query = """
-        INSERT INTO transactions 
-        (date, amount, transaction_type, account_id, category, description, method) 
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """
-    params = (date, amount, transaction_type, account_id, category, description, method)
-    return execute_insert(query, params)
+    row = {
+        'date': date, 'amount': amount, 'transaction_type': transaction_type,
+        'account_id': account_id, 'category': category,
+        'description': description, 'method': method,
+    }
+    with transaction() as conn:
+        transaction_id = _insert_rows(conn.cursor(), [row])[0]
+
+    # Invalida apenas os resultados derivados da conta/semana afetada
+    _after_commit([row])
+    return transaction_id
 
 def list_transactions(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
@@ -64,7 +153,7 @@ def list_transactions(filters: Dict[str, Any]) -> List[Dict[str, Any]]:
             
     base_query += " ORDER BY date DESC, id DESC"
     
-    results = execute_query(base_query, tuple(params))
+    results = execute_read_query(base_query, tuple(params))
     return [dict(row) for row in results]
 
 def get_account_balance(account_id: int, until_date: Optional[str] = None) -> float:
@@ -85,6 +174,13 @@ def get_account_balance(account_id: int, until_date: Optional[str] = None) -> fl
     # Em uma versão futura, o saldo inicial deve ser obtido da tabela accounts.
     initial_balance = 0.0
     
+    # Saldo atual: lido da tabela mantida pelos triggers (aggregates.py), sem somar o ledger
+    if until_date is None:
+        result = execute_read_query(
+            "SELECT balance FROM account_balances WHERE account_id = ?", (account_id,)
+        )
+        return initial_balance + (result[0]['balance'] if result else 0.0)
+    
     # 2. Construir a query para somar as transações
     query = """
         SELECT 
@@ -121,15 +217,18 @@ def get_account_balance(account_id: int, until_date: Optional[str] = None) -> fl
     # O total de caixa é a soma dos saldos de todas as contas.
     # A função get_account_balance já implementa essa lógica.
     
-    conn = get_db_connection()
+    conn = get_read_connection()
     cursor = conn.cursor()
     cursor.execute(query, tuple(params))
     result = cursor.fetchone()
     conn.close()
     
     net_change = result['net_change'] if result and result['net_change'] is not None else 0.0
-    
-    return initial_balance + net_change
+
+    # Lançamentos arquivados (archive.py): resumo ou detalhe do arquivo, conforme a data
+    archived = archived_balances(until_date).get(account_id, 0.0)
+
+    return initial_balance + archived + net_change
 
 def add_transfer(
     date: str,
@@ -138,7 +237,7 @@ def add_transfer(
     amount: float,
     description: Optional[str] = None,
     method: Optional[str] = None
-) -> None:
+) -> str:
     """
     Cria uma transferência atômica entre duas contas.
     
@@ -158,31 +257,293 @@ def add_transfer(
         amount: Valor da transferência (sempre positivo).
         description: Descrição detalhada (opcional).
         method: Método da transferência (opcional).
+        
+    Returns:
+        O transfer_group_id que liga as duas pernas.
     """
     
-    transfer_description = f"Transferência para {to_account_id}: {description or ''}"
+    rows = _transfer_rows(date, from_account_id, to_account_id, amount, description, method)
     
-    # Transação de Saída (Expense)
-    expense_query = """
-        INSERT INTO transactions 
-        (date, amount, transaction_type, account_id, category, description, method) 
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+    # Execução atômica (lançamentos e dados derivados na mesma transação)
+    with transaction() as conn:
+        _insert_rows(conn.cursor(), rows)
+
+    _after_commit(rows)
+    return rows[0]['transfer_group_id']
+
+def add_transfers(transfers: Sequence[Dict[str, Any]]) -> List[str]:
     """
-    expense_params = (date, amount, 'expense', from_account_id, 'Transferência', transfer_description, method)
-    
-    # Transação de Entrada (Income)
-    income_query = """
-        INSERT INTO transactions 
-        (date, amount, transaction_type, account_id, category, description, method) 
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+    Cria várias transferências de uma vez, em uma única transação.
+
+    Todas as pernas são gravadas com um único executemany; se qualquer uma falhar,
+    nenhuma transferência é gravada.
+
+    Args:
+        transfers: Dicionários com 'date', 'from_account_id', 'to_account_id', 'amount'
+                   e, opcionalmente, 'description' e 'method'.
+
+    Returns:
+        Os transfer_group_id criados, na mesma ordem de 'transfers'.
     """
-    income_params = (date, amount, 'income', to_account_id, 'Transferência', transfer_description, method)
-    
-    # Execução atômica
-    execute_many_atomic([
-        (expense_query, expense_params),
-        (income_query, income_params)
-    ])
+    rows = []
+    for transfer in transfers:
+        rows.extend(_transfer_rows(
+            transfer['date'], transfer['from_account_id'], transfer['to_account_id'],
+            transfer['amount'], transfer.get('description'), transfer.get('method')
+        ))
+    if not rows:
+        return []
+
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(_INSERT_QUERY, [_insert_params(row) for row in rows])
+        _apply_derived(cursor, rows)
+
+    _after_commit(rows)
+    return [row['transfer_group_id'] for row in rows[::2]]
+
+_TRANSFERS_QUERY = """
+    SELECT e.transfer_group_id, e.date, e.amount,
+           e.account_id AS from_account_id, i.account_id AS to_account_id,
+           e.id AS expense_id, i.id AS income_id, e.description, e.method
+    FROM transactions e
+    JOIN transactions i
+      ON i.transfer_group_id = e.transfer_group_id AND i.transaction_type = 'income'
+    WHERE e.transfer_group_id IS NOT NULL AND e.transaction_type = 'expense'
+"""
+
+def get_transfer(transfer_group_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Retorna uma transferência (as duas pernas) pelo grupo.
+
+    Returns:
+        Dicionário com 'transfer_group_id', 'date', 'amount', 'from_account_id',
+        'to_account_id', 'expense_id', 'income_id', 'description' e 'method', ou None.
+    """
+    result = execute_read_query(_TRANSFERS_QUERY + " AND e.transfer_group_id = ?", (transfer_group_id,))
+    return dict(result[0]) if result else None
+
+def list_transfers(
+    account_id: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Lista transferências (uma linha por grupo), opcionalmente filtradas por conta
+    (origem ou destino) e período.
+    """
+    query = _TRANSFERS_QUERY
+    params = []
+    if account_id is not None:
+        query += " AND (e.account_id = ? OR i.account_id = ?)"
+        params += [account_id, account_id]
+    if start_date is not None:
+        query += " AND e.date >= ?"
+        params.append(start_date)
+    if end_date is not None:
+        query += " AND e.date <= ?"
+        params.append(end_date)
+    query += " ORDER BY e.date DESC, e.id DESC"
+    return [dict(row) for row in execute_read_query(query, tuple(params))]
+
+def void_transfer(transfer_group_id: str, reason: Optional[str] = None) -> int:
+    """
+    Anula uma transferência, removendo as duas pernas na mesma transação (com auditoria).
+
+    Returns:
+        Número de lançamentos removidos (0 se o grupo não existir).
+    """
+    # Pernas lidas na transação de escrita (não no snapshot de leitura, que pode estar atrasado)
+    with transaction() as conn:
+        cursor = conn.cursor()
+        rows = _fetch_rows(cursor, 'transfer_group_id', [transfer_group_id])
+        _void_rows(cursor, rows, reason)
+
+    if rows:
+        _after_commit(rows)
+    return len(rows)
+
+def reverse_transfer(
+    transfer_group_id: str,
+    date: Optional[str] = None,
+    description: Optional[str] = None
+) -> str:
+    """
+    Estorna uma transferência criando a transferência inversa (destino -> origem).
+    A original é mantida, e o estorno fica em um novo grupo.
+
+    Args:
+        transfer_group_id: Grupo da transferência a estornar.
+        date: Data do estorno (YYYY-MM-DD). Se None, usa a data atual.
+        description: Descrição do estorno. Se None, referencia o grupo original.
+
+    Returns:
+        O transfer_group_id do estorno.
+    """
+    # Original lida na transação de escrita (não no snapshot de leitura, que pode estar atrasado)
+    with transaction() as conn:
+        cursor = conn.cursor()
+        original = cursor.execute(_TRANSFERS_QUERY + " AND e.transfer_group_id = ?", (transfer_group_id,)).fetchone()
+        if original is None:
+            raise ValueError(f"Transferência não encontrada: {transfer_group_id}")
+        rows = _transfer_rows(
+            date or datetime.now().strftime(DATE_FORMAT),
+            original['to_account_id'], original['from_account_id'], original['amount'],
+            description or f"Estorno de {transfer_group_id}", original['method']
+        )
+        _insert_rows(cursor, rows)
+
+    _after_commit(rows)
+    return rows[0]['transfer_group_id']
+
+# ============================================================================
+# CORREÇÕES (update / void) COM TRILHA DE AUDITORIA
+# Os triggers de transactions aplicam só a diferença antes/depois aos agregados
+# (saldos, cubo, gasto semanal); aqui se grava a auditoria, se reavaliam os
+# alertas do teto e se invalidam apenas as contas/semanas afetadas.
+# ============================================================================
+
+_EDITABLE_FIELDS = ('date', 'amount', 'transaction_type', 'account_id', 'category', 'description', 'method')
+
+# Campos de uma transferência que valem para as duas pernas
+_TRANSFER_SHARED_FIELDS = ('date', 'amount', 'description', 'method')
+
+_AUDIT_QUERY = """
+    INSERT INTO transaction_audit (transaction_id, action, before_json, after_json, reason)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+# Limite de parâmetros por consulta IN (...)
+_IN_CHUNK = 500
+
+def _fetch_rows(cursor: sqlite3.Cursor, column: str, values: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Lê lançamentos por id ou transfer_group_id, em blocos."""
+    rows = []
+    values = list(values)
+    for start in range(0, len(values), _IN_CHUNK):
+        chunk = values[start:start + _IN_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        rows += [dict(row) for row in cursor.execute(
+            f"SELECT * FROM transactions WHERE {column} IN ({placeholders})", chunk
+        ).fetchall()]
+    return rows
+
+def _with_transfer_legs(cursor: sqlite3.Cursor, rows: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """Completa a seleção com a outra perna de cada transferência."""
+    by_id = {row['id']: row for row in rows}
+    groups = {row['transfer_group_id'] for row in rows if row.get('transfer_group_id')}
+    for row in _fetch_rows(cursor, 'transfer_group_id', groups):
+        by_id.setdefault(row['id'], row)
+    return by_id
+
+def _to_json(row: Dict[str, Any]) -> str:
+    return json.dumps(row, ensure_ascii=False, sort_keys=True)
+
+def update_transactions(changes: Sequence[Tuple[int, Dict[str, Any]]], reason: Optional[str] = None) -> int:
+    """
+    Corrige vários lançamentos em uma única transação.
+
+    Em transferências, alterações de data, valor, descrição e método são aplicadas
+    às duas pernas; o tipo de uma perna não pode ser alterado (use void_transfer).
+
+    Args:
+        changes: Pares (id, {campo: novo valor}), com campos de _EDITABLE_FIELDS.
+        reason: Motivo registrado na auditoria (opcional).
+
+    Returns:
+        Número de lançamentos efetivamente alterados (incluindo pernas irmãs).
+
+    Raises:
+        ValueError: Campo inválido, lançamento inexistente ou alteração de tipo em transferência.
+    """
+    for transaction_id, fields in changes:
+        unknown = [field for field in fields if field not in _EDITABLE_FIELDS]
+        if unknown:
+            raise ValueError(f"Campos não editáveis: {', '.join(unknown)}.")
+    if not changes:
+        return 0
+
+    with transaction() as conn:
+        cursor = conn.cursor()
+        befores = _with_transfer_legs(cursor, _fetch_rows(cursor, 'id', [tx_id for tx_id, _ in changes]))
+        afters = {tx_id: dict(row) for tx_id, row in befores.items()}
+        for transaction_id, fields in changes:
+            if transaction_id not in befores:
+                raise ValueError(f"Lançamento não encontrado: {transaction_id}")
+            row = afters[transaction_id]
+            row.update(fields)
+            group_id = row.get('transfer_group_id')
+            if group_id:
+                if 'transaction_type' in fields and fields['transaction_type'] != befores[transaction_id]['transaction_type']:
+                    raise ValueError("O tipo de uma perna de transferência não pode ser alterado.")
+                shared = {field: fields[field] for field in _TRANSFER_SHARED_FIELDS if field in fields}
+                for sibling in afters.values():
+                    if sibling['transfer_group_id'] == group_id:
+                        sibling.update(shared)
+
+        changed = [tx_id for tx_id in afters if afters[tx_id] != befores[tx_id]]
+        cursor.executemany(
+            f"UPDATE transactions SET {', '.join(f'{field} = ?' for field in _EDITABLE_FIELDS)} WHERE id = ?",
+            [tuple(afters[tx_id][field] for field in _EDITABLE_FIELDS) + (tx_id,) for tx_id in changed]
+        )
+        cursor.executemany(_AUDIT_QUERY, [
+            (tx_id, 'update', _to_json(befores[tx_id]), _to_json(afters[tx_id]), reason) for tx_id in changed
+        ])
+        touched = [befores[tx_id] for tx_id in changed] + [afters[tx_id] for tx_id in changed]
+        _apply_derived(cursor, touched)
+
+    _after_commit(touched)
+    return len(changed)
+
+def update_transaction(transaction_id: int, reason: Optional[str] = None, **fields: Any) -> Dict[str, Any]:
+    """
+    Corrige um lançamento (ex: update_transaction(42, amount=35.0, reason="valor errado")).
+
+    Returns:
+        O lançamento após a alteração (lido do banco em disco, não do snapshot de leitura).
+    """
+    update_transactions([(transaction_id, fields)], reason)
+    return dict(execute_query("SELECT * FROM transactions WHERE id = ?", (transaction_id,))[0])
+
+def _void_rows(cursor: sqlite3.Cursor, rows: List[Dict[str, Any]], reason: Optional[str]) -> None:
+    """Remove os lançamentos na transação do chamador, com auditoria e dados derivados."""
+    cursor.executemany("DELETE FROM transactions WHERE id = ?", [(row['id'],) for row in rows])
+    cursor.executemany(_AUDIT_QUERY, [(row['id'], 'void', _to_json(row), None, reason) for row in rows])
+    _apply_derived(cursor, rows)
+
+def void_transactions(transaction_ids: Sequence[int], reason: Optional[str] = None) -> int:
+    """
+    Anula (remove) vários lançamentos em uma única transação, guardando a linha
+    original na auditoria. Anular uma perna de transferência anula as duas.
+
+    Returns:
+        Número de lançamentos removidos.
+    """
+    with transaction() as conn:
+        cursor = conn.cursor()
+        rows = list(_with_transfer_legs(cursor, _fetch_rows(cursor, 'id', transaction_ids)).values())
+        _void_rows(cursor, rows, reason)
+
+    _after_commit(rows)
+    return len(rows)
+
+def void_transaction(transaction_id: int, reason: Optional[str] = None) -> int:
+    """Anula um lançamento (ou a transferência inteira, se for uma perna). Retorna o número de linhas removidas."""
+    return void_transactions([transaction_id], reason)
+
+def get_transaction_audit(transaction_id: int) -> List[Dict[str, Any]]:
+    """Histórico de correções de um lançamento, do mais antigo ao mais recente."""
+    rows = execute_read_query(
+        "SELECT * FROM transaction_audit WHERE transaction_id = ? ORDER BY id", (transaction_id,)
+    )
+    history = []
+    for row in rows:
+        entry = dict(row)
+        entry['before'] = json.loads(entry.pop('before_json'))
+        after = entry.pop('after_json')
+        entry['after'] = json.loads(after) if after else None
+        history.append(entry)
+    return history
 
 # Exemplo de uso:
 if __name__ == '__main__':
@@ -221,3 +582,23 @@ if __name__ == '__main__':
     
     balance_until_20 = get_account_balance(ACCOUNT_ID, until_date="2026-01-20")
     print(f"Saldo computado (até 2026-01-20): R$ {balance_until_20:.2f}") # Deve ser 500 - 50 = 450.00
+    
+    # 4. Transferências em lote, ligadas por grupo
+    groups = add_transfers([
+        {'date': f"2026-01-{day}", 'from_account_id': ACCOUNT_ID, 'to_account_id': COFRE_ACCOUNT_ID,
+         'amount': 10.00, 'description': "Varredura semanal", 'method': "PIX"}
+        for day in (23, 24, 25)
+    ])
+    print(f"\nTransferências em lote: {len(groups)} grupos; listadas para o cofre: "
+          f"{len(list_transfers(account_id=COFRE_ACCOUNT_ID))}")
+    reverse_transfer(groups[0], date="2026-01-26")
+    print(f"Estorno criado; pernas removidas ao anular outro grupo: {void_transfer(groups[1])}") # Esperado: 2
+    
+    # 5. Correções com auditoria: só a diferença é aplicada aos agregados
+    lunch = list_transactions({'account_id': ACCOUNT_ID, 'description': "Almoço no restaurante"})[0]
+    update_transaction(lunch['id'], amount=45.00, reason="Valor digitado errado")
+    print(f"\nSaldo após corrigir o almoço para 45.00: R$ {get_account_balance(ACCOUNT_ID):.2f}")
+    update_transactions([(row['id'], {'category': "Combustível"})
+                         for row in list_transactions({'category': "Transporte"})], reason="Recategorização")
+    void_transaction(lunch['id'], reason="Lançado em duplicidade")
+    print(f"Auditoria do almoço: {[entry['action'] for entry in get_transaction_audit(lunch['id'])]}")
@@ -0,0 +1,331 @@
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Sequence
+import numpy as np
+import db
+import depgraph
+
+# Teste de carga das páginas do app.py sem navegador. O Streamlit reexecuta o script
+# inteiro a cada interação; cada "fluxo" abaixo repete as chamadas do CORE que uma
+# reexecução da página faz (mesmas funções e mesmas queries do app.py):
+#   dashboard      -> Dashboard (snapshot único + gastos fora do padrão)
+#   submit         -> Lançamentos com "Salvar" (novo lançamento e a página inteira:
+#                     as quatro abas rodam em toda reexecução)
+#   history        -> Lançamentos com outro filtro no Histórico (conta, tipo, período)
+#   reconciliation -> Reconciliação (saldos por conta; às vezes "Reconciliar")
+# Sessões simultâneas rodam em threads (várias abas em um processo do Streamlit) ou
+# processos (várias instâncias). Para cada tamanho de base, mede vazão, latência
+# (p50/p95/p99) e taxa de erro, geral e por fluxo.
+
+FLOWS = ('dashboard', 'submit', 'history', 'reconciliation')
+DEFAULT_MIX = {'dashboard': 0.4, 'submit': 0.2, 'history': 0.25, 'reconciliation': 0.15}
+PERCENTILES = (50, 95, 99)
+DATE_FORMAT = "%Y-%m-%d"
+
+_CATEGORIES = ('Mercado', 'Alimentação', 'Transporte', 'Moradia', 'Lazer', 'Saúde')
+_METHODS = ('PIX', 'Cartão', 'Débito')
+_TYPE_FILTERS = (None, 'income', 'expense', 'transfer')
+
+
+def _seed(path: str, rows: int, years: int = 3) -> List[int]:
+    """Cria o banco com três contas e 'rows' lançamentos espalhados nos últimos 'years' anos."""
+    db.DATABASE_NAME = path
+    depgraph.invalidate_all()
+    db.initialize_db()
+    import config
+    operational = config.create_account("Operacional", "PF", "operacional")
+    accounts = [
+        operational,
+        config.create_account("Cofre", "PF", "cofre"),
+        config.create_account("Empresa", "PJ", "cofre"),
+    ]
+    rng = random.Random(rows)
+    today = datetime.now()
+    days = 365 * years
+    insert = """
+        INSERT INTO transactions (date, amount, transaction_type, account_id, category, description, method)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+    batch = []
+    for n in range(rows):
+        date = (today - timedelta(days=rng.randrange(days))).strftime(DATE_FORMAT)
+        if n % 20 == 0:
+            batch.append((date, round(rng.uniform(2000, 6000), 2), 'income', rng.choice(accounts),
+                          'Salário', f"Receita {n}", 'PIX'))
+        else:
+            batch.append((date, round(rng.uniform(5, 300), 2), 'expense', rng.choice(accounts),
+                          rng.choice(_CATEGORIES), f"Despesa {n}", rng.choice(_METHODS)))
+    with db.transaction() as conn:
+        conn.executemany(insert, batch)
+    return accounts
+
+
+def _percentiles(latencies: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99 e máximo, em milissegundos (zeros sem amostras)."""
+    if not latencies:
+        return {**{f"p{p}": 0.0 for p in PERCENTILES}, 'max': 0.0}
+    values = np.asarray(latencies) * 1000
+    result = {f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+    result['max'] = float(values.max())
+    return result
+
+
+# ============================================================================
+# FLUXOS (espelham uma reexecução de cada página do app.py)
+# ============================================================================
+
+def _rerun_prelude() -> str:
+    """Topo do app.py, executado em toda interação. Retorna a data de hoje."""
+    db.initialize_db()
+    return datetime.now().strftime(DATE_FORMAT)
+
+
+def _flow_dashboard(rng: random.Random) -> None:
+    import kpis
+    import anomalies
+    today = _rerun_prelude()
+    dashboard = kpis.get_dashboard_snapshot(today)
+    if dashboard['operational_account_id'] is not None:
+        anomalies.detect_anomalies(dashboard['week_start'])
+
+
+def _lancamentos_page(rng: random.Random, history_filter: Optional[Dict[str, Any]] = None) -> None:
+    """Página Lançamentos: formulário, Histórico, Resumo (cubo) e Calendário."""
+    import archive
+    import cube
+    import cashflow
+    today = _rerun_prelude()
+    db.execute_query("SELECT id, name FROM accounts WHERE active = 1 ORDER BY name")
+    db.execute_read_query("""
+        SELECT category FROM transactions WHERE category IS NOT NULL
+        UNION SELECT category FROM archived_summary WHERE category <> ''
+        ORDER BY category
+    """)
+
+    # Histórico (padrão do app: todas as contas, todos os tipos, últimos 30 dias)
+    history_filter = history_filter or {}
+    end = datetime.strptime(today, DATE_FORMAT)
+    start = (end - timedelta(days=history_filter.get('days', 30))).strftime(DATE_FORMAT)
+    query = "SELECT * FROM {transactions} WHERE 1=1"
+    params = []
+    if history_filter.get('account_id') is not None:
+        query += " AND account_id = ?"
+        params.append(history_filter['account_id'])
+    if history_filter.get('transaction_type') is not None:
+        query += " AND transaction_type = ?"
+        params.append(history_filter['transaction_type'])
+    query += " AND date BETWEEN ? AND ? ORDER BY date DESC, id DESC"
+    params += [start, today]
+    archive.query_ledger(query, tuple(params), since=start)
+
+    # Resumo (padrão: mês, por categoria, saídas do ano mais recente)
+    years = [row['period'] for row in cube.query_cube('year')]
+    cube.query_cube('month', ['category'], transaction_type='expense', **({'year': years[-1]} if years else {}))
+
+    # Calendário (padrão: últimos 365 dias, todas as contas)
+    flow = cashflow.get_daily_cash_flow((end - timedelta(days=364)).strftime(DATE_FORMAT), today)
+    cashflow.calendar_frame(flow, 'net')
+
+
+def _flow_submit(rng: random.Random) -> None:
+    import ledger
+    import config
+    operational = config.get_operational_account_id()
+    today = datetime.now().strftime(DATE_FORMAT)
+    # O clique em "Salvar" grava e a mesma reexecução desenha a página inteira
+    ledger.add_transaction(today, round(rng.uniform(5, 150), 2), 'expense', operational,
+                           rng.choice(_CATEGORIES), "Carga", rng.choice(_METHODS))
+    _lancamentos_page(rng)
+
+
+def _flow_history(rng: random.Random) -> None:
+    import config
+    accounts = [None] + [account['id'] for account in config.list_accounts()]
+    _lancamentos_page(rng, {
+        'account_id': rng.choice(accounts),
+        'transaction_type': rng.choice(_TYPE_FILTERS),
+        'days': rng.choice((30, 90, 365)),
+    })
+
+
+def _flow_reconciliation(rng: random.Random) -> None:
+    import dates
+    import anomalies
+    import ledger
+    import reconciliation
+    today = _rerun_prelude()
+    week_start, _ = dates.get_current_week_range(today)
+    accounts = db.execute_query("SELECT id, name FROM accounts WHERE active = 1 ORDER BY name")
+    anomalies.detect_anomalies(week_start)
+    balances = {}
+    for account in accounts:
+        balances[account['id']] = ledger.get_account_balance(account['id'])
+        db.execute_query(
+            "SELECT real_balance FROM reconciliations WHERE week_start = ? AND account_id = ?",
+            (week_start, account['id'])
+        )
+    if accounts and rng.random() < 0.2:  # "Reconciliar" em uma das contas
+        account_id = rng.choice(accounts)['id']
+        reconciliation.reconcile_account(week_start, account_id, balances[account_id])
+
+
+_FLOW_FUNCTIONS = {
+    'dashboard': _flow_dashboard,
+    'submit': _flow_submit,
+    'history': _flow_history,
+    'reconciliation': _flow_reconciliation,
+}
+
+
+def _session(path: str, session: int, iterations: int, mix: Dict[str, float],
+             think_time: float) -> Dict[str, Any]:
+    """Uma sessão: 'iterations' interações sorteadas pelo mix. Roda em thread ou processo."""
+    db.DATABASE_NAME = path
+    rng = random.Random(session)
+    flows, weights = zip(*mix.items())
+    samples = []  # (fluxo, segundos, erro ou None)
+    for _ in range(iterations):
+        flow = rng.choices(flows, weights)[0]
+        started = time.perf_counter()
+        try:
+            _FLOW_FUNCTIONS[flow](rng)
+            error = None
+        except Exception as e:  # a sessão segue, como o Streamlit depois de um erro na página
+            error = type(e).__name__
+        samples.append((flow, time.perf_counter() - started, error))
+        if think_time:
+            time.sleep(rng.uniform(0, 2 * think_time))
+    return {'samples': samples, 'stats': db.write_stats()}
+
+
+def run_load(
+    path: str,
+    sessions: int,
+    iterations: int = 50,
+    mode: str = 'threads',
+    mix: Optional[Dict[str, float]] = None,
+    think_time: float = 0.0
+) -> Dict[str, Any]:
+    """
+    Executa uma rodada de carga sobre um banco já populado (ver _seed).
+
+    Args:
+        path: Banco a usar (as interações de escrita ficam gravadas nele).
+        sessions: Sessões simultâneas.
+        iterations: Interações por sessão.
+        mode: 'threads' (sessões em um processo do Streamlit) ou 'processes' (várias instâncias).
+        mix: Peso de cada fluxo (padrão: DEFAULT_MIX).
+        think_time: Pausa média entre interações, em segundos (0: carga máxima).
+
+    Returns:
+        Dicionário com 'sessions', 'mode', 'requests', 'elapsed', 'throughput'
+        (interações/s), 'errors', 'error_rate', 'error_types', 'latency' (p50/p95/p99/max
+        em ms), 'flows' (o mesmo por fluxo), 'retries', 'lock_wait_max' e 'aggregates_ok'.
+    """
+    if mode not in ('threads', 'processes'):
+        raise ValueError("mode deve ser 'threads' ou 'processes'.")
+    mix = mix or DEFAULT_MIX
+    unknown = set(mix) - set(FLOWS)
+    if unknown:
+        raise ValueError(f"Fluxos desconhecidos: {', '.join(sorted(unknown))}.")
+    original = db.DATABASE_NAME
+    db.DATABASE_NAME = path
+    depgraph.invalidate_all()
+    db.reset_write_stats()
+    try:
+        pool_class = ThreadPoolExecutor if mode == 'threads' else ProcessPoolExecutor
+        started = time.perf_counter()
+        with pool_class(max_workers=sessions) as pool:
+            futures = [pool.submit(_session, path, s, iterations, mix, think_time) for s in range(sessions)]
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+        samples = [sample for result in results for sample in result['samples']]
+        if mode == 'threads':
+            stats = db.write_stats()  # as threads compartilham os contadores do processo
+        else:
+            stats = {'retries': sum(r['stats']['retries'] for r in results),
+                     'lock_wait_max': max(r['stats']['lock_wait_max'] for r in results)}
+        error_types = Counter(error for _, _, error in samples if error)
+        errors = sum(error_types.values())
+        flows = {}
+        for flow in FLOWS:
+            latencies = [seconds for name, seconds, _ in samples if name == flow]
+            flow_errors = sum(1 for name, _, error in samples if name == flow and error)
+            if latencies:
+                flows[flow] = {'count': len(latencies), 'errors': flow_errors, **_percentiles(latencies)}
+
+        from aggregates import verify_aggregates
+        return {
+            'sessions': sessions,
+            'mode': mode,
+            'requests': len(samples),
+            'elapsed': elapsed,
+            'throughput': len(samples) / elapsed if elapsed else 0.0,
+            'errors': errors,
+            'error_rate': errors / len(samples) if samples else 0.0,
+            'error_types': dict(error_types),
+            'latency': _percentiles([seconds for _, seconds, _ in samples]),
+            'flows': flows,
+            'retries': stats['retries'],
+            'lock_wait_max': stats['lock_wait_max'],
+            'aggregates_ok': not any(verify_aggregates().values()),
+        }
+    finally:
+        db.DATABASE_NAME = original
+        depgraph.invalidate_all()
+
+
+def load_curve(
+    data_sizes: Sequence[int] = (1000, 10000, 50000),
+    session_counts: Sequence[int] = (1, 4, 8),
+    iterations: int = 30,
+    modes: Sequence[str] = ('threads', 'processes'),
+    mix: Optional[Dict[str, float]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Roda run_load para cada tamanho de base, modo e número de sessões.
+
+    Cada tamanho usa um banco temporário novo (populado por _seed), reaproveitado
+    pelas rodadas desse tamanho e removido ao final.
+
+    Returns:
+        Lista de resultados de run_load, cada um com 'rows' (lançamentos antes da rodada).
+    """
+    runs = []
+    original = db.DATABASE_NAME
+    for rows in data_sizes:
+        fd, path = tempfile.mkstemp(suffix=".db", prefix="finance_os_load_")
+        os.close(fd)
+        try:
+            _seed(path, rows)
+            for mode in modes:
+                for sessions in session_counts:
+                    db.DATABASE_NAME = path
+                    current = db.execute_query("SELECT COUNT(*) AS n FROM transactions")[0]['n']
+                    runs.append({'rows': current, **run_load(path, sessions, iterations, mode, mix)})
+        finally:
+            db.DATABASE_NAME = original
+            depgraph.invalidate_all()
+            for suffix in ("", "-journal", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+    return runs
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    print(f"{'linhas':>7} {'modo':<10} {'sessões':>7} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'erros':>6}  agregados")
+    for run in load_curve(data_sizes=(1000, 10000), session_counts=(1, 4), iterations=20):
+        latency = run['latency']
+        print(f"{run['rows']:>7} {run['mode']:<10} {run['sessions']:>7} {run['throughput']:>7.1f} "
+              f"{latency['p50']:>6.1f}ms {latency['p95']:>6.1f}ms {latency['p99']:>6.1f}ms "
+              f"{run['error_rate']:>6.1%}  {run['aggregates_ok']}")
+        for flow, numbers in run['flows'].items():
+            print(f"{'':>27} {flow:<15} n={numbers['count']:<4} p50 {numbers['p50']:.1f}ms "
+                  f"p95 {numbers['p95']:.1f}ms p99 {numbers['p99']:.1f}ms erros {numbers['errors']}")
@@ -1,4 +1,5 @@
 import db
+import dates
 import ledger
 import kpis
 import planned
@@ -33,20 +34,14 @@ def setup_initial_data():
     )
     
     # Criar Fixos Planejados (para forecast)
-    planned.db.execute_insert(
-        "INSERT INTO planned_fixed (name, amount, frequency, due_day, account_id, category, active) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        ("Aluguel", 1500.00, "monthly", 5, op_id, "Moradia", 1)
-    )
-    planned.db.execute_insert(
-        "INSERT INTO planned_fixed (name, amount, frequency, due_day, account_id, category, active) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        ("Mensalidade Academia", 100.00, "monthly", 20, op_id, "Saúde", 1)
-    )
+    planned.add_planned_item("Aluguel", 1500.00, "monthly", op_id, due_day=5, category="Moradia")
+    planned.add_planned_item("Mensalidade Academia", 100.00, "monthly", op_id, due_day=20, category="Saúde")
     
     # Adicionar transações para 4 semanas (para média de variáveis)
     today = datetime.now().date()
     for i in range(4):
         date_in_week = today - timedelta(weeks=i)
-        week_start = forecast.dates.get_week_start(date_in_week.strftime(DATE_FORMAT))
+        week_start = dates.get_week_start(date_in_week.strftime(DATE_FORMAT))
         
         # Receita (Income)
         ledger.add_transaction(week_start, 2000.00, "income", op_id, "Salário", f"Salário Semanal {i+1}")
@@ -74,7 +69,7 @@ def demonstrate_ledger_and_kpis(op_id):
     
     # Despesas Variáveis da Semana Atual
     today = datetime.now().strftime(DATE_FORMAT)
-    week_start = forecast.dates.get_week_start(today)
+    week_start = dates.get_week_start(today)
     weekly_expenses = kpis.get_weekly_variable_expenses(week_start, op_id)
     print(f"Despesas Variáveis na Semana ({week_start}): R$ {weekly_expenses:.2f}")
     
@@ -91,13 +86,13 @@ def demonstrate_reconciliation(op_id):
     real_balance = computed_balance + 100.00
     
     today = datetime.now().strftime(DATE_FORMAT)
-    week_start = reconciliation.dates.get_week_start(today)
+    week_start = dates.get_week_start(today)
     
     reconciliation_id = reconciliation.reconcile_account(week_start, op_id, real_balance)
     
     # Verificar o resultado
     query = "SELECT * FROM reconciliations WHERE week_start = ? AND account_id = ?"
-    result = reconciliation.db.execute_query(query, (week_start, op_id))
+    result = db.execute_query(query, (week_start, op_id))
     
     print(f"Reconciliação registrada para a semana {week_start} (ID: {reconciliation_id})")
     print(f"  Saldo Real Informado: R$ {result[0]['real_balance']:.2f}")
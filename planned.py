@@ -1,11 +1,18 @@
-from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, date
+import depgraph
 # Tenta importar para testes diretos e para uso como módulo
 try:
-    from db import execute_query
+    from db import execute_read_query, execute_insert
+    from recurrence import expand, validate_rule
 except ImportError:
     import db
-    execute_query = db.execute_query
+    import recurrence
+    execute_read_query = db.execute_read_query
+    execute_insert = db.execute_insert
+    expand = recurrence.expand
+    validate_rule = recurrence.validate_rule
 
 DATE_FORMAT = "%Y-%m-%d"
 
@@ -17,9 +24,111 @@ def list_active_fixed() -> List[Dict[str, Any]]:
         Lista de itens fixos planejados como dicionários.
     """
     query = "SELECT * FROM planned_fixed WHERE active = 1"
-    results = execute_query(query)
+    results = execute_read_query(query)
     return [dict(row) for row in results]
 
+def add_planned_item(
+    name: str,
+    amount: float,
+    frequency: str,
+    account_id: int,
+    due_day: Optional[int] = None,
+    category: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    rrule: Optional[str] = None
+) -> int:
+    """
+    Cadastra um item planejado (despesa fixa recorrente).
+    
+    Args:
+        name: Nome do item (ex: 'Aluguel').
+        amount: Valor de cada ocorrência (sempre positivo).
+        frequency: 'monthly', 'weekly', 'biweekly', 'quarterly', 'yearly',
+                   'last_business_day' ou 'rrule' (ver recurrence.compile_rule).
+        account_id: ID da conta.
+        due_day: Dia de vencimento (1-31), ou dia da semana (1-7) para semanais sem start_date.
+        category: Categoria (opcional).
+        start_date: Início/âncora da recorrência (YYYY-MM-DD, opcional).
+        end_date: Fim da recorrência (YYYY-MM-DD, opcional).
+        rrule: Regra RFC 5545, quando frequency = 'rrule'.
+        
+    Returns:
+        O ID do item inserido.
+    """
+    validate_rule(frequency, due_day, start_date, rrule)
+    item_id = execute_insert(
+        """
+        INSERT INTO planned_fixed
+        (name, amount, frequency, due_day, account_id, category, active, start_date, end_date, rrule)
+        VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?)
+        """,
+        (name, amount, frequency, due_day, account_id, category, start_date, end_date, rrule)
+    )
+    depgraph.invalidate('planned_fixed')
+    return item_id
+
+def set_planned_item_active(item_id: int, active: bool) -> None:
+    """Ativa ou desativa um item planejado."""
+    execute_insert("UPDATE planned_fixed SET active = ? WHERE id = ?", (1 if active else 0, item_id))
+    depgraph.invalidate('planned_fixed')
+
+class _PlannedIndex:
+    """
+    Índice de intervalo das ocorrências de todos os itens ativos em um horizonte.
+    
+    As ocorrências ficam ordenadas por data com somas acumuladas, de forma que o
+    total de qualquer período dentro do horizonte sai de duas buscas binárias,
+    sem reexpandir as regras.
+    """
+    
+    def __init__(self, horizon_start: date, horizon_end: date, items: List[Dict[str, Any]]):
+        self.horizon_start = horizon_start
+        self.horizon_end = horizon_end
+        events = []
+        for item in items:
+            for due_date in expand(
+                item['frequency'], horizon_start, horizon_end,
+                item['due_day'], item.get('start_date'), item.get('end_date'), item.get('rrule')
+            ):
+                events.append((due_date.toordinal(), item))
+        events.sort(key=lambda event: event[0])
+        
+        self.ordinals = [ordinal for ordinal, _ in events]
+        self.items = [item for _, item in events]
+        self.prefix = [0.0]
+        for item in self.items:
+            self.prefix.append(self.prefix[-1] + item['amount'])
+    
+    def _bounds(self, start: date, end: date) -> tuple:
+        return bisect_left(self.ordinals, start.toordinal()), bisect_right(self.ordinals, end.toordinal())
+    
+    def total(self, start: date, end: date) -> float:
+        lo, hi = self._bounds(start, end)
+        return self.prefix[hi] - self.prefix[lo]
+    
+    def events(self, start: date, end: date) -> List[Dict[str, Any]]:
+        lo, hi = self._bounds(start, end)
+        events = []
+        for ordinal, item in zip(self.ordinals[lo:hi], self.items[lo:hi]):
+            event = item.copy()
+            event['due_date'] = date.fromordinal(ordinal).strftime(DATE_FORMAT)
+            events.append(event)
+        return events
+
+def _get_index(start_obj: date, end_obj: date) -> _PlannedIndex:
+    """
+    Índice das ocorrências para os anos cobertos pelo período (em cache até uma
+    alteração em planned_fixed).
+    """
+    horizon_start = date(start_obj.year, 1, 1)
+    horizon_end = date(end_obj.year, 12, 31)
+    return depgraph.cached(
+        ('planned_index', horizon_start.year, horizon_end.year),
+        [('planned_fixed',)],
+        lambda: _PlannedIndex(horizon_start, horizon_end, list_active_fixed())
+    )
+
 def generate_fixed_events(start_date: str, end_date: str) -> List[Dict[str, Any]]:
     """
     Converte registros de planned_fixed em eventos reais com datas concretas
@@ -30,42 +139,13 @@ def generate_fixed_events(start_date: str, end_date: str) -> List[Dict[str, Any]
         end_date: Data de fim do período (YYYY-MM-DD).
         
     Returns:
-        Lista de eventos fixos com a data de vencimento real.
+        Lista de eventos fixos com a data de vencimento real, ordenada por data.
     """
-    fixed_items = list_active_fixed()
-    fixed_events = []
-    
     start_obj = datetime.strptime(start_date, DATE_FORMAT).date()
     end_obj = datetime.strptime(end_date, DATE_FORMAT).date()
-    
-    # Iterar sobre o período mês a mês
-    current_date = start_obj
-    while current_date <= end_obj:
-        for item in fixed_items:
-            due_day = item['due_day']
-            
-            # Tenta criar a data de vencimento no mês atual
-            try:
-                due_date = current_date.replace(day=due_day)
-            except ValueError:
-                # Lida com meses que não têm o dia (ex: Fevereiro 30)
-                # Neste caso, o vencimento é no último dia do mês
-                due_date = current_date.replace(day=1) + timedelta(days=32)
-                due_date = due_date.replace(day=1) - timedelta(days=1)
-            
-            # Verifica se a data de vencimento está dentro do período desejado
-            if start_obj <= due_date <= end_obj:
-                event = item.copy()
-                event['due_date'] = due_date.strftime(DATE_FORMAT)
-                fixed_events.append(event)
-                
-        # Avança para o próximo mês
-        if current_date.month == 12:
-            current_date = current_date.replace(year=current_date.year + 1, month=1, day=1)
-        else:
-            current_date = current_date.replace(month=current_date.month + 1, day=1)
-            
-    return fixed_events
+    if end_obj < start_obj:
+        return []
+    return _get_index(start_obj, end_obj).events(start_obj, end_obj)
 
 def get_fixed_for_period(start_date: str, end_date: str) -> float:
     """
@@ -79,23 +159,13 @@ def get_fixed_for_period(start_date: str, end_date: str) -> float:
         O total de despesas fixas planejadas no período.
     """
     
-    # Para o MVP, assumimos frequência 'monthly' e o due_day é o dia de vencimento.
-    # O cálculo é feito iterando sobre os dias do período e verificando se o due_day
-    # de algum item fixo cai nesse dia.
-    
-    fixed_items = list_active_fixed()
-    total_fixed = 0.0
-    
+    # As regras são expandidas uma vez por horizonte (anos do período) e o total
+    # sai do índice de intervalo (somas acumuladas), sem reexpandir cada regra.
     start_obj = datetime.strptime(start_date, DATE_FORMAT).date()
     end_obj = datetime.strptime(end_date, DATE_FORMAT).date()
-    
-    # Usar a nova função generate_fixed_events para obter os eventos reais
-    fixed_events = generate_fixed_events(start_date, end_date)
-    
-    # Somar os valores dos eventos
-    total_fixed = sum(event['amount'] for event in fixed_events)
-    
-    return total_fixed
+    if end_obj < start_obj:
+        return 0.0
+    return _get_index(start_obj, end_obj).total(start_obj, end_obj)
 
 # Exemplo de uso:
 if __name__ == '__main__':
@@ -113,20 +183,14 @@ if __name__ == '__main__':
     conn.close()
     
     # Inserir fixos planejados
-    db.execute_insert(
-        "INSERT INTO planned_fixed (name, amount, frequency, due_day, account_id, category, active) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        ("Aluguel", 1500.00, "monthly", 5, ACCOUNT_ID, "Moradia", 1)
-    )
-    db.execute_insert(
-        "INSERT INTO planned_fixed (name, amount, frequency, due_day, account_id, category, active) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        ("Mensalidade Academia", 100.00, "monthly", 20, ACCOUNT_ID, "Saúde", 1)
-    )
+    add_planned_item("Aluguel", 1500.00, "monthly", ACCOUNT_ID, due_day=5, category="Moradia")
+    add_planned_item("Mensalidade Academia", 100.00, "monthly", ACCOUNT_ID, due_day=20, category="Saúde")
     
     # 1. Testar list_active_fixed
     active_fixed = list_active_fixed()
     print("Itens fixos ativos:")
     for item in active_fixed:
-        print(f"  {item['name']} - R$ {item['amount']:.2f} (Dia {item['due_day']})")
+        print(f"  {item['name']} - R$ {item['amount']:.2f} ({item['frequency']}, dia {item['due_day']})")
         
     # 2. Testar get_fixed_for_period
     # Período de 1 mês (Janeiro)
@@ -140,3 +204,15 @@ if __name__ == '__main__':
     end_date_feb = "2026-02-28"
     fixed_jan_feb = get_fixed_for_period(start_date_jan, end_date_feb)
     print(f"Total fixo planejado em Jan/Fev (2026-01-01 a 2026-02-28): R$ {fixed_jan_feb:.2f}") # Esperado: 1600 * 2 = 3200.00
+    
+    # 3. Outras recorrências: quinzenal e último dia útil
+    faxina_id = add_planned_item("Diarista", 200.00, "biweekly", ACCOUNT_ID, start_date="2026-01-09", category="Casa")
+    contador_id = add_planned_item("Contador", 300.00, "last_business_day", ACCOUNT_ID, category="Serviços")
+    for event in generate_fixed_events("2026-01-01", "2026-01-31"):
+        print(f"  {event['due_date']}: {event['name']} - R$ {event['amount']:.2f}")
+    fixed_jan_all = get_fixed_for_period(start_date_jan, end_date_jan)
+    print(f"Total fixo em Janeiro com novas recorrências: R$ {fixed_jan_all:.2f}") # Esperado: 1600 + 2 * 200 + 300 = 2300.00
+    
+    # Desfaz os itens extras para não afetar os demais exemplos
+    set_planned_item_active(faxina_id, False)
+    set_planned_item_active(contador_id, False)
@@ -1,21 +1,31 @@
-from typing import Dict, Any
-from datetime import datetime
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timedelta
 # Tenta importar para testes diretos e para uso como módulo
 try:
-    from db import execute_insert, execute_query
+    from db import execute_insert, execute_query, execute_read_query, execute_many_atomic
     from dates import get_week_start, get_week_end
     from ledger import get_account_balance
+    from archive import query_ledger
 except ImportError:
     import db
     import dates
     import ledger
+    import archive
     execute_insert = db.execute_insert
     execute_query = db.execute_query
+    execute_read_query = db.execute_read_query
+    execute_many_atomic = db.execute_many_atomic
     get_week_start = dates.get_week_start
+    get_week_end = dates.get_week_end
     get_account_balance = ledger.get_account_balance
+    query_ledger = archive.query_ledger
 
 DATE_FORMAT = "%Y-%m-%d"
 
+# Tolerância padrão (em dias) entre a data do extrato e a data do lançamento no ledger.
+MATCH_DATE_TOLERANCE_DAYS = 2
+
 def reconcile_account(week_start: str, account_id: int, real_balance: float) -> int:
     """
     Registra a reconciliação de uma conta para uma semana específica.
@@ -73,6 +83,196 @@ def reconcile_account(week_start: str, account_id: int, real_balance: float) ->
     
     return execute_insert(query, params)
 
+def backfill_reconciliations(account_id: Optional[int] = None) -> int:
+    """
+    Recalcula o saldo computado e o delta das reconciliações já registradas.
+
+    reconcile_account grava o saldo do momento do registro (simplificação do MVP).
+    Este job (pensado para rodar fora do horário de uso, ver cli.py) substitui esse
+    valor pelo saldo até o fim da semana reconciliada (week_end), o que também
+    atualiza reconciliações antigas após correções no ledger. O saldo real
+    informado pelo usuário nunca é alterado.
+
+    Args:
+        account_id: Conta a recalcular. Se None, todas.
+
+    Returns:
+        Número de reconciliações alteradas.
+    """
+    query = "SELECT * FROM reconciliations"
+    params = ()
+    if account_id is not None:
+        query += " WHERE account_id = ?"
+        params = (account_id,)
+    updates = []
+    for row in execute_read_query(query, params):
+        computed_balance = get_account_balance(row['account_id'], until_date=row['week_end'])
+        delta = row['real_balance'] - computed_balance
+        if abs(computed_balance - row['computed_balance']) > 0.005:
+            notes = (f"Delta de R$ {delta:.2f} (Real - Computado). Reconciliação para o período "
+                     f"{row['week_start']} a {row['week_end']} (saldo computado até {row['week_end']}).")
+            updates.append((computed_balance, delta, notes, row['id']))
+    if updates:
+        execute_many_atomic([
+            ("UPDATE reconciliations SET computed_balance = ?, delta = ?, notes = ? WHERE id = ?", params)
+            for params in updates
+        ])
+    return len(updates)
+
+def _signed_cents(row: Dict[str, Any]) -> int:
+    """Valor com sinal (centavos) do ponto de vista da conta: entradas positivas, saídas negativas."""
+    cents = int(round(row['amount'] * 100))
+    return cents if row['transaction_type'] == 'income' else -cents
+
+
+def match_statement_lines(
+    statement_lines: List[Dict[str, Any]],
+    ledger_rows: List[Dict[str, Any]],
+    date_tolerance_days: int = MATCH_DATE_TOLERANCE_DAYS
+) -> Dict[str, Any]:
+    """
+    Alinha linhas de extrato com lançamentos do ledger por valor e data.
+
+    As duas listas são agrupadas pelo valor com sinal e ordenadas por data; dentro
+    de cada grupo, um par de ponteiros casa o lançamento mais antigo ainda livre
+    com a linha de extrato mais antiga, desde que as datas estejam a até
+    'date_tolerance_days' dias. Para pontos em uma reta com tolerância simétrica,
+    esse casamento guloso maximiza o número de pares, sem laços aninhados.
+
+    Args:
+        statement_lines: Linhas do extrato ('date', 'amount' positivo, 'transaction_type').
+        ledger_rows: Lançamentos do ledger da mesma conta.
+        date_tolerance_days: Diferença máxima de datas para considerar um casamento.
+
+    Returns:
+        Dicionário com 'matched' (pares {'statement', 'ledger', 'days_apart'}),
+        'missing' (linhas do extrato sem lançamento) e 'extra' (lançamentos sem
+        linha no extrato).
+    """
+    def group(rows):
+        grouped = defaultdict(list)
+        for row in rows:
+            ordinal = datetime.strptime(row['date'], DATE_FORMAT).toordinal()
+            grouped[_signed_cents(row)].append((ordinal, row))
+        for items in grouped.values():
+            items.sort(key=lambda item: item[0])
+        return grouped
+
+    statement_groups = group(statement_lines)
+    ledger_groups = group(ledger_rows)
+
+    matched, missing, extra = [], [], []
+    for cents in statement_groups.keys() | ledger_groups.keys():
+        stmt_items = statement_groups.get(cents, [])
+        ledger_items = ledger_groups.get(cents, [])
+        i = j = 0
+        while i < len(stmt_items) and j < len(ledger_items):
+            stmt_ordinal, stmt_row = stmt_items[i]
+            ledger_ordinal, ledger_row = ledger_items[j]
+            if abs(stmt_ordinal - ledger_ordinal) <= date_tolerance_days:
+                matched.append({
+                    'statement': stmt_row,
+                    'ledger': ledger_row,
+                    'days_apart': abs(stmt_ordinal - ledger_ordinal),
+                })
+                i += 1
+                j += 1
+            elif ledger_ordinal < stmt_ordinal:
+                extra.append(ledger_row)
+                j += 1
+            else:
+                missing.append(stmt_row)
+                i += 1
+        missing.extend(row for _, row in stmt_items[i:])
+        extra.extend(row for _, row in ledger_items[j:])
+
+    return {'matched': matched, 'missing': missing, 'extra': extra}
+
+
+def match_statement(
+    week_start: str,
+    account_id: int,
+    statement_lines: List[Dict[str, Any]],
+    date_tolerance_days: int = MATCH_DATE_TOLERANCE_DAYS
+) -> Dict[str, Any]:
+    """
+    Compara o extrato de uma semana com o ledger da conta e explica o delta.
+
+    Extrato e ledger são vistos na semana ampliada pela tolerância (o ledger em uma
+    única query), para que movimentos na virada da semana ainda casem. O casamento
+    é feito em duas passadas: primeiro só linhas e lançamentos DENTRO da semana;
+    depois, o que sobrou contra os itens das semanas vizinhas. Assim um lançamento
+    vizinho nunca toma a linha de um lançamento da própria semana. Só itens da
+    semana são reportados em 'missing' e 'extra'; pares só de semanas vizinhas são
+    descartados.
+
+    Args:
+        week_start: Data de início da semana (Segunda-feira, YYYY-MM-DD).
+        account_id: ID da conta.
+        statement_lines: Linhas do extrato (ver importer.parse_statement_csv).
+        date_tolerance_days: Diferença máxima de datas para considerar um casamento.
+
+    Returns:
+        O resultado de match_statement_lines, acrescido de:
+        - 'missing_total': soma com sinal das linhas do extrato ausentes no ledger;
+        - 'extra_total': soma com sinal dos lançamentos ausentes no extrato;
+        - 'attributed_delta': missing_total - extra_total (quanto do delta é explicado);
+        - 'recorded_delta': delta da reconciliação registrada para a semana (ou None);
+        - 'unexplained_delta': recorded_delta - attributed_delta (ou None).
+    """
+    week_end = get_week_end(week_start)
+    tolerance = timedelta(days=date_tolerance_days)
+    window_start = (datetime.strptime(week_start, DATE_FORMAT) - tolerance).strftime(DATE_FORMAT)
+    window_end = (datetime.strptime(week_end, DATE_FORMAT) + tolerance).strftime(DATE_FORMAT)
+
+    query = """
+        SELECT id, date, amount, transaction_type, category, description, method
+        FROM {transactions}
+        WHERE account_id = ? AND date BETWEEN ? AND ?
+    """
+    ledger_rows = [dict(row) for row in query_ledger(query, (account_id, window_start, window_end), since=window_start)]
+    window_lines = [line for line in statement_lines if window_start <= line['date'] <= window_end]
+
+    def in_week(row):
+        return week_start <= row['date'] <= week_end
+
+    first = match_statement_lines(
+        [line for line in window_lines if in_week(line)],
+        [row for row in ledger_rows if in_week(row)],
+        date_tolerance_days
+    )
+    second = match_statement_lines(
+        first['missing'] + [line for line in window_lines if not in_week(line)],
+        first['extra'] + [row for row in ledger_rows if not in_week(row)],
+        date_tolerance_days
+    )
+    result = {
+        'matched': first['matched'] + [
+            pair for pair in second['matched'] if in_week(pair['statement']) or in_week(pair['ledger'])
+        ],
+        'missing': [line for line in second['missing'] if in_week(line)],
+        'extra': [row for row in second['extra'] if in_week(row)],
+    }
+
+    missing_total = sum(_signed_cents(row) for row in result['missing']) / 100.0
+    extra_total = sum(_signed_cents(row) for row in result['extra']) / 100.0
+    attributed_delta = missing_total - extra_total
+
+    recon = execute_query(
+        "SELECT delta FROM reconciliations WHERE week_start = ? AND account_id = ?",
+        (week_start, account_id)
+    )
+    recorded_delta = recon[0]['delta'] if recon else None
+
+    result.update({
+        'missing_total': missing_total,
+        'extra_total': extra_total,
+        'attributed_delta': attributed_delta,
+        'recorded_delta': recorded_delta,
+        'unexplained_delta': recorded_delta - attributed_delta if recorded_delta is not None else None,
+    })
+    return result
+
 # Exemplo de uso:
 if __name__ == '__main__':
     # Importar db para garantir que o banco esteja inicializado e populado
@@ -106,3 +306,14 @@ if __name__ == '__main__':
     print(f"  Saldo Computado: R$ {result[0]['computed_balance']:.2f}")
     print(f"  Delta: R$ {result[0]['delta']:.2f}") # Esperado: 650.00 - 600.00 = 50.00
     print(f"  Notas: {result[0]['notes']}")
+
+    # 4. Casamento extrato x ledger para a semana
+    statement = [
+        {'date': week_start, 'amount': 40.00, 'transaction_type': 'expense', 'description': 'Mercado'},
+        {'date': week_start, 'amount': 90.00, 'transaction_type': 'income', 'description': 'Estorno'},
+    ]
+    ledger.add_transaction(week_start, 40.00, "expense", ACCOUNT_ID, "Alimentação", "Mercado")
+    match = match_statement(week_start, ACCOUNT_ID, statement)
+    print(f"\nCasamento do extrato: {len(match['matched'])} casados, "
+          f"{len(match['missing'])} ausentes no ledger, {len(match['extra'])} sem extrato")
+    print(f"  Delta atribuído: R$ {match['attributed_delta']:.2f}")
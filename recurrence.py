@@ -0,0 +1,144 @@
+from functools import lru_cache
+from typing import List, Optional
+from datetime import datetime, date
+from dateutil.rrule import (
+    rrule, rrulestr, WEEKLY, MONTHLY, YEARLY, MO, TU, WE, TH, FR, SA, SU
+)
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# Frequências aceitas em planned_fixed.frequency
+FREQUENCIES = ('monthly', 'weekly', 'biweekly', 'quarterly', 'yearly', 'last_business_day', 'rrule')
+
+# Âncora usada quando o item não tem start_date (uma Segunda-feira).
+# Regras sem start_date não geram ocorrências antes desta data.
+DEFAULT_ANCHOR = "2000-01-03"
+
+_WEEKDAYS = (MO, TU, WE, TH, FR, SA, SU)
+
+
+def _month_day(due_day: int):
+    """
+    Parâmetros de rrule para "dia due_day do mês, ou o último dia se o mês for mais curto"
+    (mesma regra do planned.generate_fixed_events original: Fevereiro 30 -> 28/29).
+    """
+    if due_day <= 28:
+        return {'bymonthday': due_day}
+    return {'bymonthday': tuple(range(28, due_day + 1)), 'bysetpos': -1}
+
+
+def validate_rule(
+    frequency: str,
+    due_day: Optional[int] = None,
+    start_date: Optional[str] = None,
+    rrule_text: Optional[str] = None
+) -> None:
+    """
+    Valida os parâmetros de uma regra de recorrência.
+
+    Raises:
+        ValueError: Se a combinação de parâmetros for inválida.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Frequência inválida: {frequency}. Use {', '.join(FREQUENCIES)}.")
+    if frequency in ('monthly', 'quarterly', 'yearly') and not (due_day and 1 <= due_day <= 31):
+        raise ValueError("due_day (1-31) é obrigatório para frequências mensais, trimestrais e anuais.")
+    if frequency in ('weekly', 'biweekly') and not start_date and not (due_day and 1 <= due_day <= 7):
+        raise ValueError("Frequências semanais exigem start_date ou due_day (1 = Segunda ... 7 = Domingo).")
+    if frequency == 'rrule':
+        if not rrule_text:
+            raise ValueError("A frequência 'rrule' exige o texto da regra (RFC 5545).")
+        rrulestr(rrule_text, dtstart=datetime.strptime(start_date or DEFAULT_ANCHOR, DATE_FORMAT))
+
+
+@lru_cache(maxsize=8192)
+def compile_rule(
+    frequency: str,
+    due_day: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    rrule_text: Optional[str] = None
+):
+    """
+    Compila (e guarda em cache) o objeto rrule de um item planejado.
+
+    Regras:
+        monthly           -> todo mês no due_day (ou no último dia do mês)
+        quarterly         -> a cada 3 meses no due_day, a partir do mês de start_date
+        yearly            -> todo ano no mês de start_date, no due_day
+        weekly / biweekly -> no dia da semana de start_date (ou due_day: 1 = Segunda ... 7 = Domingo)
+        last_business_day -> último dia útil (Seg-Sex) do mês; feriados não são considerados
+        rrule             -> regra RFC 5545 livre (ex: 'FREQ=MONTHLY;BYDAY=1MO'); pode ter
+                             EXDATE/RDATE ou várias RRULE (vira um rruleset)
+
+    Para 'rrule', end_date NÃO entra no objeto compilado (um rruleset não tem
+    replace(), e o UNTIL do próprio texto pode ser mais cedo): expand() corta as
+    ocorrências em end_date, e vale o limite que vier primeiro.
+
+    Returns:
+        Objeto rrule/rruleset do dateutil, com cache de ocorrências habilitado.
+    """
+    dtstart = datetime.strptime(start_date or DEFAULT_ANCHOR, DATE_FORMAT)
+    until = datetime.strptime(end_date, DATE_FORMAT) if end_date else None
+
+    if frequency == 'monthly':
+        return rrule(MONTHLY, dtstart=dtstart, until=until, cache=True, **_month_day(due_day))
+    if frequency == 'quarterly':
+        return rrule(MONTHLY, interval=3, dtstart=dtstart.replace(day=1), until=until, cache=True,
+                     **_month_day(due_day))
+    if frequency == 'yearly':
+        return rrule(YEARLY, bymonth=dtstart.month, dtstart=dtstart.replace(day=1), until=until, cache=True,
+                     **_month_day(due_day))
+    if frequency in ('weekly', 'biweekly'):
+        interval = 2 if frequency == 'biweekly' else 1
+        weekday = _WEEKDAYS[dtstart.weekday()] if start_date else _WEEKDAYS[due_day - 1]
+        return rrule(WEEKLY, interval=interval, byweekday=weekday, dtstart=dtstart, until=until, cache=True)
+    if frequency == 'last_business_day':
+        return rrule(MONTHLY, byweekday=(MO, TU, WE, TH, FR), bysetpos=-1, dtstart=dtstart, until=until,
+                     cache=True)
+    if frequency == 'rrule':
+        return rrulestr(rrule_text, dtstart=dtstart, cache=True)
+    raise ValueError(f"Frequência inválida: {frequency}")
+
+
+def expand(
+    frequency: str,
+    start: date,
+    end: date,
+    due_day: Optional[int] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    rrule_text: Optional[str] = None
+) -> List[date]:
+    """
+    Retorna as datas de ocorrência de uma regra dentro de [start, end] (inclusive),
+    sem passar de end_date.
+    """
+    rule = compile_rule(frequency, due_day, start_date, end_date, rrule_text)
+    if end_date:
+        end = min(end, datetime.strptime(end_date, DATE_FORMAT).date())
+    if end < start:
+        return []
+    occurrences = rule.between(
+        datetime.combine(start, datetime.min.time()),
+        datetime.combine(end, datetime.min.time()),
+        inc=True
+    )
+    return [occurrence.date() for occurrence in occurrences]
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    start = date(2026, 1, 1)
+    end = date(2026, 3, 31)
+    print("Mensal dia 31:", [d.isoformat() for d in expand('monthly', start, end, due_day=31)])
+    print("Quinzenal:", [d.isoformat() for d in expand('biweekly', start, end, start_date="2026-01-09")][:4])
+    print("Último dia útil:", [d.isoformat() for d in expand('last_business_day', start, end)])
+    print("Trimestral dia 10:", [d.isoformat() for d in expand('quarterly', date(2026, 1, 1), date(2026, 12, 31), due_day=10, start_date="2026-02-01")])
+    print("RRULE (1ª segunda):", [d.isoformat() for d in expand('rrule', start, end, rrule_text="FREQ=MONTHLY;BYDAY=1MO")])
+    print("RRULE com EXDATE até 15/03:", [d.isoformat() for d in expand(
+        'rrule', start, end, start_date="2026-01-05", end_date="2026-03-15",
+        rrule_text="RRULE:FREQ=MONTHLY;BYDAY=1MO\nEXDATE:20260202T000000"
+    )])
+    print("UNTIL do texto antes de end_date:", [d.isoformat() for d in expand(
+        'rrule', start, end, end_date="2026-12-31", rrule_text="FREQ=MONTHLY;BYDAY=1MO;UNTIL=20260220"
+    )])
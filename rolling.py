@@ -0,0 +1,175 @@
+from typing import Optional, Sequence
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from dates import get_week_start, get_week_end
+    from archive import query_ledger
+except ImportError:
+    import dates
+    import archive
+    query_ledger = archive.query_ledger
+    get_week_start = dates.get_week_start
+    get_week_end = dates.get_week_end
+
+DATE_FORMAT = "%Y-%m-%d"
+
+
+def get_spend_series(
+    start_date: str,
+    end_date: str,
+    account_id: Optional[int] = None,
+    freq: str = 'D',
+    transaction_type: str = 'expense'
+) -> pd.Series:
+    """
+    Retorna a série densa de valores (diária ou semanal) em uma única query agrupada.
+
+    Dias sem lançamento entram com 0. Na série semanal ('W'), o período é estendido
+    para semanas completas (Segunda a Domingo) e cada ponto é indexado pela Segunda-feira.
+
+    Args:
+        start_date: Data inicial (YYYY-MM-DD).
+        end_date: Data final (YYYY-MM-DD).
+        account_id: ID da conta. Se None, considera todas as contas.
+        freq: 'D' (diária) ou 'W' (semanal).
+        transaction_type: Tipo somado (padrão: 'expense').
+
+    Returns:
+        pd.Series de floats indexada por data.
+    """
+    if freq not in ('D', 'W'):
+        raise ValueError("freq deve ser 'D' ou 'W'.")
+    if freq == 'W':
+        start_date = get_week_start(start_date)
+        end_date = get_week_end(end_date)
+
+    query = """
+        SELECT date, SUM(amount) AS total
+        FROM {transactions}
+        WHERE transaction_type = ?
+          AND date BETWEEN ? AND ?
+    """
+    params = [transaction_type, start_date, end_date]
+    if account_id is not None:
+        query += " AND account_id = ?"
+        params.append(account_id)
+    query += " GROUP BY date"
+    rows = query_ledger(query, tuple(params), since=start_date)
+
+    index = pd.date_range(start_date, end_date, freq='D')
+    values = np.zeros(len(index))
+    if rows:
+        start_ordinal = datetime.strptime(start_date, DATE_FORMAT).toordinal()
+        offsets = np.fromiter(
+            (datetime.strptime(row['date'], DATE_FORMAT).toordinal() - start_ordinal for row in rows),
+            dtype=np.int64, count=len(rows)
+        )
+        totals = np.fromiter((row['total'] for row in rows), dtype=float, count=len(rows))
+        values[offsets] = totals
+
+    if freq == 'W':
+        # Período alinhado em semanas completas: soma de 7 em 7 dias
+        return pd.Series(values.reshape(-1, 7).sum(axis=1), index=index[::7])
+    return pd.Series(values, index=index)
+
+
+def rolling_stats(
+    series: pd.Series,
+    window: int,
+    span: Optional[int] = None,
+    quantiles: Sequence[float] = (0.5, 0.9)
+) -> pd.DataFrame:
+    """
+    Calcula estatísticas móveis de uma série em passagens vetorizadas.
+
+    Args:
+        series: Série de valores (ver get_spend_series).
+        window: Tamanho da janela (em pontos da série).
+        span: Span da média exponencial. Se None, usa 'window'.
+        quantiles: Percentis móveis a calcular (0 a 1).
+
+    Returns:
+        DataFrame com as colunas 'sma', 'ewma', 'std' e 'p<percentil>' (ex: 'p50', 'p90').
+        Os primeiros window - 1 pontos de sma/std/percentis são NaN.
+    """
+    rolling = series.rolling(window=window, min_periods=window)
+    stats = pd.DataFrame({
+        'sma': rolling.mean(),
+        'ewma': series.ewm(span=span or window, adjust=False).mean(),
+        'std': rolling.std(),
+    })
+    for q in quantiles:
+        stats[f"p{int(round(q * 100))}"] = rolling.quantile(q)
+    return stats
+
+
+def seasonality_by_weekday(series: pd.Series) -> pd.Series:
+    """
+    Média por dia da semana (0 = Segunda ... 6 = Domingo) de uma série diária,
+    dividida pela média geral (1.0 = dia típico).
+    """
+    overall = series.mean()
+    by_weekday = series.groupby(series.index.dayofweek).mean().reindex(range(7), fill_value=0.0)
+    return by_weekday / overall if overall else by_weekday * 0.0
+
+
+def seasonality_by_day_of_month(series: pd.Series) -> pd.Series:
+    """
+    Média por dia do mês (1 a 31) de uma série diária, dividida pela média geral.
+    """
+    overall = series.mean()
+    by_day = series.groupby(series.index.day).mean().reindex(range(1, 32), fill_value=0.0)
+    return by_day / overall if overall else by_day * 0.0
+
+
+def average_weekly_spend(account_id: int, num_weeks: int = 4, as_of: Optional[str] = None) -> float:
+    """
+    Média semanal de despesas nas 'num_weeks' semanas que terminam na semana de 'as_of'
+    (a semana de referência entra na média), com uma única query.
+
+    Args:
+        account_id: ID da conta.
+        num_weeks: Número de semanas da janela.
+        as_of: Data de referência (YYYY-MM-DD). Se None, usa a data atual.
+
+    Returns:
+        A média semanal (valor positivo).
+    """
+    if num_weeks <= 0:
+        return 0.0
+    if as_of is None:
+        as_of = datetime.now().strftime(DATE_FORMAT)
+    first_week = (datetime.strptime(as_of, DATE_FORMAT) - timedelta(weeks=num_weeks - 1)).strftime(DATE_FORMAT)
+    weekly = get_spend_series(first_week, as_of, account_id, freq='W')
+    return float(weekly.sum()) / num_weeks
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import db
+    import ledger
+    db.initialize_db()
+
+    ACCOUNT_ID = 1
+
+    # Oito semanas de gastos: mais altos às sextas-feiras
+    start = datetime.strptime("2026-01-05", DATE_FORMAT)  # Segunda-feira
+    for day in range(56):
+        date = start + timedelta(days=day)
+        amount = 80.00 if date.weekday() == 4 else 20.00
+        ledger.add_transaction(date.strftime(DATE_FORMAT), amount, "expense", ACCOUNT_ID, "Simulação", "Gasto diário")
+
+    daily = get_spend_series("2026-01-05", "2026-03-01", ACCOUNT_ID)
+    weekly = get_spend_series("2026-01-05", "2026-03-01", ACCOUNT_ID, freq='W')
+    print(f"Série diária: {len(daily)} dias; série semanal: {len(weekly)} semanas")
+
+    stats = rolling_stats(weekly, window=4)
+    print("\nEstatísticas móveis (4 semanas):")
+    print(stats.tail(3).round(2))
+
+    print("\nSazonalidade por dia da semana (Seg..Dom):")
+    print(seasonality_by_weekday(daily).round(2).tolist())
+
+    avg = average_weekly_spend(ACCOUNT_ID, num_weeks=4, as_of="2026-03-01")
+    print(f"\nMédia semanal (4 semanas até 2026-03-01): R$ {avg:.2f}")
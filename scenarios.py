@@ -0,0 +1,178 @@
+from typing import List, Dict, Any, Optional, Sequence, Union
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from planned import list_active_fixed
+    from recurrence import expand, validate_rule
+    from forecast import get_current_cash, get_average_weekly_variable_expenses
+except ImportError:
+    import planned
+    import recurrence
+    import forecast
+    list_active_fixed = planned.list_active_fixed
+    expand = recurrence.expand
+    validate_rule = recurrence.validate_rule
+    get_current_cash = forecast.get_current_cash
+    get_average_weekly_variable_expenses = forecast.get_average_weekly_variable_expenses
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# Um cenário é um dicionário de alterações sobre o estado atual (nada é gravado no banco):
+#   'name'            -> nome do cenário (obrigatório)
+#   'remove'          -> itens planejados a desconsiderar (id ou nome)
+#   'scale'           -> {id ou nome: fator} (ex: reajuste de 10% -> 1.1)
+#   'add'             -> novos itens, com os campos de planned.add_planned_item
+#                        ('name', 'amount', 'frequency', 'due_day', 'start_date', ...)
+#   'variable_weekly' -> taxa semanal de despesas variáveis (substitui a média de 4 semanas;
+#                        ex: o teto semanal, para simular "gastar o teto toda semana")
+#   'variable_scale'  -> fator sobre a taxa semanal (ex: 0.8 = gastar 20% menos)
+#   'cash_delta'      -> ajuste pontual no saldo inicial (ex: venda de um bem)
+
+ItemRef = Union[int, str]
+
+
+def _matches(item: Dict[str, Any], ref: ItemRef) -> bool:
+    return item.get('id') == ref if isinstance(ref, int) else item['name'] == ref
+
+
+def _occurrence_matrix(items: List[Dict[str, Any]], start: datetime, days: int) -> np.ndarray:
+    """Matriz itens x dias com o valor de cada ocorrência no dia (0 nos demais)."""
+    matrix = np.zeros((len(items), days + 1))
+    end = start + timedelta(days=days)
+    for row, item in enumerate(items):
+        for due_date in expand(
+            item['frequency'], start.date(), end.date(),
+            item.get('due_day'), item.get('start_date'), item.get('end_date'), item.get('rrule')
+        ):
+            matrix[row, (due_date - start.date()).days] += item['amount']
+    return matrix
+
+
+def evaluate_scenarios(
+    scenarios: Sequence[Dict[str, Any]],
+    days: int = 30,
+    as_of: Optional[str] = None,
+    include_base: bool = True
+) -> Dict[str, Any]:
+    """
+    Avalia vários cenários "e se" do forecast de uma só vez, sem alterar o banco.
+
+    O estado base (saldo atual, itens planejados ativos e média semanal de variáveis)
+    é lido uma única vez. Cada cenário vira uma linha de pesos sobre os itens
+    (0 = removido, fator = escalado, novos itens só no seu cenário) e uma taxa
+    variável; o saldo diário de todos os cenários sai de um produto de matrizes
+    (cenários x itens) @ (itens x dias) seguido de uma soma acumulada.
+
+    Com include_base e nenhuma alteração, o saldo final da linha 'Base' é igual ao
+    forecasted_cash de forecast.forecast_cash_flow(days, as_of).
+
+    Args:
+        scenarios: Lista de cenários (ver comentário no topo do módulo).
+        days: Horizonte da previsão, em dias.
+        as_of: Data de referência (YYYY-MM-DD). Se None, usa a data atual.
+        include_base: Se True, inclui o cenário 'Base' (sem alterações) na primeira linha.
+
+    Returns:
+        Dicionário com:
+            'balances': DataFrame cenários x datas com o saldo projetado ao fim de cada dia;
+            'summary': DataFrame por cenário com 'planned_fixed_expenses',
+                       'projected_variable_expenses', 'forecasted_cash', 'min_balance'
+                       e 'min_balance_date'.
+    """
+    scenarios = ([{'name': 'Base'}] if include_base else []) + list(scenarios)
+    names = [scenario['name'] for scenario in scenarios]
+    if len(set(names)) != len(names):
+        raise ValueError("Os nomes dos cenários devem ser únicos.")
+
+    start = datetime.strptime(as_of, DATE_FORMAT) if as_of else datetime.now()
+    start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    base_cash = get_current_cash(as_of)
+    base_weekly = get_average_weekly_variable_expenses(num_weeks=4, as_of=as_of)
+
+    # Colunas: itens ativos + itens adicionados por qualquer cenário
+    items = list_active_fixed()
+    base_count = len(items)
+    added_owner = []
+    for index, scenario in enumerate(scenarios):
+        for item in scenario.get('add', []):
+            validate_rule(item['frequency'], item.get('due_day'), item.get('start_date'), item.get('rrule'))
+            items.append(item)
+            added_owner.append(index)
+
+    weights = np.zeros((len(scenarios), len(items)))
+    weights[:, :base_count] = 1.0
+    for column, owner in enumerate(added_owner, start=base_count):
+        weights[owner, column] = 1.0
+
+    weekly_rates = np.empty(len(scenarios))
+    cash = np.full(len(scenarios), base_cash)
+    for row, scenario in enumerate(scenarios):
+        for ref in scenario.get('remove', []):
+            hits = [c for c in range(base_count) if _matches(items[c], ref)]
+            if not hits:
+                raise ValueError(f"Cenário '{scenario['name']}': item planejado não encontrado: {ref}")
+            weights[row, hits] = 0.0
+        for ref, factor in scenario.get('scale', {}).items():
+            hits = [c for c in range(base_count) if _matches(items[c], ref)]
+            if not hits:
+                raise ValueError(f"Cenário '{scenario['name']}': item planejado não encontrado: {ref}")
+            weights[row, hits] *= factor
+        weekly_rates[row] = scenario.get('variable_weekly', base_weekly) * scenario.get('variable_scale', 1.0)
+        cash[row] += scenario.get('cash_delta', 0.0)
+
+    fixed_by_day = weights @ _occurrence_matrix(items, start, days)  # cenários x (days + 1)
+    # Variáveis acumulam a partir do dia seguinte (forecast: média semanal * dias / 7)
+    variable_by_day = np.outer(weekly_rates / 7.0, np.r_[0.0, np.ones(days)])
+    balances = cash[:, None] - np.cumsum(fixed_by_day + variable_by_day, axis=1)
+
+    dates = [(start + timedelta(days=offset)).strftime(DATE_FORMAT) for offset in range(days + 1)]
+    min_columns = balances.argmin(axis=1)
+    summary = pd.DataFrame(
+        {
+            'planned_fixed_expenses': fixed_by_day.sum(axis=1),
+            'projected_variable_expenses': variable_by_day.sum(axis=1),
+            'forecasted_cash': balances[:, -1],
+            'min_balance': balances.min(axis=1),
+            'min_balance_date': [dates[column] for column in min_columns],
+        },
+        index=pd.Index(names, name='scenario'),
+    )
+    return {
+        'balances': pd.DataFrame(balances, index=pd.Index(names, name='scenario'), columns=dates),
+        'summary': summary,
+    }
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import db
+    import ledger
+    import planned
+    import forecast
+    db.initialize_db()
+
+    OP_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Operacional PF", "PF", "operacional", 1)
+    )
+    db.execute_insert("UPDATE accounts SET role = 'cofre' WHERE role = 'operacional' AND id <> ?", (OP_ID,))
+    ledger.add_transaction("2026-01-02", 5000.00, "income", OP_ID, "Salário", "Salário")
+    for week in range(4):
+        date = (datetime(2026, 1, 12) + timedelta(weeks=week)).strftime(DATE_FORMAT)
+        ledger.add_transaction(date, 200.00, "expense", OP_ID, "Mercado", "Compras")
+    planned.add_planned_item("Aluguel", 1500.00, "monthly", OP_ID, due_day=5)
+    planned.add_planned_item("Academia", 100.00, "monthly", OP_ID, due_day=10)
+
+    result = evaluate_scenarios([
+        {'name': 'Cancelar academia', 'remove': ['Academia']},
+        {'name': 'Aluguel +10%', 'scale': {'Aluguel': 1.1}},
+        {'name': 'Gastar o teto (450/semana)', 'variable_weekly': 450.00},
+        {'name': 'Novo aluguel', 'remove': ['Aluguel'],
+         'add': [{'name': 'Aluguel novo', 'amount': 1800.00, 'frequency': 'monthly', 'due_day': 15}]},
+    ], days=30, as_of="2026-02-01")
+    print(result['summary'].round(2).to_string())
+
+    base = forecast.forecast_cash_flow(days=30, as_of="2026-02-01")
+    print(f"\nBase == forecast_cash_flow? "
+          f"{abs(result['summary'].loc['Base', 'forecasted_cash'] - base['forecasted_cash']) < 0.005}")
@@ -0,0 +1,182 @@
+import itertools
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+import db
+import depgraph
+
+# Snapshot de leitura em memória.
+#
+# O banco em disco é copiado (API de backup do SQLite) para um banco em memória
+# nomeado e compartilhado ("file:<nome>?mode=memory&cache=shared"). As leituras do
+# CORE (db.get_read_connection) abrem conexões para o snapshot ativo, sem disputar
+# locks com as escritas em disco.
+#
+# Cada atualização gera um snapshot NOVO e troca o ativo: leituras em andamento
+# continuam no snapshot anterior, que é liberado quando a última conexão fecha.
+# A atualização é disparada quando o PRAGMA data_version do banco em disco muda
+# (ou seja, outra conexão fez commit), na próxima leitura ou por agendamento.
+
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_names = itertools.count(1)
+_state: Dict[str, Any] = {
+    'enabled': False,
+    'uri': None,             # URI do snapshot ativo
+    'keeper': None,          # conexão que mantém o snapshot ativo vivo
+    'watch_conn': None,      # conexão com o disco usada para ler o data_version
+    'data_version': None,
+    'max_staleness': 0.0,
+    'refreshed_at': 0.0,
+    'refreshes': 0,
+    'scheduler': None,
+    'stop_event': None,
+}
+
+
+def _data_version() -> int:
+    """data_version do banco em disco, visto pela conexão de observação."""
+    return _state['watch_conn'].execute("PRAGMA data_version").fetchone()[0]
+
+
+def refresh(force: bool = False) -> bool:
+    """
+    Atualiza o snapshot se o banco em disco mudou desde a última cópia.
+
+    Args:
+        force: Se True, copia mesmo sem mudança detectada.
+
+    Returns:
+        True se um novo snapshot foi gerado.
+    """
+    with _refresh_lock:
+        with _lock:
+            if not _state['enabled']:
+                return False
+            version = _data_version()
+            if not force and version == _state['data_version']:
+                return False
+
+        # Cópia fora do _lock: leitores continuam usando o snapshot atual
+        uri = f"file:finance_os_snapshot_{next(_names)}?mode=memory&cache=shared"
+        keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        source = db.get_db_connection()
+        try:
+            source.backup(keeper)
+        finally:
+            source.close()
+
+        with _lock:
+            previous = _state['keeper']
+            _state.update(uri=uri, keeper=keeper, data_version=version,
+                          refreshed_at=time.monotonic(), refreshes=_state['refreshes'] + 1)
+            # Sob o _lock: nenhum leitor está entre ler a URI antiga e conectar nela
+            if previous is not None:
+                previous.close()
+
+    if _state['max_staleness'] > 0:
+        # Resultados em cache podem ter sido calculados sobre um snapshot atrasado
+        depgraph.invalidate_all()
+    return True
+
+
+def get_snapshot_connection() -> sqlite3.Connection:
+    """
+    Abre uma conexão somente-leitura com o snapshot ativo.
+
+    Com max_staleness = 0, a conexão sempre reflete todos os commits feitos antes
+    da chamada (o snapshot é atualizado antes, se necessário). Com max_staleness > 0,
+    o snapshot só é recopiado depois desse intervalo, e leituras podem ficar atrasadas.
+    Se o snapshot for desabilitado durante a chamada, a conexão é com o banco em disco.
+    """
+    with _lock:
+        stale_allowed = time.monotonic() - _state['refreshed_at'] < _state['max_staleness']
+    if not stale_allowed:
+        refresh()
+    with _lock:
+        uri = _state['uri']  # lida uma vez: um disable concorrente zera _state['uri']
+        conn = sqlite3.connect(uri, uri=True) if uri is not None else None
+    if conn is None:
+        conn = db.get_db_connection()  # snapshot desligado no meio do caminho: lê do disco
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA query_only = 1")
+    return conn
+
+
+def _scheduler_loop(interval: float, stop_event: threading.Event) -> None:
+    while not stop_event.wait(interval):
+        refresh()
+
+
+def enable_read_snapshot(max_staleness: float = 0.0, refresh_every: Optional[float] = None) -> None:
+    """
+    Habilita o snapshot em memória e roteia as leituras do CORE para ele.
+
+    Args:
+        max_staleness: Atraso máximo tolerado, em segundos. 0 garante leituras
+                       atualizadas (recópia na primeira leitura após um commit).
+        refresh_every: Se informado, uma thread recopia o snapshot a cada N segundos
+                       (quando houver mudança), tirando o custo da cópia das leituras.
+    """
+    with _lock:
+        if _state['enabled']:
+            return
+        _state['watch_conn'] = sqlite3.connect(db.DATABASE_NAME, check_same_thread=False)
+        _state['max_staleness'] = max_staleness
+        _state['enabled'] = True
+    refresh(force=True)
+    db.set_read_connection_factory(get_snapshot_connection)
+
+    if refresh_every:
+        stop_event = threading.Event()
+        scheduler = threading.Thread(
+            target=_scheduler_loop, args=(refresh_every, stop_event),
+            name="finance-os-snapshot", daemon=True
+        )
+        _state.update(scheduler=scheduler, stop_event=stop_event)
+        scheduler.start()
+
+
+def disable_read_snapshot() -> None:
+    """Volta as leituras para o banco em disco e libera o snapshot."""
+    db.set_read_connection_factory(None)
+    if _state['stop_event'] is not None:
+        _state['stop_event'].set()
+        _state['scheduler'].join()
+    with _refresh_lock, _lock:
+        for key in ('keeper', 'watch_conn'):
+            if _state[key] is not None:
+                _state[key].close()
+        _state.update(enabled=False, uri=None, keeper=None, watch_conn=None, data_version=None,
+                      refreshed_at=0.0, scheduler=None, stop_event=None)
+
+
+def snapshot_status() -> Dict[str, Any]:
+    """Retorna se o snapshot está ativo, quantas cópias foram feitas e a idade da atual (s)."""
+    with _lock:
+        age = time.monotonic() - _state['refreshed_at'] if _state['enabled'] else None
+        return {'enabled': _state['enabled'], 'refreshes': _state['refreshes'], 'age_seconds': age}
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import ledger
+    import kpis
+    db.initialize_db()
+
+    ACCOUNT_ID = 1
+    enable_read_snapshot()
+
+    before = ledger.get_account_balance(ACCOUNT_ID)
+    ledger.add_transaction("2026-01-20", 10.00, "income", ACCOUNT_ID, "Teste", "Entrada via snapshot")
+    after = ledger.get_account_balance(ACCOUNT_ID)
+    print(f"Saldo antes: R$ {before:.2f} | depois: R$ {after:.2f} (diferença esperada: 10.00)")
+
+    # Leituras sem escrita não recopiam o banco
+    start = time.perf_counter()
+    for _ in range(200):
+        kpis.get_total_cash()
+    elapsed = (time.perf_counter() - start) / 200 * 1000
+    print(f"get_total_cash no snapshot: {elapsed:.3f} ms/chamada")
+    print(f"Status: {snapshot_status()}")
+    disable_read_snapshot()
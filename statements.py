@@ -0,0 +1,325 @@
+import csv
+import html
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Sequence
+from datetime import datetime, timedelta
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from db import execute_read_query
+    from archive import query_ledger, archived_balances
+except ImportError:
+    import db
+    import archive
+    execute_read_query = db.execute_read_query
+    query_ledger = archive.query_ledger
+    archived_balances = archive.archived_balances
+
+DATE_FORMAT = "%Y-%m-%d"
+
+# Efeito de um lançamento no saldo (mesma regra de ledger.get_account_balance)
+_SIGNED_AMOUNT = """CASE transaction_type
+    WHEN 'income' THEN amount
+    WHEN 'expense' THEN -amount
+    WHEN 'transfer' THEN -amount
+    ELSE 0 END"""
+
+_HTML_STYLE = """
+    body { font-family: Arial, sans-serif; margin: 2em; color: #222; }
+    h1 { font-size: 1.4em; margin-bottom: 0; }
+    .period { color: #666; margin-top: 0.2em; }
+    table { border-collapse: collapse; width: 100%; margin: 1em 0; }
+    th, td { border-bottom: 1px solid #ddd; padding: 4px 8px; text-align: left; }
+    td.num, th.num { text-align: right; }
+    .neg { color: #b00020; }
+    .summary td { font-weight: bold; }
+"""
+
+
+def _month_bounds(month: str) -> tuple:
+    """Primeiro e último dia (YYYY-MM-DD) de um mês YYYY-MM."""
+    first = datetime.strptime(f"{month}-01", DATE_FORMAT)
+    next_month = (first + timedelta(days=32)).replace(day=1)
+    return first.strftime(DATE_FORMAT), (next_month - timedelta(days=1)).strftime(DATE_FORMAT)
+
+
+def month_range(start_month: str, end_month: str) -> List[str]:
+    """Lista de meses YYYY-MM de start_month a end_month, inclusive."""
+    months = []
+    current = datetime.strptime(f"{start_month}-01", DATE_FORMAT)
+    last = datetime.strptime(f"{end_month}-01", DATE_FORMAT)
+    while current <= last:
+        months.append(current.strftime("%Y-%m"))
+        current = (current + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def _signed(row: Dict[str, Any]) -> float:
+    if row['transaction_type'] == 'income':
+        return row['amount']
+    if row['transaction_type'] in ('expense', 'transfer'):
+        return -row['amount']
+    return 0.0
+
+
+def build_statements(months: Sequence[str], account_ids: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+    """
+    Monta os dados dos extratos mensais (um por conta e mês), sem renderizar.
+
+    Leitura em bloco: uma consulta de saldos de abertura para o primeiro mês e,
+    por mês, uma consulta de lançamentos e uma de reconciliações para todas as
+    contas. O saldo de abertura de cada mês seguinte é o fechamento do anterior.
+
+    Args:
+        months: Meses YYYY-MM, em ordem crescente (ver month_range).
+        account_ids: Contas incluídas. Se None, todas as contas.
+
+    Returns:
+        Lista de extratos com 'account', 'month', 'opening_balance', 'transactions'
+        (com 'balance' corrente), 'category_totals', 'total_in', 'total_out',
+        'closing_balance' e 'reconciliation' (última reconciliação do mês, ou None).
+    """
+    if not months:
+        return []
+    accounts = [dict(row) for row in execute_read_query("SELECT * FROM accounts ORDER BY id")]
+    if account_ids is not None:
+        wanted = set(account_ids)
+        accounts = [account for account in accounts if account['id'] in wanted]
+
+    first_day, _ = _month_bounds(months[0])
+    # Abertura: lançamentos quentes anteriores + parte arquivada (archive.py) até a véspera
+    day_before = (datetime.strptime(first_day, DATE_FORMAT) - timedelta(days=1)).strftime(DATE_FORMAT)
+    balances = defaultdict(float, archived_balances(day_before))
+    for row in execute_read_query(
+        f"SELECT account_id, SUM({_SIGNED_AMOUNT}) AS balance FROM transactions WHERE date < ? GROUP BY account_id",
+        (first_day,)
+    ):
+        balances[row['account_id']] += row['balance'] or 0.0
+
+    statements = []
+    for month in months:
+        start, end = _month_bounds(month)
+        by_account = defaultdict(list)
+        for row in query_ledger(
+            "SELECT * FROM {transactions} WHERE date BETWEEN ? AND ? ORDER BY account_id, date, id",
+            (start, end), since=start
+        ):
+            by_account[row['account_id']].append(dict(row))
+
+        reconciliations = {}
+        for row in execute_read_query(
+            "SELECT * FROM reconciliations WHERE week_end BETWEEN ? AND ? ORDER BY week_end",
+            (start, end)
+        ):
+            reconciliations[row['account_id']] = dict(row)  # fica a última do mês
+
+        for account in accounts:
+            opening = balances[account['id']]
+            running = opening
+            category_totals = defaultdict(float)
+            total_in = total_out = 0.0
+            transactions = []
+            for tx in by_account.get(account['id'], []):
+                signed = _signed(tx)
+                running += signed
+                if signed >= 0:
+                    total_in += signed
+                else:
+                    total_out -= signed
+                category_totals[tx['category'] or 'Sem categoria'] += signed
+                tx['balance'] = running
+                transactions.append(tx)
+            balances[account['id']] = running
+            statements.append({
+                'account': account,
+                'month': month,
+                'opening_balance': opening,
+                'transactions': transactions,
+                'category_totals': dict(sorted(category_totals.items())),
+                'total_in': total_in,
+                'total_out': total_out,
+                'closing_balance': running,
+                'reconciliation': reconciliations.get(account['id']),
+            })
+    return statements
+
+
+def _money(value: float) -> str:
+    return f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def render_html(statement: Dict[str, Any]) -> str:
+    """Renderiza um extrato como HTML autocontido (estilo embutido, sem recursos externos)."""
+    account = statement['account']
+    title = f"Extrato {html.escape(account['name'])} - {statement['month']}"
+
+    def cell(value: float) -> str:
+        css = "num neg" if value < 0 else "num"
+        return f'<td class="{css}">{_money(value)}</td>'
+
+    rows = "\n".join(
+        f"<tr><td>{tx['date']}</td><td>{html.escape(tx['description'] or '')}</td>"
+        f"<td>{html.escape(tx['category'] or '')}</td><td>{html.escape(tx['method'] or '')}</td>"
+        f"{cell(_signed(tx))}{cell(tx['balance'])}</tr>"
+        for tx in statement['transactions']
+    ) or '<tr><td colspan="6">Sem lançamentos no período.</td></tr>'
+    categories = "\n".join(
+        f"<tr><td>{html.escape(category)}</td>{cell(total)}</tr>"
+        for category, total in statement['category_totals'].items()
+    )
+    reconciliation = statement['reconciliation']
+    if reconciliation:
+        recon_text = (
+            f"Semana {reconciliation['week_start']}: saldo real {_money(reconciliation['real_balance'])}, "
+            f"computado {_money(reconciliation['computed_balance'])}, delta {_money(reconciliation['delta'])}"
+        )
+    else:
+        recon_text = "Nenhuma reconciliação no período."
+
+    return f"""<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>{_HTML_STYLE}</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p class="period">Conta {account['id']} ({html.escape(account['type'])}, {html.escape(account['role'])})</p>
+<table>
+<tr class="summary"><td>Saldo de abertura</td>{cell(statement['opening_balance'])}</tr>
+<tr><td>Entradas</td>{cell(statement['total_in'])}</tr>
+<tr><td>Saídas</td>{cell(-statement['total_out'])}</tr>
+<tr class="summary"><td>Saldo de fechamento</td>{cell(statement['closing_balance'])}</tr>
+</table>
+<h2>Lançamentos</h2>
+<table>
+<tr><th>Data</th><th>Descrição</th><th>Categoria</th><th>Método</th><th class="num">Valor</th><th class="num">Saldo</th></tr>
+{rows}
+</table>
+<h2>Totais por categoria</h2>
+<table>
+{categories or '<tr><td>-</td></tr>'}
+</table>
+<h2>Reconciliação</h2>
+<p>{html.escape(recon_text)}</p>
+</body>
+</html>
+"""
+
+
+def write_csv(statement: Dict[str, Any], path: str) -> None:
+    """Grava um extrato em CSV: lançamentos com saldo corrente, seguidos do resumo."""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['date', 'description', 'category', 'method', 'transaction_type', 'amount', 'balance'])
+        writer.writerow([statement['month'] + '-01', 'Saldo de abertura', '', '', '', '',
+                         f"{statement['opening_balance']:.2f}"])
+        for tx in statement['transactions']:
+            writer.writerow([
+                tx['date'], tx['description'] or '', tx['category'] or '', tx['method'] or '',
+                tx['transaction_type'], f"{_signed(tx):.2f}", f"{tx['balance']:.2f}"
+            ])
+        writer.writerow([])
+        writer.writerow(['summary', 'value'])
+        writer.writerow(['opening_balance', f"{statement['opening_balance']:.2f}"])
+        writer.writerow(['total_in', f"{statement['total_in']:.2f}"])
+        writer.writerow(['total_out', f"{statement['total_out']:.2f}"])
+        writer.writerow(['closing_balance', f"{statement['closing_balance']:.2f}"])
+        for category, total in statement['category_totals'].items():
+            writer.writerow([f"category:{category}", f"{total:.2f}"])
+        reconciliation = statement['reconciliation']
+        writer.writerow(['reconciliation_delta', f"{reconciliation['delta']:.2f}" if reconciliation else ''])
+
+
+def _render_one(job: tuple) -> List[str]:
+    """Renderiza um extrato nos formatos pedidos (executado nos processos do pool)."""
+    statement, output_dir, formats = job
+    base = os.path.join(output_dir, f"extrato_{statement['account']['id']}_{statement['month']}")
+    paths = []
+    if 'html' in formats:
+        with open(base + ".html", 'w', encoding='utf-8') as f:
+            f.write(render_html(statement))
+        paths.append(base + ".html")
+    if 'csv' in formats:
+        write_csv(statement, base + ".csv")
+        paths.append(base + ".csv")
+    return paths
+
+
+def generate_statements(
+    start_month: str,
+    end_month: str,
+    output_dir: str,
+    account_ids: Optional[Sequence[int]] = None,
+    formats: Sequence[str] = ('html', 'csv'),
+    processes: Optional[int] = None
+) -> List[str]:
+    """
+    Gera os extratos mensais (HTML e/ou CSV) de cada conta no período.
+
+    Os dados são lidos em bloco por mês (build_statements) e a renderização é
+    distribuída em um pool de processos.
+
+    Args:
+        start_month: Primeiro mês (YYYY-MM).
+        end_month: Último mês (YYYY-MM).
+        output_dir: Pasta de saída (criada se não existir).
+        account_ids: Contas incluídas. Se None, todas.
+        formats: 'html' e/ou 'csv'.
+        processes: Número de processos. None usa os.cpu_count(); 1 renderiza no processo atual.
+
+    Returns:
+        Caminhos dos arquivos gerados.
+    """
+    unknown = [fmt for fmt in formats if fmt not in ('html', 'csv')]
+    if unknown:
+        raise ValueError(f"Formatos inválidos: {', '.join(unknown)}. Use 'html' e/ou 'csv'.")
+    os.makedirs(output_dir, exist_ok=True)
+    statements = build_statements(month_range(start_month, end_month), account_ids)
+    jobs = [(statement, output_dir, tuple(formats)) for statement in statements]
+
+    if processes == 1 or len(jobs) <= 1:
+        results = map(_render_one, jobs)
+        return [path for paths in results for path in paths]
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        results = pool.map(_render_one, jobs, chunksize=max(1, len(jobs) // (4 * (processes or os.cpu_count() or 1))))
+        return [path for paths in results for path in paths]
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import tempfile
+    import time
+    import db
+    import ledger
+    import reconciliation
+    db.initialize_db()
+
+    OP_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Operacional PF", "PF", "operacional", 1)
+    )
+    COFRE_ID = db.execute_insert(
+        "INSERT INTO accounts (name, type, role, active) VALUES (?, ?, ?, ?)",
+        ("Conta Cofre", "PF", "cofre", 1)
+    )
+    start = datetime.strptime("2025-01-01", DATE_FORMAT)
+    for day in range(365):
+        date = (start + timedelta(days=day)).strftime(DATE_FORMAT)
+        ledger.add_transaction(date, 25.00 + day % 5, "expense", OP_ID, ("Alimentação", "Transporte")[day % 2], "Gasto diário")
+        if day % 30 == 0:
+            ledger.add_transaction(date, 3000.00, "income", OP_ID, "Salário", "Salário")
+            ledger.add_transfer(date, OP_ID, COFRE_ID, 500.00, "Reserva", "PIX")
+    reconciliation.reconcile_account("2025-06-23", OP_ID, 9000.00)
+
+    output_dir = tempfile.mkdtemp(prefix="extratos_")
+    t0 = time.perf_counter()
+    paths = generate_statements("2025-01", "2025-12", output_dir)
+    print(f"{len(paths)} arquivos gerados em {time.perf_counter() - t0:.2f} s em {output_dir}")
+
+    june = [s for s in build_statements(["2025-06"], [OP_ID])][0]
+    print(f"Junho/2025: abertura {_money(june['opening_balance'])}, fechamento {_money(june['closing_balance'])}, "
+          f"delta de reconciliação {june['reconciliation']['delta']:.2f}")
+    print(f"Fechamento == saldo do ledger? "
+          f"{abs(june['closing_balance'] - ledger.get_account_balance(OP_ID, '2025-06-30')) < 0.005}")
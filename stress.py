@@ -0,0 +1,161 @@
+import os
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Sequence
+import db
+import depgraph
+
+# Teste de estresse de escritores concorrentes (threads e processos) sobre um banco
+# temporário. Cada escritor grava lançamentos e transferências pelo ledger, como a UI;
+# ao final, confere que nenhuma escrita foi perdida ou duplicada e que os agregados e
+# o ledger continuam íntegros. Repetido para vários números de escritores, mostra a
+# curva de vazão e a contenção (esperas pela trava e novas tentativas, ver db.py).
+
+AMOUNT = 1.00  # valor de cada despesa: o saldo final esperado é exato
+
+
+def _setup(path: str) -> List[int]:
+    """Cria o banco temporário com duas contas; retorna [operacional, cofre]."""
+    db.DATABASE_NAME = path
+    depgraph.invalidate_all()
+    db.initialize_db()
+    return [
+        db.execute_insert("INSERT INTO accounts (name, type, role, active) VALUES ('Operacional', 'PF', 'operacional', 1)"),
+        db.execute_insert("INSERT INTO accounts (name, type, role, active) VALUES ('Cofre', 'PF', 'cofre', 1)"),
+    ]
+
+
+def _writer(path: str, accounts: List[int], worker: int, writes: int) -> Dict[str, Any]:
+    """Um escritor: 'writes' operações (a cada 10, uma transferência). Roda em thread ou processo."""
+    import ledger
+    db.DATABASE_NAME = path
+    errors = 0
+    for n in range(writes):
+        date = f"2026-01-{n % 28 + 1:02d}"
+        try:
+            if n % 10 == 9:
+                ledger.add_transfer(date, accounts[0], accounts[1], AMOUNT, f"w{worker}-{n}", "PIX")
+            else:
+                ledger.add_transaction(date, AMOUNT, "expense", accounts[0], "Estresse", f"w{worker}-{n}")
+        except sqlite3.OperationalError:
+            errors += 1
+    return {'errors': errors, 'stats': db.write_stats()}
+
+
+def _verify(accounts: List[int], expected_expenses: int, expected_transfers: int) -> Dict[str, Any]:
+    """Confere contagens, saldos, agregados e integridade depois do estresse."""
+    from aggregates import verify_aggregates
+    from integrity import check_integrity
+    from ledger import get_account_balance
+    counts = db.execute_query("""
+        SELECT
+            SUM(category = 'Estresse') AS expenses,
+            COUNT(DISTINCT transfer_group_id) AS transfers,
+            COUNT(*) - COUNT(DISTINCT description || transaction_type) AS duplicates
+        FROM transactions
+    """)[0]
+    op_expected = -AMOUNT * (expected_expenses + expected_transfers)
+    cofre_expected = AMOUNT * expected_transfers
+    balances_ok = (
+        abs(get_account_balance(accounts[0]) - op_expected) < 0.005
+        and abs(get_account_balance(accounts[1]) - cofre_expected) < 0.005
+    )
+    return {
+        'rows_ok': counts['expenses'] == expected_expenses and counts['transfers'] == expected_transfers,
+        'no_duplicates': counts['duplicates'] == 0,
+        'balances_ok': balances_ok,
+        'aggregates_ok': not any(verify_aggregates().values()),
+        'integrity_ok': check_integrity(full=True, save_checkpoint=False)['ok'],
+    }
+
+
+def run_stress(writers: int, writes_per_writer: int = 100, mode: str = 'threads') -> Dict[str, Any]:
+    """
+    Executa uma rodada de estresse em um banco temporário novo.
+
+    Args:
+        writers: Número de escritores simultâneos.
+        writes_per_writer: Operações por escritor (1 em cada 10 é uma transferência).
+        mode: 'threads' (mesmo processo, como sessões do Streamlit) ou 'processes'
+              (como a UI e o cli.py ao mesmo tempo).
+
+    Returns:
+        Dicionário com 'writers', 'mode', 'writes', 'elapsed', 'throughput' (escritas/s),
+        'errors', 'retries', 'contended', 'failures', 'lock_wait_max', 'lock_wait_histogram',
+        'checks' (verificações de correção) e 'ok'.
+    """
+    if mode not in ('threads', 'processes'):
+        raise ValueError("mode deve ser 'threads' ou 'processes'.")
+    original = db.DATABASE_NAME
+    fd, path = tempfile.mkstemp(suffix=".db", prefix="finance_os_stress_")
+    os.close(fd)
+    try:
+        accounts = _setup(path)
+        db.reset_write_stats()
+        pool_class = ThreadPoolExecutor if mode == 'threads' else ProcessPoolExecutor
+        started = time.perf_counter()
+        with pool_class(max_workers=writers) as pool:
+            futures = [pool.submit(_writer, path, accounts, w, writes_per_writer) for w in range(writers)]
+            results = [future.result() for future in futures]
+        elapsed = time.perf_counter() - started
+
+        if mode == 'threads':
+            stats = db.write_stats()  # as threads compartilham os contadores do processo
+        else:
+            stats = {key: sum(r['stats'][key] for r in results)
+                     for key in ('transactions', 'contended', 'retries', 'failures')}
+            stats['lock_wait_max'] = max(r['stats']['lock_wait_max'] for r in results)
+            stats['lock_wait_histogram'] = [
+                (bucket, sum(r['stats']['lock_wait_histogram'][i][1] for r in results))
+                for i, (bucket, _) in enumerate(results[0]['stats']['lock_wait_histogram'])
+            ]
+        transfers_per_writer = writes_per_writer // 10
+        writes = writers * writes_per_writer
+        errors = sum(r['errors'] for r in results)
+        checks = _verify(
+            accounts,
+            writers * (writes_per_writer - transfers_per_writer),
+            writers * transfers_per_writer,
+        )
+        return {
+            'writers': writers,
+            'mode': mode,
+            'writes': writes,
+            'elapsed': elapsed,
+            'throughput': writes / elapsed if elapsed else 0.0,
+            'errors': errors,
+            'retries': stats['retries'],
+            'contended': stats['contended'],
+            'failures': stats['failures'],
+            'lock_wait_max': stats['lock_wait_max'],
+            'lock_wait_histogram': stats['lock_wait_histogram'],
+            'checks': checks,
+            'ok': not errors and all(checks.values()),
+        }
+    finally:
+        db.DATABASE_NAME = original
+        depgraph.invalidate_all()
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def throughput_curve(
+    writer_counts: Sequence[int] = (1, 2, 4, 8),
+    writes_per_writer: int = 100,
+    modes: Sequence[str] = ('threads', 'processes')
+) -> List[Dict[str, Any]]:
+    """Roda run_stress para cada combinação de modo e número de escritores."""
+    return [run_stress(n, writes_per_writer, mode) for mode in modes for n in writer_counts]
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    print(f"{'modo':<10} {'escritores':>10} {'escritas/s':>11} {'esperas':>8} {'retries':>8} "
+          f"{'espera máx':>11} {'erros':>6}  ok")
+    for run in throughput_curve(writes_per_writer=50):
+        print(f"{run['mode']:<10} {run['writers']:>10} {run['throughput']:>11.0f} {run['contended']:>8} "
+              f"{run['retries']:>8} {run['lock_wait_max'] * 1000:>9.1f}ms {run['errors']:>6}  {run['ok']}")
+        if not run['ok']:
+            print(f"    verificações: {run['checks']}")
@@ -0,0 +1,246 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Any, Optional, Tuple
+# Tenta importar para testes diretos e para uso como módulo
+try:
+    from db import get_db_connection, begin_immediate
+    from ledger import _insert_rows, _after_commit, _transfer_rows
+except ImportError:
+    import db
+    import ledger
+    get_db_connection = db.get_db_connection
+    begin_immediate = db.begin_immediate
+    _insert_rows = ledger._insert_rows
+    _after_commit = ledger._after_commit
+    _transfer_rows = ledger._transfer_rows
+
+# Limites padrão de um grupo de commit.
+DEFAULT_MAX_BATCH = 500
+DEFAULT_MAX_DELAY = 0.01  # segundos
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+class TransactionWriter:
+    """
+    Fila de escrita com uma thread dedicada que agrupa lançamentos em commits coletivos.
+
+    Cada add_transaction do ledger abre uma conexão e faz seu próprio commit (e fsync).
+    Aqui, os pedidos enfileirados são gravados em lotes de até 'max_batch' itens,
+    esperando no máximo 'max_delay' segundos para completar um lote, com um único
+    commit por lote.
+
+    Garantias:
+    - Durabilidade: o Future só é resolvido depois do commit do lote que contém o item.
+      Se o processo cair antes disso, itens ainda não resolvidos podem ser perdidos.
+    - Ordem: os itens são gravados na ordem de submissão (uma única thread escritora),
+      então os IDs atribuídos crescem nessa ordem.
+    - Atomicidade: cada item (lançamento ou transferência) roda em um SAVEPOINT próprio.
+      Uma transferência grava as duas pernas ou nenhuma; um item inválido falha sozinho
+      (exceção no seu Future) sem derrubar o restante do lote.
+    - Entrega: todo Future é resolvido, mesmo se a conexão, o commit ou os ganchos
+      pós-commit (invalidação de cache, alertas) falharem; falhas dos ganchos só são
+      registradas no log, pois os itens já estão gravados.
+
+    Uso:
+        with TransactionWriter() as writer:
+            future = writer.submit_transaction("2026-01-20", 50.0, "expense", 1)
+            transaction_id = future.result()
+    """
+
+    def __init__(self, max_batch: int = DEFAULT_MAX_BATCH, max_delay: float = DEFAULT_MAX_DELAY):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: queue.Queue = queue.Queue()
+        self._closed = False
+        self.stats = {'batches': 0, 'items': 0, 'failed_items': 0, 'hook_errors': 0}
+        self._thread = threading.Thread(target=self._run, name="finance-os-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "TransactionWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _submit(self, rows: List[Dict[str, Any]]) -> Future:
+        if self._closed:
+            raise RuntimeError("TransactionWriter já foi encerrado.")
+        future: Future = Future()
+        self._queue.put((rows, future))
+        return future
+
+    def submit_transaction(
+        self,
+        date: str,
+        amount: float,
+        transaction_type: str,
+        account_id: int,
+        category: Optional[str] = None,
+        description: Optional[str] = None,
+        method: Optional[str] = None
+    ) -> Future:
+        """
+        Enfileira um lançamento (mesmos parâmetros de ledger.add_transaction).
+
+        Returns:
+            Future resolvido com o ID da transação após o commit.
+        """
+        return self._submit([{
+            'date': date, 'amount': amount, 'transaction_type': transaction_type,
+            'account_id': account_id, 'category': category,
+            'description': description, 'method': method,
+        }])
+
+    def submit_transfer(
+        self,
+        date: str,
+        from_account_id: int,
+        to_account_id: int,
+        amount: float,
+        description: Optional[str] = None,
+        method: Optional[str] = None
+    ) -> Future:
+        """
+        Enfileira uma transferência atômica (mesmos parâmetros de ledger.add_transfer).
+
+        Returns:
+            Future resolvido com a tupla (id_expense, id_income) após o commit.
+        """
+        return self._submit(_transfer_rows(date, from_account_id, to_account_id, amount, description, method))
+
+    def flush(self) -> None:
+        """Bloqueia até que todos os itens enfileirados até agora estejam gravados."""
+        self._submit([]).result()
+
+    def close(self) -> None:
+        """Grava o que estiver pendente e encerra a thread escritora."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _collect_batch(self, first) -> Tuple[list, bool]:
+        """Junta itens à fila até 'max_batch' itens ou 'max_delay' segundos."""
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch, stop = self._collect_batch(first)
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: list) -> None:
+        """Grava um lote em uma única transação (um commit, um fsync)."""
+        results = []
+        committed_rows = []
+        conn = None
+        try:
+            conn = get_db_connection()
+            begin_immediate(conn)
+            cursor = conn.cursor()
+            for rows, future in batch:
+                if not rows:
+                    results.append((future, None, None))
+                    continue
+                cursor.execute("SAVEPOINT item")
+                try:
+                    ids = _insert_rows(cursor, rows)
+                    cursor.execute("RELEASE SAVEPOINT item")
+                    committed_rows.extend(rows)
+                    results.append((future, ids[0] if len(ids) == 1 else tuple(ids), None))
+                except Exception as e:  # o item falha sozinho; o lote segue
+                    cursor.execute("ROLLBACK TO SAVEPOINT item")
+                    cursor.execute("RELEASE SAVEPOINT item")
+                    results.append((future, None, e))
+            conn.commit()
+        except Exception as e:
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    pass  # close() descarta a transação de qualquer forma
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            if conn is not None:
+                conn.close()
+
+        try:
+            _after_commit(committed_rows)
+        except Exception:
+            self.stats['hook_errors'] += 1
+            logger.exception("Falha nos ganchos pós-commit de um lote de %d lançamento(s)", len(committed_rows))
+        self.stats['batches'] += 1
+        for future, value, error in results:
+            if error is not None:
+                self.stats['failed_items'] += 1
+                future.set_exception(error)
+            else:
+                if value is not None:
+                    self.stats['items'] += 1
+                future.set_result(value)
+
+# Exemplo de uso:
+if __name__ == '__main__':
+    import db
+    import ledger
+    db.initialize_db()
+
+    ACCOUNT_ID = 1
+    COFRE_ID = 2
+    N = 2000
+
+    # 1. Um commit por lançamento
+    start = time.perf_counter()
+    for i in range(200):
+        ledger.add_transaction("2026-01-20", 1.00, "expense", ACCOUNT_ID, "Carga", f"Sequencial {i}")
+    sequential_rate = 200 / (time.perf_counter() - start)
+
+    # 2. Commits em grupo
+    start = time.perf_counter()
+    with TransactionWriter() as writer:
+        futures = [
+            writer.submit_transaction("2026-01-20", 1.00, "expense", ACCOUNT_ID, "Carga", f"Fila {i}")
+            for i in range(N)
+        ]
+        transfer = writer.submit_transfer("2026-01-21", ACCOUNT_ID, COFRE_ID, 100.00, "Cofre", "PIX")
+        invalid = writer.submit_transaction("2026-01-22", 1.00, "invalido", ACCOUNT_ID)
+        ids = [f.result() for f in futures]
+    grouped_rate = N / (time.perf_counter() - start)
+
+    print(f"Sequencial: {sequential_rate:,.0f} lançamentos/s")
+    print(f"Em grupo:   {grouped_rate:,.0f} lançamentos/s ({writer.stats['batches']} commits)")
+    print(f"IDs em ordem de submissão? {ids == sorted(ids)}")
+    print(f"Transferência: {transfer.result()}")
+    print(f"Item inválido: {type(invalid.exception()).__name__}")
+
+    # 3. Gancho pós-commit com falha: o erro vai para o log e os Futures ainda são resolvidos
+    def failing_hook(rows):
+        raise RuntimeError("gancho indisponível")
+    _after_commit = failing_hook
+    with TransactionWriter() as writer:
+        future = writer.submit_transaction("2026-01-23", 1.00, "expense", ACCOUNT_ID, "Carga", "Gancho com falha")
+        print(f"Com gancho falhando: ID {future.result(timeout=5)}, {writer.stats['hook_errors']} falha(s) registrada(s)")